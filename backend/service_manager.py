@@ -4,7 +4,26 @@
 - Автозапуск всех .py файлов в папке сервисов
 - Мониторинг Node.js сервера
 - Проверка и создание виртуального окружения
-- Автоматический перезапуск упавших сервисов
+- Автоматический перезапуск упавших сервисов по уведомлению ядра о завершении
+  процесса (pidfd в event loop менеджера), без периодического опроса; бюджет
+  падений в скользящем окне и экспоненциальная задержка с разбросом для серии
+  падений, сбрасываемая после стабильной работы
+- Необязательный манифест сервиса {имя}.service.json: команда, окружение, порт,
+  проба готовности, зависимости, политика перезапуска, класс ресурсов; запуск и
+  остановка по графу зависимостей с максимальным параллелизмом
+- Активация сокетами: менеджер сам открывает слушающие сокеты сервиса ("listen")
+  и передает их процессу (LISTEN_FDS), соединения во время перезапуска ждут в backlog
+- Перезапуск без простоя (restart_mode "hot-swap"): новый экземпляр инициализируется
+  в резерве, старый по каналу управления освобождает устройства и дообслуживает
+  соединения, новый открывает устройства и принимает соединения с того же сокета
+- Параллельный запуск сервисов; сервис считается готовым по пробе готовности
+  (TCP порт, HTTP адрес или строка в выводе), время до готовности в статусе
+- Сторож зависаний: пульс сервисов (event loop, потоки захвата) по датаграммному
+  сокету; замолчавший источник - дамп стеков и перезапуск за доли секунды сверх hang_timeout
+- Замер ресурсов сервисов (CPU, RSS, потоки, дескрипторы, ввод-вывод) в кольцевые
+  буферы с историей в HTTP API и предупреждениями по порогам (рост RSS, загрузка CPU)
+- Вывод сервисов (stdout/stderr) читается без блокировок в кольцевые буферы строк,
+  HTTP API отдает хвост журнала с фильтром по уровню и режимом follow
 """
 
 import os
@@ -17,23 +36,115 @@ import json
 import requests
 import logging
 import asyncio
+import re
+import urllib.parse
+import hmac
+import ipaddress
+import shlex
+import random
+import fcntl
+from collections import deque
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Dict, Optional, List, Any
-from dataclasses import dataclass
+from typing import Dict, Optional, List, Any, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 import psutil
 import socket
 import urllib.request
 import urllib.error
 
-# Настройка логирования для контейнера
-logging.basicConfig(
-    level=logging.WARNING,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()  # Убираем файловое логирование для контейнера
-    ]
-)
+# Общие модули (common/) лежат в директории сервисов, в контейнере - рядом с менеджером
+SERVICES_DIR = Path(os.environ.get('SERVICES_DIR', Path(__file__).parent / "src" / "services"))
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(SERVICES_DIR))
+from common.log_setup import setup_logging  # noqa: E402
+from common import socket_activation  # noqa: E402
+from common.handover import CONTROL_FD_VARIABLE, STANDBY_VARIABLE, ControlChannel  # noqa: E402
+from common.heartbeat import HEARTBEAT_FD_VARIABLE, STACK_DUMP_SIGNAL  # noqa: E402
+
+# HTTP API менеджера (статус сервисов, журналы); 0 - не запускать
+MANAGER_HOST = os.environ.get('SERVICE_MANAGER_HOST', '127.0.0.1')
+MANAGER_PORT = int(os.environ.get('SERVICE_MANAGER_PORT', 5100))
+# Токен для POST (заголовок X-Manager-Token); без токена POST принимается только с локальной петли
+MANAGER_TOKEN = os.environ.get('SERVICE_MANAGER_TOKEN', '')
+# Журналы сервисов: строк в памяти на сервис и запись на диск с ротацией (пустой каталог - не писать)
+SERVICE_LOG_LINES = int(os.environ.get('SERVICE_LOG_LINES', 2000))
+SERVICE_LOG_DIR = os.environ.get('SERVICE_LOG_DIR', '')
+SERVICE_LOG_MAX_BYTES = int(os.environ.get('SERVICE_LOG_MAX_BYTES', 5 * 1024 * 1024))
+SERVICE_LOG_BACKUPS = int(os.environ.get('SERVICE_LOG_BACKUPS', 3))
+# Манифест сервиса: {имя}.service.json рядом с {имя}.py (или без .py, если задан command)
+MANIFEST_SUFFIX = '.service.json'
+# Пробы готовности: "имя=проба[@таймаут];...", проба - tcp:[хост:]порт, http://... (ответ 2xx/3xx)
+# или log:текст (строка вывода сервиса); переопределяют "ready" манифеста.
+# Сервис без пробы готов сразу после запуска
+SERVICE_READY_SPEC = os.environ.get('SERVICE_READY', '')
+SERVICE_READY_TIMEOUT = float(os.environ.get('SERVICE_READY_TIMEOUT', 30.0))
+READY_PROBE_INTERVAL = 0.1
+# Общий срок остановки всех сервисов (параллельно, по графу зависимостей), секунд
+SERVICE_STOP_DEADLINE = float(os.environ.get('SERVICE_STOP_DEADLINE', 10.0))
+# Занятый порт сервиса: kill - завершить владельца, wait - ждать освобождения, fail - не запускать
+SERVICE_PORT_CONFLICT = os.environ.get('SERVICE_PORT_CONFLICT', 'kill')
+PORT_CONFLICT_POLICIES = ('kill', 'wait', 'fail')
+# Сколько ждать освобождения порта (для kill - после SIGTERM, затем SIGKILL), секунд
+SERVICE_PORT_WAIT = float(os.environ.get('SERVICE_PORT_WAIT', 5.0))
+# Время жизни разобранных таблиц /proc/net/tcp{,6}, секунд
+PORT_INDEX_TTL = 1.0
+# Класс ресурсов манифеста -> nice процесса (realtime требует прав root/CAP_SYS_NICE)
+RESOURCE_CLASSES = {'realtime': -5, 'normal': 0, 'background': 10}
+RESTART_POLICIES = ('always', 'on-failure', 'never')
+# Бюджет падений: не больше max_restarts манифеста за restart_window секунд, затем перезапуск,
+# когда старейшее падение выйдет из окна. Серия падений подряд - задержка BASE * 2^(n-2)
+# (первый перезапуск сразу) до MAX плюс случайные до JITTER от задержки; серия сбрасывается,
+# если сервис проработал STABLE_AFTER секунд
+SERVICE_RESTART_WINDOW = float(os.environ.get('SERVICE_RESTART_WINDOW', 300.0))
+SERVICE_BACKOFF_BASE = float(os.environ.get('SERVICE_BACKOFF_BASE', 0.5))
+SERVICE_BACKOFF_MAX = float(os.environ.get('SERVICE_BACKOFF_MAX', 60.0))
+SERVICE_BACKOFF_JITTER = float(os.environ.get('SERVICE_BACKOFF_JITTER', 0.2))
+SERVICE_STABLE_AFTER = float(os.environ.get('SERVICE_STABLE_AFTER', 60.0))
+RESTART_LATENCY_SAMPLES = 50
+# Перезапуск: stop-start - остановка и запуск, hot-swap - смена экземпляров без простоя
+RESTART_MODES = ('stop-start', 'hot-swap')
+# hot-swap: ожидание освобождения устройств старым экземпляром и его завершения после передачи, секунд
+SERVICE_HANDOVER_TIMEOUT = float(os.environ.get('SERVICE_HANDOVER_TIMEOUT', 10.0))
+SERVICE_DRAIN_TIMEOUT = float(os.environ.get('SERVICE_DRAIN_TIMEOUT', 15.0))
+# Сторож зависаний: источник пульса сервиса (common/heartbeat.py) молчит дольше hang_timeout -
+# дамп стеков и hang_action: restart - SIGKILL и перезапуск по политике restart, dump - только дамп
+# (источник может сам объявить себя dump - например, поток захвата, ждущий драйвер камеры).
+# hang_timeout 0 - без сторожа
+SERVICE_HANG_TIMEOUT = float(os.environ.get('SERVICE_HANG_TIMEOUT', 1.0))
+SERVICE_HANG_ACTION = os.environ.get('SERVICE_HANG_ACTION', 'restart')
+HANG_ACTIONS = ('restart', 'dump')
+HEARTBEAT_CHECK_INTERVAL = 0.1
+# Время на запись дампа стеков в журнал до SIGKILL, секунд
+HANG_DUMP_GRACE = 0.2
+# Замер ресурсов сервисов раз в SERVICE_SAMPLE_INTERVAL секунд (0 - не замерять), история -
+# SERVICE_SAMPLE_HISTORY замеров на сервис (по умолчанию час)
+SERVICE_SAMPLE_INTERVAL = float(os.environ.get('SERVICE_SAMPLE_INTERVAL', 5.0))
+SERVICE_SAMPLE_HISTORY = int(os.environ.get('SERVICE_SAMPLE_HISTORY', 720))
+# Пороги предупреждений (поле "alerts" манифеста переопределяет; 0 - выключено): рост RSS,
+# МБ/час по окну SERVICE_ALERT_RSS_WINDOW секунд; RSS, МБ; CPU, % одного ядра дольше CPU_FOR секунд
+SERVICE_ALERT_RSS_GROWTH = float(os.environ.get('SERVICE_ALERT_RSS_GROWTH', 50.0))
+SERVICE_ALERT_RSS_WINDOW = float(os.environ.get('SERVICE_ALERT_RSS_WINDOW', 600.0))
+SERVICE_ALERT_RSS = float(os.environ.get('SERVICE_ALERT_RSS', 0.0))
+SERVICE_ALERT_CPU = float(os.environ.get('SERVICE_ALERT_CPU', 90.0))
+SERVICE_ALERT_CPU_FOR = float(os.environ.get('SERVICE_ALERT_CPU_FOR', 30.0))
+RESOURCE_ALERT_DEFAULTS = {
+    'rss_growth_mb_per_hour': SERVICE_ALERT_RSS_GROWTH,
+    'rss_window': SERVICE_ALERT_RSS_WINDOW,
+    'rss_mb': SERVICE_ALERT_RSS,
+    'cpu_percent': SERVICE_ALERT_CPU,
+    'cpu_for': SERVICE_ALERT_CPU_FOR
+}
+# Рост RSS в первые секунды процесса (загрузка, кэши) в оценку утечки не входит
+RESOURCE_WARMUP = 60.0
+MB = 1024 * 1024
+# Строка без перевода длиннее этого режется на части, чтобы буфер не рос без предела
+SERVICE_LOG_MAX_LINE = 16384
+
+# Логирование через общую очередь с ограничением частоты (как у сервисов)
+setup_logging("service_manager", logging.WARNING)
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -48,6 +159,949 @@ class ServiceInfo:
     max_restarts: int = 5
     last_start_time: Optional[datetime] = None
     last_restart: float = 0
+    exit_code: Optional[int] = None
+    state: str = 'stopped'  # starting, ready, unready (проба не прошла за таймаут), exited, backoff, stopped
+    started_monotonic: float = 0.0
+    time_to_ready: Optional[float] = None
+    ready_future: Optional[Any] = None  # concurrent.futures.Future пробы готовности
+    manifest: Optional['ServiceManifest'] = None
+    control: Optional[ControlChannel] = None  # Канал управления процесса (restart_mode hot-swap)
+    handover: Optional[subprocess.Popen] = None  # Резервный экземпляр во время перезапуска без простоя
+    hang_count: int = 0
+    failures: deque = field(default_factory=deque)  # Время падений (monotonic) в окне restart_window
+    crash_streak: int = 0  # Падений подряд без стабильной работы
+    restart_handle: Optional[asyncio.TimerHandle] = None  # Отложенный перезапуск
+    restart_at: float = 0.0
+    restart_latencies: deque = field(default_factory=lambda: deque(maxlen=RESTART_LATENCY_SAMPLES))  # мс
+
+@dataclass
+class ReadinessProbe:
+    """Проба готовности сервиса"""
+    kind: str  # tcp, http, log
+    target: str
+    timeout: float = SERVICE_READY_TIMEOUT
+
+    @classmethod
+    def parse(cls, spec: str) -> 'ReadinessProbe':
+        spec = spec.strip()
+        timeout = SERVICE_READY_TIMEOUT
+        head, sep, tail = spec.rpartition('@')
+        if sep and re.fullmatch(r'\d+(\.\d+)?', tail):
+            spec, timeout = head, float(tail)
+        if spec.startswith(('http://', 'https://')):
+            return cls('http', spec, timeout)
+        kind, sep, target = spec.partition(':')
+        if kind not in ('tcp', 'log') or not target:
+            raise ValueError(f"неизвестная проба готовности '{spec}'")
+        return cls(kind, target, timeout)
+
+    def __str__(self) -> str:
+        return self.target if self.kind == 'http' else f"{self.kind}:{self.target}"
+
+def parse_readiness_probes(spec: str) -> Dict[str, ReadinessProbe]:
+    """SERVICE_READY: "camera_service=http://127.0.0.1:5002/api/cameras/metrics@20;camera_worker=tcp:5003\""""
+    probes = {}
+    for item in filter(None, (part.strip() for part in spec.split(';'))):
+        name, _, probe = item.partition('=')
+        try:
+            probes[name.strip()] = ReadinessProbe.parse(probe)
+        except ValueError as e:
+            logger.error(f"SERVICE_READY: {name}: {e}")
+    return probes
+
+async def check_tcp(target: str, timeout: float) -> bool:
+    """Подключение за timeout секунд (SYN к недоступному хосту иначе ждет минуты)"""
+    host, _, port = target.rpartition(':')
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host or '127.0.0.1', int(port)), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+async def check_http(url: str, timeout: float) -> bool:
+    """Ответ 2xx/3xx за timeout секунд, но не дольше READY_PROBE_INTERVAL * 20 на попытку"""
+    parts = urllib.parse.urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    deadline = time.monotonic() + min(timeout, READY_PROBE_INTERVAL * 20)
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=parts.scheme == 'https'),
+            deadline - time.monotonic())
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: {parts.netloc}\r\n\r\n".encode('ascii'))
+        status_line = await asyncio.wait_for(reader.readline(), max(0.0, deadline - time.monotonic()))
+        code = int(status_line.split()[1])
+        return 200 <= code < 400
+    except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
+
+_ENV_REF_RE = re.compile(r'\$\{(\w+)(?::-([^}]*))?\}')
+
+def expand_env(value: Any) -> Any:
+    """${VAR} и ${VAR:-по умолчанию} в строках манифеста"""
+    if isinstance(value, str):
+        return _ENV_REF_RE.sub(lambda match: os.environ.get(match.group(1), match.group(2) or ''), value)
+    if isinstance(value, list):
+        return [expand_env(item) for item in value]
+    if isinstance(value, dict):
+        return {key: expand_env(item) for key, item in value.items()}
+    return value
+
+@dataclass
+class ServiceManifest:
+    """Описание сервиса; без файла манифеста - значения по умолчанию для {имя}.py"""
+    name: str
+    command: List[str]
+    env: Dict[str, str] = field(default_factory=dict)
+    port: Optional[int] = None  # Слушающий порт: освобождается перед запуском
+    ready: Optional[ReadinessProbe] = None
+    depends_on: List[str] = field(default_factory=list)
+    restart: str = 'always'  # always, on-failure (код != 0), never
+    restart_mode: str = 'stop-start'  # stop-start, hot-swap
+    max_restarts: int = 5  # Падений за restart_window до паузы в перезапусках
+    restart_window: float = SERVICE_RESTART_WINDOW
+    resource_class: str = 'normal'
+    stop_timeout: float = 5.0
+    port_conflict: str = SERVICE_PORT_CONFLICT  # kill, wait, fail
+    listen: List[Tuple[str, int]] = field(default_factory=list)  # Сокеты, открываемые менеджером
+    hang_timeout: float = SERVICE_HANG_TIMEOUT  # Пауза пульса до признания зависшим (0 - без сторожа)
+    hang_action: str = SERVICE_HANG_ACTION  # restart, dump
+    alerts: Dict[str, float] = field(default_factory=lambda: dict(RESOURCE_ALERT_DEFAULTS))
+    enabled: bool = True
+    source: str = ''
+
+def parse_listen_address(address: str) -> Tuple[str, int]:
+    """'0.0.0.0:5002', '[::]:5002' или '5002' -> (хост, порт)"""
+    host, _, port = str(address).rpartition(':')
+    return host.strip('[]') or '0.0.0.0', int(port)
+
+def load_manifest(name: str, script: Optional[Path], manifest_path: Optional[Path],
+                  python_exe: str) -> ServiceManifest:
+    """Манифест сервиса (ошибки формата - ValueError)
+
+    Пример camera_worker.service.json:
+        {"port": "${CAMERA_WORKER_PORT:-5003}", "ready": "tcp:${CAMERA_WORKER_PORT:-5003}",
+         "depends_on": ["camera_service"], "restart": "always", "resource_class": "normal"}
+    В command подставляются {python} (python из venv) и {dir} (каталог манифеста).
+    """
+    data: Dict[str, Any] = {}
+    if manifest_path is not None:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = expand_env(json.load(f))
+        if not isinstance(data, dict):
+            raise ValueError("ожидается JSON объект")
+    base_dir = str((manifest_path or script).parent)
+    command = data.get('command')
+    if command is None:
+        if script is None:
+            raise ValueError("нет command и нет .py файла")
+        command = ['{python}', str(script)]
+    elif isinstance(command, str):
+        command = shlex.split(command)
+    command = [str(part).replace('{python}', python_exe).replace('{dir}', base_dir) for part in command]
+
+    restart = data.get('restart', 'always')
+    if restart not in RESTART_POLICIES:
+        raise ValueError(f"restart должен быть одним из {', '.join(RESTART_POLICIES)}")
+    resource_class = data.get('resource_class', 'normal')
+    if resource_class not in RESOURCE_CLASSES:
+        raise ValueError(f"resource_class должен быть одним из {', '.join(RESOURCE_CLASSES)}")
+    restart_mode = data.get('restart_mode', 'stop-start')
+    if restart_mode not in RESTART_MODES:
+        raise ValueError(f"restart_mode должен быть одним из {', '.join(RESTART_MODES)}")
+    hang_action = data.get('hang_action', SERVICE_HANG_ACTION)
+    if hang_action not in HANG_ACTIONS:
+        raise ValueError(f"hang_action должен быть одним из {', '.join(HANG_ACTIONS)}")
+    alerts = data.get('alerts', {})
+    if not isinstance(alerts, dict) or set(alerts) - set(RESOURCE_ALERT_DEFAULTS):
+        raise ValueError(f"alerts - объект с полями {', '.join(RESOURCE_ALERT_DEFAULTS)}")
+    port_conflict = data.get('port_conflict', SERVICE_PORT_CONFLICT)
+    if port_conflict not in PORT_CONFLICT_POLICIES:
+        raise ValueError(f"port_conflict должен быть одним из {', '.join(PORT_CONFLICT_POLICIES)}")
+    depends_on = data.get('depends_on', [])
+    if isinstance(depends_on, str):
+        depends_on = [depends_on]
+    listen = data.get('listen', [])
+    listen = [parse_listen_address(address) for address in ([listen] if isinstance(listen, (str, int)) else listen)]
+    ready = ReadinessProbe.parse(data['ready']) if data.get('ready') else None
+    if ready is not None and ready.kind == 'tcp' and int(ready.target.rpartition(':')[2]) in [port for _, port in listen]:
+        # Сокет менеджера принимает соединения в backlog еще до запуска сервиса
+        raise ValueError("проба tcp не подходит для порта из listen, нужна http или log")
+    if restart_mode == 'hot-swap' and not listen:
+        # Без сокета менеджера оба экземпляра не могут по очереди принимать соединения
+        raise ValueError("restart_mode hot-swap требует listen")
+    return ServiceManifest(
+        name=name,
+        command=command,
+        env={key: str(value) for key, value in data.get('env', {}).items()},
+        port=int(data['port']) if data.get('port') not in (None, '') else None,
+        ready=ready,
+        depends_on=list(depends_on),
+        restart=restart,
+        restart_mode=restart_mode,
+        max_restarts=int(data.get('max_restarts', 5)),
+        restart_window=float(data.get('restart_window', SERVICE_RESTART_WINDOW)),
+        resource_class=resource_class,
+        stop_timeout=float(data.get('stop_timeout', 5.0)),
+        port_conflict=port_conflict,
+        listen=listen,
+        hang_timeout=float(data.get('hang_timeout', SERVICE_HANG_TIMEOUT)),
+        hang_action=hang_action,
+        alerts={**RESOURCE_ALERT_DEFAULTS, **{key: float(value) for key, value in alerts.items()}},
+        enabled=bool(data.get('enabled', True)),
+        source=str(manifest_path or script)
+    )
+
+def dependency_order(depends_on: Dict[str, List[str]]) -> List[str]:
+    """Топологический порядок: зависимости раньше зависящих (цикл - ValueError)"""
+    order: List[str] = []
+    visiting: set = set()
+    done: set = set()
+
+    def visit(name: str, path: List[str]):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError("циклическая зависимость " + " -> ".join(path + [name]))
+        visiting.add(name)
+        for dependency in depends_on[name]:
+            if dependency in depends_on:
+                visit(dependency, path + [name])
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for name in sorted(depends_on):
+        visit(name, [])
+    return order
+
+class PortOwners:
+    """Владельцы слушающих TCP портов по таблицам ядра
+
+    Вместо net_connections() каждого процесса: /proc/net/tcp{,6} дает inode и uid
+    сокета на порту, затем inode ищется среди /proc/<pid>/fd только процессов
+    с этим uid, начиная с ранее найденного владельца. Таблицы кэшируются на
+    PORT_INDEX_TTL секунд.
+    """
+
+    TABLES = ('/proc/net/tcp', '/proc/net/tcp6')
+    LISTEN = '0A'
+
+    def __init__(self, ttl: float = PORT_INDEX_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.listeners: Dict[int, List[Tuple[int, int]]] = {}  # порт -> [(inode, uid)]
+        self.loaded_at = float('-inf')
+        self.owners: Dict[int, int] = {}  # inode -> pid последнего найденного владельца
+
+    def _load(self):
+        listeners: Dict[int, List[Tuple[int, int]]] = {}
+        for table in self.TABLES:
+            try:
+                f = open(table, 'r')
+            except OSError:
+                continue
+            with f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 10 or fields[3] != self.LISTEN:
+                        continue
+                    port = int(fields[1].rpartition(':')[2], 16)
+                    listeners.setdefault(port, []).append((int(fields[9]), int(fields[7])))
+        self.listeners = listeners
+        self.loaded_at = time.monotonic()
+
+    def listening(self, port: int, fresh: bool = False) -> List[Tuple[int, int]]:
+        """Слушающие сокеты порта: [(inode, uid)]"""
+        with self.lock:
+            if fresh or time.monotonic() - self.loaded_at > self.ttl:
+                self._load()
+            return list(self.listeners.get(port, []))
+
+    def find_owners(self, port: int, fresh: bool = False) -> Tuple[List[int], bool]:
+        """PID процессов, слушающих порт (без самого менеджера), и признак сокета без найденного владельца"""
+        pids = set()
+        unresolved = False
+        for inode, uid in self.listening(port, fresh):
+            pid = self._owner(inode, uid)
+            if pid is None:
+                unresolved = True
+            elif pid != os.getpid():
+                pids.add(pid)
+        return sorted(pids), unresolved
+
+    def _owner(self, inode: int, uid: int) -> Optional[int]:
+        target = f"socket:[{inode}]"
+        pid = self.owners.get(inode)
+        if pid is None or not self._holds(pid, target):
+            pid = next((candidate for candidate in self._pids_of_uid(uid) if self._holds(candidate, target)), None)
+            if pid is None:
+                return None
+        # Сокет наследуется (uvicorn с воркерами): владелец - верхний процесс с этим сокетом,
+        # иначе родитель перезапустит завершенного потомка
+        parent = self._parent(pid)
+        while parent and self._holds(parent, target):
+            pid, parent = parent, self._parent(parent)
+        self.owners[inode] = pid
+        return pid
+
+    @staticmethod
+    def _pids_of_uid(uid: int):
+        for entry in os.scandir('/proc'):
+            if entry.name.isdigit():
+                try:
+                    if entry.stat().st_uid == uid:
+                        yield int(entry.name)
+                except OSError:
+                    continue
+
+    @staticmethod
+    def _holds(pid: int, target: str) -> bool:
+        try:
+            with os.scandir(f"/proc/{pid}/fd") as entries:
+                for entry in entries:
+                    try:
+                        if os.readlink(entry.path) == target:
+                            return True
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return False
+
+    @staticmethod
+    def _parent(pid: int) -> Optional[int]:
+        try:
+            with open(f"/proc/{pid}/stat", 'r') as f:
+                # Имя процесса в скобках может содержать пробелы
+                return int(f.read().rpartition(')')[2].split()[1]) or None
+        except (OSError, ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def describe(pid: int) -> str:
+        try:
+            with open(f"/proc/{pid}/comm", 'r') as f:
+                return f"{pid} ({f.read().strip()})"
+        except OSError:
+            return str(pid)
+
+class ChildWatcher:
+    """Уведомления о завершении дочерних процессов в event loop менеджера
+
+    pidfd (Linux 5.3+, Python 3.9+) становится читаемым в момент выхода процесса,
+    loop.add_reader будит цикл без опроса. Без pidfd - поток на процесс,
+    заблокированный в waitpid. В обоих случаях зомби собирается сразу.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_exit):
+        self.loop = loop
+        self.on_exit = on_exit  # on_exit(process, returncode, exited_at) в потоке цикла
+        self.pidfds: Dict[int, int] = {}
+
+    def watch(self, process: subprocess.Popen):
+        """Подписка на завершение процесса (вызывается в потоке цикла)"""
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except ProcessLookupError:
+            # Процесс уже завершен и собран через poll() - сообщаем сразу
+            self.loop.call_soon(self._notify, process)
+            return
+        except (AttributeError, OSError):
+            threading.Thread(target=self._wait_blocking, args=(process,),
+                             name=f"waitpid-{process.pid}", daemon=True).start()
+            return
+        self.pidfds[process.pid] = pidfd
+        self.loop.add_reader(pidfd, self._on_pidfd, process)
+
+    def _on_pidfd(self, process: subprocess.Popen):
+        pidfd = self.pidfds.pop(process.pid, None)
+        if pidfd is not None:
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        self._notify(process)
+
+    def _notify(self, process: subprocess.Popen):
+        exited_at = time.monotonic()
+        # Процесс уже завершен: wait() только вызывает waitpid и не блокирует
+        self.on_exit(process, process.wait(), exited_at)
+
+    def _wait_blocking(self, process: subprocess.Popen):
+        returncode = process.wait()
+        self.loop.call_soon_threadsafe(self.on_exit, process, returncode, time.monotonic())
+
+    def close(self):
+        for pidfd in self.pidfds.values():
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        self.pidfds.clear()
+
+@dataclass
+class HeartbeatState:
+    """Пульс одного процесса"""
+    process: subprocess.Popen
+    sock: socket.socket
+    timeout: float
+    sources: Dict[str, Tuple[float, float]] = field(default_factory=dict)  # Источник -> (пульс, срок)
+    hung: set = field(default_factory=set)
+    dump_only: set = field(default_factory=set)  # Источники, зависание которых - только дамп стеков
+
+class HeartbeatMonitor:
+    """Пульс сервисов (common/heartbeat.py) в event loop менеджера
+
+    Каждый процесс получает свой датаграммный socketpair - отправитель известен по
+    сокету. Датаграмма: "источник [пауза [dump]]" - пульс (dump - зависание источника не
+    ведет к перезапуску), "-источник" - источник завершился.
+    Раз в HEARTBEAT_CHECK_INTERVAL (только пока есть наблюдаемые процессы) источники
+    с истекшим сроком передаются on_hang - один раз до возобновления пульса.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_hang):
+        self.loop = loop
+        self.on_hang = on_hang  # on_hang(process, source, age, dump_only) в потоке цикла
+        self.watched: Dict[int, HeartbeatState] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    @staticmethod
+    def pair() -> Tuple[socket.socket, socket.socket]:
+        """Свой конец канала и сокет для дочернего процесса"""
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        ours.setblocking(False)
+        return ours, theirs
+
+    def watch(self, process: subprocess.Popen, sock: socket.socket, timeout: float):
+        """Подписка на пульс процесса (вызывается в потоке цикла)"""
+        state = HeartbeatState(process, sock, timeout)
+        self.watched[process.pid] = state
+        self.loop.add_reader(sock.fileno(), self._read, state)
+        if self.timer is None:
+            self.timer = self.loop.call_later(HEARTBEAT_CHECK_INTERVAL, self._check)
+
+    def _read(self, state: HeartbeatState):
+        now = time.monotonic()
+        while True:
+            try:
+                data = state.sock.recv(256)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self.forget(state.process)
+                return
+            message = data.decode(errors='replace').strip()
+            if message.startswith('-'):
+                state.sources.pop(message[1:], None)
+                state.hung.discard(message[1:])
+                state.dump_only.discard(message[1:])
+                continue
+            source, pause, action = (message.split(' ', 2) + ['', ''])[:3]
+            try:
+                pause = float(pause) if pause else state.timeout
+            except ValueError:
+                pause = state.timeout
+            state.sources[source] = (now, now + pause)
+            if action == 'dump':
+                state.dump_only.add(source)
+            else:
+                state.dump_only.discard(source)
+            if source in state.hung:
+                state.hung.discard(source)
+                logger.warning(f"Пульс {source} процесса {state.process.pid} возобновился")
+
+    def _check(self):
+        now = time.monotonic()
+        for state in list(self.watched.values()):
+            for source, (last, deadline) in list(state.sources.items()):
+                if now > deadline and source not in state.hung:
+                    state.hung.add(source)
+                    self.on_hang(state.process, source, now - last, source in state.dump_only)
+        self.timer = self.loop.call_later(HEARTBEAT_CHECK_INTERVAL, self._check) if self.watched else None
+
+    def ages(self, process: subprocess.Popen) -> Dict[str, float]:
+        """Время с последнего пульса по источникам, секунд"""
+        state = self.watched.get(process.pid)
+        if state is None or state.process is not process:
+            return {}
+        now = time.monotonic()
+        return {source: round(now - last, 3) for source, (last, _) in list(state.sources.items())}
+
+    def forget(self, process: subprocess.Popen):
+        """Отписка (процесс завершился; вызывается в потоке цикла)"""
+        state = self.watched.get(process.pid)
+        if state is None or state.process is not process:
+            return
+        del self.watched[process.pid]
+        self.loop.remove_reader(state.sock.fileno())
+        state.sock.close()
+
+    def close(self):
+        for state in list(self.watched.values()):
+            self.forget(state.process)
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+LOG_LEVEL_NAMES = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+_LEVEL_RE = re.compile(r'\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b')
+
+def parse_level(text: str, stream: str, previous: str) -> str:
+    """Уровень строки вывода: из текстового или JSON формата common/log_setup, uvicorn;
+    строки трейсбека наследуют уровень, остальное - по потоку"""
+    if text.startswith('{'):
+        try:
+            level = json.loads(text).get('level')
+            if level in LOG_LEVEL_NAMES:
+                return level
+        except (ValueError, AttributeError):
+            pass
+    match = _LEVEL_RE.search(text, 0, 120)
+    if match:
+        return match.group(1)
+    if text.startswith('Traceback'):
+        return 'ERROR'
+    if not text or text[0].isspace():
+        return previous
+    return 'ERROR' if stream == 'stderr' else 'INFO'
+
+@dataclass
+class LogLine:
+    """Строка вывода сервиса"""
+    seq: int
+    ts: float
+    stream: str  # stdout, stderr или manager (события запуска/завершения)
+    level: str
+    text: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        # timestamp/type/message - как у /api/logs Node.js сервера (LogViewer)
+        log_type = 'error' if self.level in ('ERROR', 'CRITICAL') else 'warning' if self.level == 'WARNING' else 'info'
+        return {"seq": self.seq, "timestamp": int(self.ts * 1000), "level": self.level, "type": log_type,
+                "stream": self.stream, "message": self.text}
+
+class RotatingLogFile:
+    """Запись журнала на диск с ротацией по размеру: name.log, name.log.1, ..."""
+
+    def __init__(self, path: Path, max_bytes: int, backups: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, 'ab')
+        self.size = self.file.tell()
+
+    def write(self, data: bytes):
+        if self.size and self.size + len(data) > self.max_bytes:
+            self._rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def _rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self.file = open(self.path, 'ab')
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+
+class ServiceLog:
+    """Кольцевой буфер строк вывода сервиса (общий для всех его перезапусков)"""
+
+    def __init__(self, name: str, max_lines: int = SERVICE_LOG_LINES):
+        self.name = name
+        self.lines: deque = deque(maxlen=max_lines)
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.partial: Dict[str, bytes] = {'stdout': b'', 'stderr': b''}
+        self.last_level: Dict[str, str] = {'stdout': 'INFO', 'stderr': 'INFO'}
+        self.file = RotatingLogFile(Path(SERVICE_LOG_DIR) / f"{name}.log", SERVICE_LOG_MAX_BYTES,
+                                    SERVICE_LOG_BACKUPS) if SERVICE_LOG_DIR else None
+        self.watchers: List[Tuple[str, Any]] = []  # (подстрока, callback) для проб готовности по выводу
+
+    def feed(self, stream: str, data: bytes):
+        """Очередной кусок из канала: в буфер попадают только целые строки"""
+        *complete, rest = (self.partial[stream] + data).split(b'\n')
+        if len(rest) > SERVICE_LOG_MAX_LINE:
+            complete.append(rest)
+            rest = b''
+        self.partial[stream] = rest
+        if complete:
+            self._append(stream, complete)
+
+    def flush(self, stream: str):
+        """Конец канала: недописанная строка тоже попадает в буфер"""
+        rest, self.partial[stream] = self.partial[stream], b''
+        if rest:
+            self._append(stream, [rest])
+
+    def mark(self, text: str, level: str = 'INFO'):
+        """Событие менеджера (запуск, завершение) в журнале сервиса"""
+        with self.cond:
+            self._add(time.time(), 'manager', level, text)
+            self.cond.notify_all()
+
+    def watch_for(self, marker: str, callback, after: int = 0):
+        """callback() при строке вывода с marker, включая уже полученные после номера after"""
+        with self.cond:
+            if any(marker in line.text for line in self.lines if line.seq > after and line.stream != 'manager'):
+                callback()
+                return
+            self.watchers.append((marker, callback))
+
+    def unwatch(self, callback):
+        with self.cond:
+            self.watchers = [watcher for watcher in self.watchers if watcher[1] is not callback]
+
+    def _append(self, stream: str, chunks: List[bytes]):
+        now = time.time()
+        matched = []
+        with self.cond:
+            for chunk in chunks:
+                text = chunk.decode('utf-8', errors='replace').rstrip('\r')
+                level = parse_level(text, stream, self.last_level[stream])
+                self.last_level[stream] = level
+                self._add(now, stream, level, text)
+                matched.extend(callback for marker, callback in self.watchers if marker in text)
+            self.cond.notify_all()
+        for callback in matched:
+            callback()
+
+    def _add(self, ts: float, stream: str, level: str, text: str):
+        self.seq += 1
+        self.lines.append(LogLine(self.seq, ts, stream, level, text))
+        if self.file is not None:
+            stamp = datetime.fromtimestamp(ts).isoformat(sep=' ', timespec='milliseconds')
+            try:
+                self.file.write(f"{stamp} {stream} {text}\n".encode('utf-8'))
+            except OSError as e:
+                logger.error(f"Ошибка записи журнала {self.name} на диск, запись отключена: {e}")
+                self.file = None
+
+    def query(self, lines: Optional[int] = 100, after: int = 0, min_level: int = 0,
+              stream: Optional[str] = None) -> Tuple[List[LogLine], int]:
+        """Последние lines строк после номера after с фильтром; второе значение - номер последней строки"""
+        with self.cond:
+            last_seq = self.seq
+            if after >= last_seq:
+                return [], last_seq
+            selected = [line for line in self.lines if line.seq > after
+                        and (not min_level or logging.getLevelName(line.level) >= min_level)
+                        and (stream is None or line.stream == stream)]
+        return (selected[-lines:] if lines else selected), last_seq
+
+    def wait(self, after: int, timeout: float) -> bool:
+        """Ожидание строк с номером больше after"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.seq > after, timeout)
+
+class LogPump:
+    """Неблокирующее чтение stdout/stderr дочерних процессов в event loop менеджера
+
+    Канал, который никто не читает, заполняется (~64 КБ), и сервис блокируется
+    на записи в лог. Здесь каналы читаются по готовности (add_reader) целиком.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.pipes: Dict[int, Any] = {}  # fd -> файл канала (ссылка держит fd открытым)
+
+    def attach(self, process: subprocess.Popen, log: ServiceLog):
+        """Подключение каналов процесса (вызывается в потоке цикла)"""
+        for stream, pipe in (('stdout', process.stdout), ('stderr', process.stderr)):
+            if pipe is None:
+                continue
+            fd = pipe.fileno()
+            os.set_blocking(fd, False)
+            self.pipes[fd] = pipe
+            self.loop.add_reader(fd, self._read, fd, log, stream)
+
+    def _read(self, fd: int, log: ServiceLog, stream: str):
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if data:
+            log.feed(stream, data)
+            return
+        # Конец канала: процесс (и все, кто унаследовал канал) завершился
+        self.loop.remove_reader(fd)
+        self.pipes.pop(fd).close()
+        log.flush(stream)
+
+    def close(self):
+        for fd, pipe in self.pipes.items():
+            self.loop.remove_reader(fd)
+            pipe.close()
+        self.pipes.clear()
+
+@dataclass
+class ResourceSample:
+    """Замер ресурсов процесса сервиса"""
+    ts: float
+    pid: int
+    cpu_percent: Optional[float]  # Процент одного ядра с прошлого замера (None - первый замер процесса)
+    rss: int
+    threads: int
+    fds: int
+    read_bytes: Optional[int]  # Нет прав на /proc/<pid>/io - None
+    write_bytes: Optional[int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": int(self.ts * 1000),
+            "pid": self.pid,
+            "cpu_percent": round(self.cpu_percent, 1) if self.cpu_percent is not None else None,
+            "rss_mb": round(self.rss / MB, 1),
+            "threads": self.threads,
+            "fds": self.fds,
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes
+        }
+
+class ResourceHistory:
+    """Кольцевой буфер замеров ресурсов сервиса и пороговые предупреждения
+
+    Замеры пишет поток цикла менеджера, читает HTTP API: deque с maxlen
+    добавляет и вытесняет без блокировок, чтение - по копии.
+    """
+
+    def __init__(self, name: str, size: int = SERVICE_SAMPLE_HISTORY):
+        self.name = name
+        self.samples: deque = deque(maxlen=size)
+        self.alerts: Dict[str, str] = {}  # Активные предупреждения: имя -> описание
+        self.last_cpu: Optional[Tuple[int, float, float]] = None  # (pid, время CPU, monotonic)
+        self.series_start = 0.0  # Начало замеров текущего процесса (time.time())
+
+    def add(self, pid: int, cpu_time: float, rss: int, threads: int, fds: int,
+            read_bytes: Optional[int], write_bytes: Optional[int]) -> ResourceSample:
+        now = time.time()
+        monotonic = time.monotonic()
+        cpu_percent = None
+        if self.last_cpu is not None and self.last_cpu[0] == pid and monotonic > self.last_cpu[2]:
+            cpu_percent = max(0.0, (cpu_time - self.last_cpu[1]) / (monotonic - self.last_cpu[2]) * 100.0)
+        if self.last_cpu is None or self.last_cpu[0] != pid:
+            self.series_start = now
+        self.last_cpu = (pid, cpu_time, monotonic)
+        sample = ResourceSample(now, pid, cpu_percent, rss, threads, fds, read_bytes, write_bytes)
+        self.samples.append(sample)
+        return sample
+
+    def query(self, seconds: Optional[float] = None) -> List[ResourceSample]:
+        samples = list(self.samples)
+        if seconds is None:
+            return samples
+        since = time.time() - seconds
+        return [sample for sample in samples if sample.ts >= since]
+
+    def rss_growth(self, seconds: float) -> Optional[float]:
+        """Рост RSS текущего процесса, МБ/час (наклон по методу наименьших квадратов)
+
+        Без первых RESOURCE_WARMUP секунд процесса (рост при запуске - не утечка);
+        None - замеров меньше трех или они покрывают меньше половины окна.
+        """
+        samples = self.query(seconds)
+        if not samples:
+            return None
+        pid = samples[-1].pid
+        points = [(sample.ts, sample.rss) for sample in samples
+                  if sample.pid == pid and sample.ts >= self.series_start + RESOURCE_WARMUP]
+        if len(points) < 3 or points[-1][0] - points[0][0] < seconds / 2:
+            return None
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_rss = sum(rss for _, rss in points) / len(points)
+        variance = sum((t - mean_t) ** 2 for t, _ in points)
+        if variance <= 0:
+            return None
+        slope = sum((t - mean_t) * (rss - mean_rss) for t, rss in points) / variance
+        return slope * 3600.0 / MB
+
+    def check(self, sample: ResourceSample, limits: Dict[str, float]) -> Tuple[List[str], List[str]]:
+        """Пересчет предупреждений после замера: (новые, снятые)"""
+        active: Dict[str, str] = {}
+        growth = self.rss_growth(limits['rss_window']) if limits['rss_growth_mb_per_hour'] > 0 else None
+        if growth is not None and growth >= limits['rss_growth_mb_per_hour']:
+            active['rss_growth'] = (f"RSS растет на {growth:.0f} МБ/час "
+                                    f"(порог {limits['rss_growth_mb_per_hour']:g}, сейчас {sample.rss / MB:.0f} МБ)")
+        if limits['rss_mb'] > 0 and sample.rss >= limits['rss_mb'] * MB:
+            active['rss_limit'] = f"RSS {sample.rss / MB:.0f} МБ (порог {limits['rss_mb']:g} МБ)"
+        if limits['cpu_percent'] > 0 and sample.ts - self.series_start >= limits['cpu_for']:
+            # Среднее за cpu_for секунд: отдельные провалы и всплески не переключают предупреждение
+            cpu = [item.cpu_percent for item in self.query(limits['cpu_for'])
+                   if item.pid == sample.pid and item.cpu_percent is not None]
+            average = sum(cpu) / len(cpu) if cpu else 0.0
+            if average >= limits['cpu_percent']:
+                active['cpu_saturation'] = (f"CPU в среднем {average:.0f}% за {limits['cpu_for']:g} с "
+                                            f"(порог {limits['cpu_percent']:g}%)")
+        raised = [name for name in active if name not in self.alerts]
+        cleared = [name for name in self.alerts if name not in active]
+        self.alerts = active
+        return raised, cleared
+
+    def summary(self, seconds: Optional[float] = None, rss_window: float = SERVICE_ALERT_RSS_WINDOW) -> Dict[str, Any]:
+        samples = self.query(seconds)
+        if not samples:
+            return {"samples": 0}
+        cpu = [sample.cpu_percent for sample in samples if sample.cpu_percent is not None]
+        rss = [sample.rss for sample in samples]
+        growth = self.rss_growth(rss_window)
+        return {
+            "samples": len(samples),
+            "since": int(samples[0].ts * 1000),
+            "cpu_percent": {"avg": round(sum(cpu) / len(cpu), 1), "max": round(max(cpu), 1)} if cpu else None,
+            "rss_mb": {"last": round(rss[-1] / MB, 1), "min": round(min(rss) / MB, 1), "max": round(max(rss) / MB, 1)},
+            "rss_growth_mb_per_hour": round(growth, 1) if growth is not None else None,
+            "threads": samples[-1].threads,
+            "fds": samples[-1].fds,
+            "alerts": dict(self.alerts)
+        }
+
+class ManagerRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API менеджера
+
+    GET /services                     - состояние сервисов
+    GET /services/{name}/logs         - журнал: lines (100), after (номер строки),
+                                        level (минимальный уровень), stream (stdout|stderr|manager),
+                                        follow=1 - новые строки по мере появления (NDJSON)
+    GET /services/{name}/resources    - замеры ресурсов: seconds (вся история), samples=0 - только сводка
+    GET /resources                    - сводка ресурсов всех сервисов: seconds (SERVICE_ALERT_RSS_WINDOW)
+    POST /services/{name}/restart     - перезапуск (restart_mode манифеста), ответ после готовности;
+                                        X-Manager-Token или, без SERVICE_MANAGER_TOKEN, локальный клиент
+    """
+
+    FOLLOW_KEEPALIVE = 15.0
+
+    def log_message(self, format, *args):
+        pass  # Журнал запросов не нужен
+
+    def _send_json(self, data: Any, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if self.command == 'GET':
+            self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        """POST: токен менеджера; без токена - только локальный клиент и не из браузера (нет Origin)"""
+        if MANAGER_TOKEN:
+            return hmac.compare_digest(self.headers.get('X-Manager-Token', ''), MANAGER_TOKEN)
+        try:
+            local = ipaddress.ip_address(self.client_address[0]).is_loopback
+        except ValueError:
+            local = False
+        return local and self.headers.get('Origin') is None
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        parts = [urllib.parse.unquote(part) for part in url.path.split('/') if part]
+        manager: 'ServiceManager' = self.server.manager
+        try:
+            if parts == ['services']:
+                self._send_json({"services": manager.get_status()})
+            elif len(parts) == 3 and parts[0] == 'services' and parts[2] == 'logs':
+                self._logs(manager, parts[1], query)
+            elif len(parts) == 3 and parts[0] == 'services' and parts[2] == 'resources':
+                self._resources(manager, parts[1], query)
+            elif parts == ['resources']:
+                seconds = float(query.get('seconds', SERVICE_ALERT_RSS_WINDOW))
+                self._send_json({"interval": SERVICE_SAMPLE_INTERVAL,
+                                 "services": {name: history.summary(seconds)
+                                              for name, history in list(manager.resources.items())}})
+            else:
+                self._send_json({"detail": "Не найдено"}, 404)
+        except ValueError as e:
+            self._send_json({"detail": f"Неверный параметр: {e}"}, 400)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        parts = [urllib.parse.unquote(part) for part in urllib.parse.urlsplit(self.path).path.split('/') if part]
+        manager: 'ServiceManager' = self.server.manager
+        try:
+            if not self._authorized():
+                self._send_json({"detail": "Нужен токен менеджера (X-Manager-Token)"}, 403)
+            elif len(parts) == 3 and parts[0] == 'services' and parts[2] == 'restart':
+                name = parts[1]
+                if name not in manager.services:
+                    self._send_json({"detail": f"Сервис {name} не найден"}, 404)
+                    return
+                started = time.monotonic()
+                restarted = manager.restart_service(name)
+                self._send_json({"service": name, "restarted": restarted,
+                                 "duration": round(time.monotonic() - started, 3),
+                                 "status": manager.get_status().get(name)}, 200 if restarted else 500)
+            else:
+                self._send_json({"detail": "Не найдено"}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _resources(self, manager: 'ServiceManager', name: str, query: Dict[str, str]):
+        history = manager.resources.get(name)
+        if history is None:
+            self._send_json({"detail": f"Нет замеров сервиса {name}"}, 404)
+            return
+        seconds = float(query['seconds']) if query.get('seconds') else None
+        data = {"service": name, "interval": SERVICE_SAMPLE_INTERVAL, "summary": history.summary(seconds)}
+        if query.get('samples') not in ('0', 'false'):
+            data["samples"] = [sample.to_dict() for sample in history.query(seconds)]
+        self._send_json(data)
+
+    def _logs(self, manager: 'ServiceManager', name: str, query: Dict[str, str]):
+        log = manager.logs.get(name)
+        if log is None:
+            self._send_json({"detail": f"Сервис {name} не найден"}, 404)
+            return
+        lines = max(1, min(SERVICE_LOG_LINES, int(query.get('lines', 100))))
+        after = int(query.get('after', 0))
+        min_level = 0
+        if query.get('level'):
+            min_level = logging.getLevelName(query['level'].upper())
+            if not isinstance(min_level, int):
+                raise ValueError(f"level={query['level']}")
+        stream = query.get('stream') or None
+        entries, last_seq = log.query(lines, after, min_level, stream)
+        if query.get('follow') not in ('1', 'true'):
+            self._send_json({"service": name, "logs": [entry.to_dict() for entry in entries], "last_seq": last_seq})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        while True:
+            if entries:
+                self.wfile.write(''.join(json.dumps(entry.to_dict(), ensure_ascii=False) + '\n'
+                                         for entry in entries).encode('utf-8'))
+            elif last_seq == after:
+                self.wfile.write(b'\n')  # Проверка, что клиент еще подключен
+            self.wfile.flush()
+            if not manager.is_running:
+                return
+            after = last_seq
+            log.wait(after, self.FOLLOW_KEEPALIVE)
+            entries, last_seq = log.query(None, after, min_level, stream)
 
 class ServiceManager:
     """Менеджер сервисов с автоматическим управлением"""
@@ -55,11 +1109,31 @@ class ServiceManager:
     def __init__(self):
         self.services: Dict[str, ServiceInfo] = {}
         self.is_running = True
-        self.monitoring_thread = None
         self.nodejs_monitoring_thread = None
+        # Запуск/остановка из потока Node.js монитора и из перезапусков не пересекаются
+        self.lock = threading.RLock()
+
+        # Event loop надзора за дочерними процессами в отдельном потоке
+        self.loop = asyncio.new_event_loop()
+        self.child_watcher = ChildWatcher(self.loop, self._on_child_exit)
+        self.heartbeats = HeartbeatMonitor(self.loop, self._on_hang)
+        self.log_pump = LogPump(self.loop)
+        self.logs: Dict[str, ServiceLog] = {}
+        self.ready_probes = parse_readiness_probes(SERVICE_READY_SPEC)
+        self.manifests: Dict[str, ServiceManifest] = {}
+        self.port_owners = PortOwners()
+        self.listen_sockets: Dict[Tuple[str, int], socket.socket] = {}
+        self.api_server: Optional[ThreadingHTTPServer] = None
+        self.resources: Dict[str, ResourceHistory] = {}
+        self.resource_processes: Dict[int, psutil.Process] = {}
+        self.sample_timer: Optional[asyncio.TimerHandle] = None
+        self.loop_thread = threading.Thread(target=self._run_loop, name="supervisor", daemon=True)
+        self.loop_thread.start()
+        if SERVICE_SAMPLE_INTERVAL > 0:
+            self.loop.call_soon_threadsafe(self._sample_resources)
         
         # Получаем пути из переменных окружения или используем по умолчанию
-        self.services_dir = Path(os.environ.get('SERVICES_DIR', Path(__file__).parent / "src" / "services"))
+        self.services_dir = SERVICES_DIR
         self.venv_path = Path(os.environ.get('VENV_PATH', Path(__file__).parent / "venv"))
         self.nodejs_port = int(os.environ.get('NODEJS_PORT', 3001))
         self.check_interval = int(os.environ.get('CHECK_INTERVAL', 5))
@@ -166,25 +1240,34 @@ class ServiceManager:
         else:  # Linux/Unix
             return str(self.venv_path / "bin" / "python")
 
-    def discover_services(self) -> List[Path]:
-        """Поиск всех .py файлов в директории сервисов"""
-        services = []
-        if self.services_dir.exists():
-            try:
-                # Используем os.listdir вместо glob для лучшей совместимости с кириллицей
-                import os
-                files = os.listdir(str(self.services_dir))
-                
-                for file_name in files:
-                    if file_name.endswith('.py') and file_name != "__init__.py":
-                        file_path = self.services_dir / file_name
-                        services.append(file_path)
-            except Exception as e:
-                logger.error(f"Ошибка при поиске сервисов: {e}")
-        else:
+    def discover_services(self) -> Dict[str, ServiceManifest]:
+        """Поиск сервисов: .py файлы и манифесты {имя}.service.json в директории сервисов"""
+        manifests: Dict[str, ServiceManifest] = {}
+        if not self.services_dir.exists():
             logger.error(f"Директория не существует: {self.services_dir}")
+            return manifests
+        try:
+            # Используем os.listdir вместо glob для лучшей совместимости с кириллицей
+            files = os.listdir(str(self.services_dir))
+        except Exception as e:
+            logger.error(f"Ошибка при поиске сервисов: {e}")
+            return manifests
         
-        return services
+        scripts = {file_name[:-3]: self.services_dir / file_name for file_name in files
+                   if file_name.endswith('.py') and file_name != "__init__.py"}
+        manifest_files = {file_name[:-len(MANIFEST_SUFFIX)]: self.services_dir / file_name for file_name in files
+                          if file_name.endswith(MANIFEST_SUFFIX)}
+        python_exe = self.get_python_executable()
+        for name in sorted(set(scripts) | set(manifest_files)):
+            try:
+                manifest = load_manifest(name, scripts.get(name), manifest_files.get(name), python_exe)
+            except (OSError, ValueError, TypeError) as e:
+                logger.error(f"Ошибка в манифесте сервиса {name}: {e}")
+                continue
+            if manifest.enabled:
+                manifests[name] = manifest
+        self.manifests = manifests
+        return manifests
 
     def check_nodejs_server(self) -> bool:
         """Проверка работы Node.js сервера с повторными попытками и логированием"""
@@ -212,174 +1295,635 @@ class ServiceManager:
         logger.error(f"Node.js сервер не доступен после 3 попыток по адресу {nodejs_url}")
         return False
 
-    def start_service(self, service_path: Path) -> bool:
-        """Запуск сервиса"""
-        service_name = service_path.stem
+    def start_service(self, service_name: str) -> bool:
+        """Запуск сервиса без ожидания готовности (см. wait_ready)"""
+        manifest = self.manifests.get(service_name) or self.discover_services().get(service_name)
+        if manifest is None:
+            logger.error(f"Сервис {service_name} не найден")
+            return False
         
-        # Проверяем, не запущен ли уже сервис
-        if service_name in self.services and self.services[service_name].is_running:
-            if self.services[service_name].pid and psutil.pid_exists(self.services[service_name].pid):
-                # Проверяем, что процесс действительно работает
-                try:
-                    process = psutil.Process(self.services[service_name].pid)
-                    if process.status() != psutil.STATUS_ZOMBIE:
-                        logger.warning(f"Сервис {service_name} уже запущен (PID: {self.services[service_name].pid})")
-                        return True
-                except psutil.NoSuchProcess:
-                    # Процесс не существует, сбрасываем флаг
-                    self.services[service_name].is_running = False
-                    self.services[service_name].pid = None
-                    logger.warning(f"Процесс {service_name} не найден, перезапускаем...")
+        with self.lock:
+            # Проверяем, не запущен ли (не запускается ли) уже сервис
+            service = self.services.get(service_name)
+            if service and service.is_running and (service.process is None or service.process.poll() is None):
+                logger.warning(f"Сервис {service_name} уже запущен (PID: {service.pid})")
+                return True
+            if service is None:
+                service = ServiceInfo(name=service_name, file_path=manifest.source)
+                self.services[service_name] = service
+            service.manifest = manifest
+            service.max_restarts = manifest.max_restarts
+            self._cancel_restart(service)
+            # Занимаем сервис до запуска процесса: параллельный вызов не запустит второй экземпляр
+            service.is_running = True
+            service.process = None
+            service.state = 'starting'
         
         try:
-            # Освобождаем порт если нужно (для сервисов с фиксированными портами)
-            self._kill_process_on_port_if_needed(service_path)
-            
-            # Запускаем процесс
-            python_exe = self.get_python_executable()
+            spawned = self._spawn(manifest)
+        except Exception as e:
+            logger.error(f"Ошибка запуска сервиса {service_name}: {e}")
+            spawned = None
+        if spawned is None:
+            with self.lock:
+                service.is_running = False
+                service.state = 'exited'
+            return False
+        process, control = spawned
+        
+        with self.lock:
+            if not service.is_running:
+                # Остановлен, пока процесс запускался
+                process.kill()
+                process.wait()
+                self.loop.call_soon_threadsafe(self.heartbeats.forget, process)
+                if control is not None:
+                    control.close()
+                return False
+            self._attach(service, process, control)
+        logger.warning(f"Сервис {service_name} запущен (PID: {process.pid})")
+        return True
+
+    def _spawn(self, manifest: ServiceManifest,
+               standby: bool = False) -> Optional[Tuple[subprocess.Popen, Optional[ControlChannel]]]:
+        """Процесс сервиса с сокетами активации и каналом управления (None - порт или сокет недоступен)"""
+        # Объявленный в манифесте порт должен быть свободен, сокеты активации - открыты.
+        # Резервный экземпляр порт не освобождает: его занимает работающий
+        sockets = self._activation_sockets(manifest)
+        if (manifest.port and not standby and not self._claim_port(manifest.name, manifest.port,
+                                                                  manifest.port_conflict)) or sockets is None:
+            return None
+        
+        command = manifest.command
+        env = {**os.environ, **manifest.env}
+        fds = [sock.fileno() for sock in sockets]
+        # Номера выше диапазона LISTEN_FDS: обертка активации ставит сокеты на места 3, 4, ...
+        fd_floor = socket_activation.LISTEN_FDS_START + len(fds)
+        child_fds = []
+        control = heartbeat = None
+        if manifest.restart_mode == 'hot-swap':
+            control, child_end = ControlChannel.pair()
+            child_fds.append(self._child_fd(child_end, fd_floor))
+            env[CONTROL_FD_VARIABLE] = str(child_fds[-1])
+            if standby:
+                env[STANDBY_VARIABLE] = '1'
+        if manifest.hang_timeout > 0:
+            heartbeat, child_end = HeartbeatMonitor.pair()
+            child_fds.append(self._child_fd(child_end, fd_floor))
+            env[HEARTBEAT_FD_VARIABLE] = str(child_fds[-1])
+        if fds:
+            command = socket_activation.wrapper_command(fds, command, [manifest.name] * len(fds))
+        try:
             process = subprocess.Popen(
-                [python_exe, str(service_path)],
+                command,
+                env=env,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True
+                pass_fds=fds + child_fds
             )
+        except Exception:
+            for sock in (control, heartbeat):
+                if sock is not None:
+                    sock.close()
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+        
+        if heartbeat is not None:
+            self.loop.call_soon_threadsafe(self.heartbeats.watch, process, heartbeat, manifest.hang_timeout)
+        log = self.get_log(manifest.name)
+        log.mark(f"Запуск{' резервного экземпляра' if standby else ''} (PID {process.pid})")
+        self.loop.call_soon_threadsafe(self.log_pump.attach, process, log)
+        niceness = RESOURCE_CLASSES[manifest.resource_class]
+        if niceness:
+            try:
+                os.setpriority(os.PRIO_PROCESS, process.pid, niceness)
+            except OSError as e:
+                logger.warning(f"Не удалось задать приоритет {niceness} сервису {manifest.name} "
+                               f"({manifest.resource_class}): {e}")
+        return process, control
+
+    @staticmethod
+    def _child_fd(sock: socket.socket, floor: int) -> int:
+        """Копия сокета для дочернего процесса с номером не ниже floor (сам сокет закрывается)"""
+        fd = fcntl.fcntl(sock.fileno(), fcntl.F_DUPFD_CLOEXEC, floor)
+        sock.close()
+        return fd
+
+    def _attach(self, service: ServiceInfo, process: subprocess.Popen, control: Optional[ControlChannel]):
+        """Процесс становится текущим процессом сервиса (под self.lock)"""
+        if service.ready_future is not None:
+            service.ready_future.cancel()
+        service.process = process
+        service.pid = process.pid
+        service.control = control
+        service.exit_code = None
+        service.state = 'starting'
+        service.last_start_time = datetime.now()
+        service.started_monotonic = time.monotonic()
+        service.time_to_ready = None
+        # Падение сразу после запуска придет тем же уведомлением о завершении
+        self.loop.call_soon_threadsafe(self.child_watcher.watch, process)
+        service.ready_future = asyncio.run_coroutine_threadsafe(
+            self._wait_ready(service, process, self.get_log(service.name).seq), self.loop)
+
+    async def _wait_ready(self, service: ServiceInfo, process: subprocess.Popen, log_seq: int) -> bool:
+        """Проба готовности запущенного процесса (отменяется при его завершении)"""
+        probe = self.ready_probes.get(service.name) or (service.manifest.ready if service.manifest else None)
+        ready = True
+        if probe is not None and probe.kind == 'log':
+            found = self.loop.create_future()
             
-            # Ждем немного для инициализации
-            time.sleep(2)
+            def on_marker():
+                self.loop.call_soon_threadsafe(lambda: found.done() or found.set_result(True))
             
-            # Проверяем, что процесс запустился
-            if process.poll() is None:
-                service_info = ServiceInfo(
-                    name=service_name,
-                    file_path=str(service_path),
-                    process=process,
-                    pid=process.pid,
-                    is_running=True,
-                    last_start_time=datetime.now()
-                )
-                self.services[service_name] = service_info
-                logger.warning(f"Сервис {service_name} запущен (PID: {process.pid})")
-                return True
-            else:
-                logger.error(f"Сервис {service_name} завершился сразу после запуска")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Ошибка запуска сервиса {service_name}: {e}")
+            log = self.get_log(service.name)
+            log.watch_for(probe.target, on_marker, after=log_seq)
+            try:
+                await asyncio.wait_for(found, max(0.0, service.started_monotonic + probe.timeout - time.monotonic()))
+            except asyncio.TimeoutError:
+                ready = False
+            finally:
+                log.unwatch(on_marker)
+        elif probe is not None:
+            check = check_tcp if probe.kind == 'tcp' else check_http
+            deadline = service.started_monotonic + probe.timeout
+            # Попытка не дольше оставшегося времени пробы (но хотя бы один интервал)
+            while not await check(probe.target, max(READY_PROBE_INTERVAL, deadline - time.monotonic())):
+                if time.monotonic() >= deadline:
+                    ready = False
+                    break
+                await asyncio.sleep(READY_PROBE_INTERVAL)
+        
+        if service.process is not process:
+            return False
+        if not ready:
+            service.state = 'unready'
+            logger.error(f"Сервис {service.name} не готов за {probe.timeout:g} с ({probe})")
             return False
+        service.state = 'ready'
+        service.time_to_ready = time.monotonic() - service.started_monotonic
+        logger.warning("Сервис %s готов через %.2f с (%s)", service.name, service.time_to_ready,
+                       probe or "без пробы", extra={"log_key": f"ready:{service.name}"})
+        return True
 
-    def stop_service(self, service_name: str) -> bool:
-        """Остановка сервиса"""
-        if service_name not in self.services:
-            return True
-        
-        service = self.services[service_name]
-        
-        if not service.is_running:
-            return True
-        
+    def wait_ready(self, service_name: str, timeout: Optional[float] = None) -> bool:
+        """Ожидание результата пробы готовности последнего запуска сервиса"""
+        service = self.services.get(service_name)
+        if service is None or service.ready_future is None:
+            return False
         try:
-            if service.pid:
-                process = psutil.Process(service.pid)
-                process.terminate()
-                
-                try:
-                    process.wait(timeout=5)
-                except psutil.TimeoutExpired:
-                    process.kill()
-                    process.wait()
+            return service.ready_future.result(timeout)
+        except (CancelledError, FutureTimeoutError):
+            return False
+
+    def stop_service(self, service_name: str, timeout: Optional[float] = None) -> bool:
+        """Остановка сервиса: SIGTERM, по истечении timeout (stop_timeout манифеста) - SIGKILL"""
+        with self.lock:
+            service = self.services.get(service_name)
+            if service is not None and service.restart_handle is not None:
+                self._cancel_restart(service)
+                service.state = 'stopped'
+            if service is None or not service.is_running:
+                return True
             
+            # Сбрасываем флаг до сигнала: завершение не будет принято за падение
+            process = service.process
             service.is_running = False
-            service.process = None
-            service.pid = None
+            service.state = 'stopped'
+            if service.ready_future is not None:
+                service.ready_future.cancel()
+        
+        if timeout is None:
+            timeout = service.manifest.stop_timeout if service.manifest else 5.0
+        try:
+            if process is not None:
+                self._terminate(service_name, process, timeout)
+            
+            with self.lock:
+                if service.process is process:
+                    service.process = None
+                    service.pid = None
+                    if service.control is not None:
+                        service.control.close()
+                        service.control = None
+            self.get_log(service_name).mark(f"Остановлен менеджером (код {process.returncode if process else None})")
             logger.warning(f"Сервис {service_name} остановлен")
             return True
             
-        except psutil.NoSuchProcess:
-            service.is_running = False
-            service.process = None
-            service.pid = None
-            return True
         except Exception as e:
             logger.error(f"Ошибка остановки сервиса {service_name}: {e}")
             return False
 
+    @staticmethod
+    def _terminate(service_name: str, process: subprocess.Popen, timeout: float):
+        """SIGTERM, по истечении timeout - SIGKILL"""
+        if process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Сервис {service_name} (PID {process.pid}) не завершился за {timeout:.1f} с, SIGKILL")
+            process.kill()
+            process.wait()
+
     def restart_service(self, service_name: str) -> bool:
-        """Перезапуск сервиса"""
+        """Перезапуск сервиса (для restart_mode hot-swap - без простоя)"""
+        manifest = self.manifests.get(service_name)
+        if manifest is not None and manifest.restart_mode == 'hot-swap':
+            return self.hot_swap_service(service_name)
         if self.stop_service(service_name):
-            time.sleep(1)
-            service_path = Path(self.services[service_name].file_path)
-            return self.start_service(service_path)
+            return self.start_service(service_name)
         return False
 
-    def _kill_process_on_port_if_needed(self, service_path: Path):
-        """Убивает процесс на порту если сервис использует фиксированный порт"""
+    def hot_swap_service(self, service_name: str) -> bool:
+        """Перезапуск без простоя
+
+        Новый экземпляр запускается резервным и сообщает standby после инициализации.
+        Затем старый по команде release перестает принимать соединения и освобождает
+        устройства (released), новый по takeover открывает их и начинает принимать
+        соединения с того же сокета менеджера. Соединения между release и takeover
+        ждут в backlog. Старый дообслуживает открытые соединения и завершается сам.
+        """
+        manifest = self.manifests.get(service_name)
+        with self.lock:
+            service = self.services.get(service_name)
+            if service is not None and service.handover is not None:
+                logger.warning(f"Сервис {service_name} уже перезапускается")
+                return False
+            old_process = service.process if service is not None and service.is_running else None
+            old_control = service.control if service is not None else None
+            if manifest is None or old_process is None or old_control is None or old_process.poll() is not None:
+                swap = False
+            else:
+                swap = True
+                service.handover = old_process  # Занимаем перезапуск до запуска резерва
+        if not swap:
+            logger.warning(f"Сервис {service_name} не работает, перезапуск без передачи")
+            return self.stop_service(service_name) and self.start_service(service_name)
+        
+        started = time.monotonic()
+        process = control = None
         try:
-            # Читаем файл сервиса для определения порта
-            with open(service_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            spawned = self._spawn(manifest, standby=True)
+            if spawned is None:
+                return False
+            process, control = spawned
+            with self.lock:
+                service.handover = process
+            message = control.receive(SERVICE_READY_TIMEOUT)
+            if message != 'standby':
+                logger.error(f"Резервный экземпляр {service_name} (PID {process.pid}) не готов "
+                             f"({message or 'нет ответа'}), работает прежний")
+                return False
+            standby_time = time.monotonic() - started
             
-            # Ищем порт в коде (простая эвристика)
-            import re
-            port_match = re.search(r'port\s*=\s*(\d+)', content)
-            if port_match:
-                port = int(port_match.group(1))
-                self._kill_process_on_port(port)
+            # Устройства открывает только один экземпляр: сначала старый их освобождает
+            handover_started = time.monotonic()
+            if not (old_control.send('release') and old_control.receive(SERVICE_HANDOVER_TIMEOUT) == 'released'):
+                logger.warning(f"Сервис {service_name} (PID {old_process.pid}) не освободил устройства "
+                               f"за {SERVICE_HANDOVER_TIMEOUT:g} с, завершаем")
+                self._terminate(service_name, old_process, manifest.stop_timeout)
+            with self.lock:
+                if not service.is_running:
+                    logger.warning(f"Сервис {service_name} остановлен во время перезапуска")
+                    return False
+                self._attach(service, process, control)
+            control.send('takeover')
+            handover_time = time.monotonic() - handover_started
+            process = control = None
         except Exception as e:
-            logger.warning(f"Не удалось определить порт для {service_path}: {e}")
+            logger.error(f"Ошибка перезапуска без простоя сервиса {service_name}: {e}")
+            return False
+        finally:
+            with self.lock:
+                service.handover = None
+            if process is not None:
+                # Резерв не понадобился: прежний экземпляр продолжает работу
+                process.kill()
+                process.wait()
+                control.close()
+                self.loop.call_soon_threadsafe(self.heartbeats.forget, process)
+                if old_process.poll() is not None:
+                    # Прежний завершился во время неудачной замены - обычная обработка завершения
+                    self.loop.call_soon_threadsafe(self._on_child_exit, old_process, old_process.returncode,
+                                                   time.monotonic())
+        
+        self.loop.run_in_executor(None, self._retire, service_name, old_process, old_control, manifest.stop_timeout)
+        ready = self.wait_ready(service_name)
+        logger.warning("Сервис %s перезапущен без простоя: резерв за %.2f с, передача устройств %.0f мс, "
+                       "готов через %.2f с после передачи", service_name, standby_time, handover_time * 1000.0,
+                       service.time_to_ready or 0.0)
+        return ready
 
-    def _kill_process_on_port(self, port: int):
-        """Принудительное завершение процесса на порту"""
+    def _retire(self, service_name: str, process: subprocess.Popen, control: ControlChannel, stop_timeout: float):
+        """Прежний экземпляр после передачи: ждем завершения, затем SIGTERM/SIGKILL"""
         try:
-            for proc in psutil.process_iter(['pid', 'name']):
+            process.wait(timeout=SERVICE_DRAIN_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Прежний экземпляр {service_name} (PID {process.pid}) не завершился "
+                           f"за {SERVICE_DRAIN_TIMEOUT:g} с после передачи")
+            self._terminate(service_name, process, stop_timeout)
+        control.close()
+        self.get_log(service_name).mark(f"Прежний экземпляр (PID {process.pid}) завершился "
+                                        f"с кодом {process.returncode}")
+
+    def _activation_sockets(self, manifest: ServiceManifest) -> Optional[List[socket.socket]]:
+        """Слушающие сокеты сервиса из listen манифеста; открываются один раз и живут
+        между перезапусками сервиса (None - не удалось открыть)"""
+        sockets = []
+        for address in manifest.listen:
+            sock = self.listen_sockets.get(address)
+            if sock is None:
+                if not self._claim_port(manifest.name, address[1], manifest.port_conflict):
+                    return None
                 try:
-                    connections = proc.net_connections()
-                    for conn in connections:
-                        if hasattr(conn, 'laddr') and conn.laddr.port == port:
-                            proc.terminate()
-                            proc.wait(timeout=3)
-                            logger.warning(f"Процесс на порту {port} завершен")
-                            return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-        except Exception as e:
-            logger.warning(f"Ошибка при завершении процесса на порту {port}: {e}")
+                    family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+                    sock = socket.create_server(address, family=family, backlog=socket.SOMAXCONN)
+                except OSError as e:
+                    logger.error(f"Не удалось открыть сокет {address[0]}:{address[1]} сервиса {manifest.name}: {e}")
+                    return None
+                self.listen_sockets[address] = sock
+                logger.warning(f"Сокет {address[0]}:{address[1]} сервиса {manifest.name} открыт менеджером")
+            sockets.append(sock)
+        return sockets
+
+    def _claim_port(self, name: str, port: int, policy: str) -> bool:
+        """Порт сервиса свободен или освобожден по политике port_conflict (kill, wait, fail)"""
+        owners, unresolved = self.port_owners.find_owners(port, fresh=True)
+        if not owners and not unresolved:
+            return True
+        holders = ", ".join(PortOwners.describe(pid) for pid in owners) or "владелец не найден"
+        if policy == 'fail':
+            logger.error(f"Порт {port} сервиса {name} занят: {holders}")
+            return False
+        
+        started = time.monotonic()
+        kill = policy == 'kill'
+        if kill:
+            logger.warning(f"Порт {port} сервиса {name} занят: {holders}, завершаем")
+        else:
+            logger.warning(f"Порт {port} сервиса {name} занят: {holders}, ждем освобождения")
+        signum = signal.SIGTERM
+        signaled: set = set()
+        while True:
+            if kill:
+                # Новые владельцы (например, потомок, унаследовавший сокет) получают тот же сигнал
+                self._signal_all([pid for pid in owners if pid not in signaled], signum)
+                signaled.update(owners)
+            time.sleep(0.05)
+            owners, unresolved = self.port_owners.find_owners(port, fresh=True)
+            if not owners and not unresolved:
+                logger.warning("Порт %d освобожден за %.2f с", port, time.monotonic() - started)
+                return True
+            if time.monotonic() - started >= SERVICE_PORT_WAIT:
+                if not kill or signum == signal.SIGKILL:
+                    break
+                # Не завершились по SIGTERM - SIGKILL и еще одно ожидание
+                signum = signal.SIGKILL
+                signaled.clear()
+                started = time.monotonic()
+        logger.error(f"Порт {port} сервиса {name} не освободился за {SERVICE_PORT_WAIT:g} с")
         return False
 
-    def monitor_services(self):
-        """Мониторинг сервисов"""
-        logger.warning("Запуск мониторинга сервисов...")
+    @staticmethod
+    def _signal_all(pids: List[int], signum: int):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+            except PermissionError as e:
+                logger.error(f"Нет прав завершить процесс {pid}: {e}")
+
+    def get_log(self, service_name: str) -> ServiceLog:
+        log = self.logs.get(service_name)
+        if log is None:
+            log = self.logs.setdefault(service_name, ServiceLog(service_name))
+        return log
+
+    def get_status(self) -> Dict[str, Any]:
+        """Состояние сервисов для HTTP API"""
+        return {
+            name: {
+                "pid": service.pid,
+                "running": service.is_running,
+                "state": service.state,
+                "time_to_ready": round(service.time_to_ready, 3) if service.time_to_ready is not None else None,
+                "restarts": service.restart_count,
+                **self._restart_stats(service),
+                "hangs": service.hang_count,
+                "alerts": sorted(self.resources[name].alerts) if name in self.resources else [],
+                "heartbeat": self.heartbeats.ages(service.process) if service.process else {},
+                "depends_on": service.manifest.depends_on if service.manifest else [],
+                "resource_class": service.manifest.resource_class if service.manifest else None,
+                "exit_code": service.exit_code,
+                "started": service.last_start_time.isoformat() if service.last_start_time else None,
+                "log_lines": self.logs[name].seq if name in self.logs else 0
+            }
+            for name, service in list(self.services.items())
+        }
+
+    def start_api(self):
+        """HTTP API менеджера в отдельном потоке"""
+        if MANAGER_PORT <= 0:
+            return
+        try:
+            self.api_server = ThreadingHTTPServer((MANAGER_HOST, MANAGER_PORT), ManagerRequestHandler)
+        except OSError as e:
+            logger.error(f"Не удалось запустить API менеджера на порту {MANAGER_PORT}: {e}")
+            return
+        self.api_server.daemon_threads = True
+        self.api_server.manager = self
+        threading.Thread(target=self.api_server.serve_forever, name="manager-api", daemon=True).start()
+        logger.warning(f"API менеджера: http://{MANAGER_HOST}:{MANAGER_PORT}/services")
+        if not MANAGER_TOKEN and MANAGER_HOST not in ('127.0.0.1', '::1', 'localhost'):
+            logger.warning("SERVICE_MANAGER_TOKEN не задан: перезапуск через API доступен только с локальной петли")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _on_child_exit(self, process: subprocess.Popen, returncode: int, exited_at: float):
+        """Завершение дочернего процесса (поток цикла, сразу после выхода)"""
+        self.heartbeats.forget(process)
+        service = next((s for s in self.services.values() if s.process is process), None)
+        if service is None or not service.is_running:
+            return  # Остановлен менеджером или уже заменен новым процессом
+        if service.handover is not None:
+            # Перезапуск без простоя уже идет: резервный экземпляр займет место завершившегося
+            logger.warning("Сервис %s (PID: %s) завершился с кодом %s во время перезапуска",
+                           service.name, process.pid, returncode)
+            return
         
-        while self.is_running:
+        uptime = time.monotonic() - service.started_monotonic
+        logger.warning("Сервис %s (PID: %s) завершился с кодом %s через %.1f с после запуска",
+                       service.name, process.pid, returncode, uptime)
+        service.is_running = False
+        service.process = None
+        service.pid = None
+        service.exit_code = returncode
+        service.state = 'exited'
+        if service.control is not None:
+            service.control.close()
+            service.control = None
+        if service.ready_future is not None:
+            service.ready_future.cancel()
+        self.get_log(service.name).mark(f"Завершился с кодом {returncode}", 'ERROR')
+        
+        if not self.is_running:
+            return
+        policy = service.manifest.restart if service.manifest else 'always'
+        if policy == 'never' or (policy == 'on-failure' and returncode == 0):
+            logger.warning(f"Сервис {service.name} не перезапускается (restart: {policy})")
+            return
+        
+        now = time.monotonic()
+        window = service.manifest.restart_window if service.manifest else SERVICE_RESTART_WINDOW
+        if uptime >= SERVICE_STABLE_AFTER:
+            service.crash_streak = 0  # Проработал стабильно - серия начинается заново
+        service.crash_streak += 1
+        while service.failures and now - service.failures[0] > window:
+            service.failures.popleft()
+        service.failures.append(now)
+        delay = self._backoff_delay(service.crash_streak)
+        if len(service.failures) > service.max_restarts:
+            # Бюджет исчерпан: следующая попытка - когда старейшее падение выйдет из окна
+            delay = max(delay, service.failures[0] + window - now)
+            logger.error("Сервис %s: %d падений за %g с (бюджет %d), перезапуск через %.1f с",
+                         service.name, len(service.failures), window, service.max_restarts, delay)
+        elif delay > 0:
+            logger.warning("Сервис %s: %d-е падение подряд, перезапуск через %.2f с",
+                           service.name, service.crash_streak, delay)
+        if delay > 0:
+            service.state = 'backoff'
+        service.restart_at = now + delay
+        service.restart_handle = self.loop.call_later(delay, self._schedule_restart, service, exited_at)
+
+    @staticmethod
+    def _backoff_delay(streak: int) -> float:
+        """Задержка перезапуска после streak падений подряд: первое - сразу, далее экспонента с разбросом"""
+        if streak <= 1:
+            return 0.0
+        delay = SERVICE_BACKOFF_BASE * 2 ** (streak - 2)
+        # Предел - после разброса: задержка не превышает SERVICE_BACKOFF_MAX
+        return min(SERVICE_BACKOFF_MAX, delay + random.uniform(0.0, SERVICE_BACKOFF_JITTER * delay))
+
+    def _schedule_restart(self, service: ServiceInfo, exited_at: float):
+        service.restart_handle = None
+        service.restart_count += 1
+        service.last_restart = time.time()
+        # Запуск блокирующий (освобождение порта, Popen) - вне потока цикла
+        self.loop.run_in_executor(None, self._restart_crashed, service.name, exited_at)
+
+    def _cancel_restart(self, service: ServiceInfo):
+        """Отмена отложенного перезапуска (сервис запущен или остановлен вручную)"""
+        handle = service.restart_handle
+        if handle is not None:
+            service.restart_handle = None
+            self.loop.call_soon_threadsafe(handle.cancel)
+
+    def _on_hang(self, process: subprocess.Popen, source: str, age: float, dump_only: bool = False):
+        """Источник пульса замолчал (поток цикла): дамп стеков, затем hang_action"""
+        service = next((s for s in self.services.values() if s.process is process), None)
+        if service is None or not service.is_running or service.handover is not None:
+            return
+        # Источник, объявивший себя dump, не перезапускает весь сервис
+        action = 'dump' if dump_only else (service.manifest.hang_action if service.manifest else SERVICE_HANG_ACTION)
+        service.hang_count += 1
+        logger.error("Сервис %s (PID: %s) завис: нет пульса %s %.2f с, %s", service.name, process.pid, source, age,
+                     "дамп стеков и перезапуск" if action == 'restart' else "дамп стеков")
+        self.get_log(service.name).mark(f"Завис: нет пульса {source} {age:.2f} с", 'ERROR')
+        # faulthandler сервиса пишет стеки всех потоков в stderr - они попадут в журнал
+        self._signal_all([process.pid], STACK_DUMP_SIGNAL)
+        if action == 'restart':
+            self.loop.call_later(HANG_DUMP_GRACE, self._kill_hung, service, process)
+
+    @staticmethod
+    def _kill_hung(service: ServiceInfo, process: subprocess.Popen):
+        # SIGTERM обрабатывается в зависшем главном потоке - только SIGKILL. Завершение
+        # придет обычным уведомлением и пойдет по политике restart
+        if service.process is process and process.returncode is None:
+            process.kill()
+
+    def _restart_crashed(self, service_name: str, exited_at: float):
+        service = self.services[service_name]
+        if service.state == 'stopped' or not self.is_running:
+            return  # Остановлен вручную, пока перезапуск ждал очереди
+        scheduled_at = service.restart_at
+        if self.start_service(service_name):
+            # Задержка самого перезапуска, без выдержки backoff
+            latency = (time.monotonic() - max(exited_at, scheduled_at)) * 1000.0
+            service.restart_latencies.append(latency)
+            logger.warning("Сервис %s перезапущен через %.0f мс после падения (перезапуск за %.0f мс, "
+                           "падений за окно %d/%d)", service_name, (time.monotonic() - exited_at) * 1000.0,
+                           latency, len(service.failures), service.max_restarts)
+
+    def _sample_resources(self):
+        """Замер ресурсов работающих сервисов (поток цикла, раз в SERVICE_SAMPLE_INTERVAL)"""
+        alive = set()
+        for name, service in list(self.services.items()):
+            process = service.process
+            if process is None or process.returncode is not None:
+                continue
+            alive.add(process.pid)
             try:
-                for service_name, service in list(self.services.items()):
-                    if service.is_running and service.pid:
-                        try:
-                            process = psutil.Process(service.pid)
-                            if process.status() == psutil.STATUS_ZOMBIE:
-                                logger.warning(f"Процесс {service_name} стал зомби, перезапускаем...")
-                                self.restart_service(service_name)
-                        except psutil.NoSuchProcess:
-                            logger.warning(f"Процесс {service_name} (PID: {service.pid}) не найден, перезапускаем...")
-                            service.is_running = False
-                            service.pid = None
-                            
-                            # Проверяем лимит перезапусков
-                            if service.restart_count < service.max_restarts:
-                                service.restart_count += 1
-                                service.last_restart = time.time()
-                                service_path = Path(service.file_path)
-                                self.start_service(service_path)
-                            else:
-                                logger.error(f"Превышен лимит перезапусков для сервиса {service_name}")
-                        except Exception as e:
-                            logger.error(f"Ошибка мониторинга сервиса {service_name}: {e}")
-                
-                time.sleep(self.check_interval)
-                
-            except Exception as e:
-                logger.error(f"Ошибка в мониторинге сервисов: {e}")
-                time.sleep(self.check_interval)
+                proc = self.resource_processes.get(process.pid)
+                if proc is None:
+                    proc = self.resource_processes[process.pid] = psutil.Process(process.pid)
+                # Одно чтение /proc/<pid>/stat и status на все значения
+                with proc.oneshot():
+                    cpu = proc.cpu_times()
+                    memory = proc.memory_info()
+                    threads = proc.num_threads()
+                    fds = proc.num_fds()
+                    try:
+                        io = proc.io_counters()
+                    except (psutil.AccessDenied, AttributeError):
+                        io = None
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            history = self.resources.get(name)
+            if history is None:
+                history = self.resources.setdefault(name, ResourceHistory(name))
+            sample = history.add(process.pid, cpu.user + cpu.system, memory.rss, threads, fds,
+                                 io.read_bytes if io else None, io.write_bytes if io else None)
+            raised, cleared = history.check(sample, service.manifest.alerts if service.manifest
+                                            else RESOURCE_ALERT_DEFAULTS)
+            for alert in raised:
+                logger.error("Сервис %s: %s", name, history.alerts[alert], extra={"log_key": f"alert:{name}:{alert}"})
+                self.get_log(name).mark(f"Предупреждение {alert}: {history.alerts[alert]}", 'ERROR')
+            for alert in cleared:
+                logger.warning(f"Сервис {name}: предупреждение {alert} снято")
+        for pid in [pid for pid in self.resource_processes if pid not in alive]:
+            del self.resource_processes[pid]
+        self.sample_timer = self.loop.call_later(SERVICE_SAMPLE_INTERVAL, self._sample_resources)
+
+    def _stop_sampler(self):
+        if self.sample_timer is not None:
+            self.sample_timer.cancel()
+            self.sample_timer = None
+
+    def _restart_stats(self, service: ServiceInfo) -> Dict[str, Any]:
+        """Статистика падений и перезапусков для статуса"""
+        now = time.monotonic()
+        window = service.manifest.restart_window if service.manifest else SERVICE_RESTART_WINDOW
+        crashes = sum(1 for failed_at in list(service.failures) if now - failed_at <= window)
+        latencies = sorted(service.restart_latencies)
+        return {
+            "crashes": crashes,
+            "crash_rate": round(crashes * 3600.0 / window, 2) if window > 0 else None,  # падений в час
+            "crash_streak": service.crash_streak,
+            "next_restart_in": round(max(0.0, service.restart_at - now), 2)
+            if service.restart_handle is not None else None,
+            "restart_latency_ms": {
+                "last": round(service.restart_latencies[-1], 1),
+                "median": round(latencies[len(latencies) // 2], 1),
+                "max": round(latencies[-1], 1)
+            } if latencies else None
+        }
 
     def monitor_nodejs_server(self):
         """Мониторинг Node.js сервера"""
@@ -391,7 +1935,9 @@ class ServiceManager:
                 
                 if nodejs_running:
                     # Node.js работает — запускаем сервисы только если они не запущены
-                    running_services = sum(1 for service in self.services.values() if service.is_running)
+                    # (сервис, ждущий отложенного перезапуска, под управлением бюджета падений)
+                    running_services = sum(1 for service in self.services.values()
+                                           if service.is_running or service.state == 'backoff')
                     if running_services == 0:
                         logger.warning("Node.js сервер запущен, запускаем сервисы...")
                         self.start_all_services()
@@ -411,46 +1957,107 @@ class ServiceManager:
                 time.sleep(self.check_interval)
 
     def start_all_services(self):
-        """Запуск всех сервисов"""
+        """Запуск всех сервисов по графу зависимостей"""
         logger.warning("Запуск всех сервисов...")
         
         # Обновляем список сервисов
-        service_files = self.discover_services()
+        manifests = self.discover_services()
         
-        if not service_files:
-            logger.warning("Не найдено ни одного .py файла в директории сервисов")
+        if not manifests:
+            logger.warning("Не найдено ни одного сервиса в директории сервисов")
+            return
+        try:
+            order = dependency_order({name: manifest.depends_on for name, manifest in manifests.items()})
+        except ValueError as e:
+            logger.error(f"Сервисы не запущены: {e}")
             return
         
-        started_count = 0
-        skipped_count = 0
-        for service_path in service_files:
-            service_name = service_path.stem
-            
-            # Проверяем, не запущен ли уже сервис
-            if service_name in self.services and self.services[service_name].is_running:
-                if self.services[service_name].pid and psutil.pid_exists(self.services[service_name].pid):
-                    skipped_count += 1
-                    continue
-            
-            if self.start_service(service_path):
-                started_count += 1
-            else:
-                logger.error(f"Не удалось запустить сервис {service_path.name}")
+        started_at = time.monotonic()
+        outcomes = asyncio.run_coroutine_threadsafe(self._start_graph(order), self.loop).result()
+        counts = {outcome: sum(1 for value in outcomes.values() if value == outcome)
+                  for outcome in ('ready', 'unready', 'failed', 'blocked', 'skipped', 'backoff')}
+        if counts['skipped'] + counts['backoff'] < len(outcomes):
+            logger.warning("Запуск за %.2f с: готово %d, не готово %d, ошибка %d, "
+                           "не запущено из-за зависимостей %d, уже работало %d, ждет перезапуска %d",
+                           time.monotonic() - started_at, counts['ready'], counts['unready'],
+                           counts['failed'], counts['blocked'], counts['skipped'], counts['backoff'])
+
+    async def _start_graph(self, order: List[str]) -> Dict[str, str]:
+        """Каждый сервис запускается, как только готовы его зависимости; независимые - параллельно"""
+        tasks: Dict[str, asyncio.Task] = {}
+        
+        async def start_one(name: str) -> str:
+            service = self.services.get(name)
+            if service is not None and service.is_running:
+                return 'skipped'
+            if service is not None and (service.state == 'backoff' or service.restart_handle is not None):
+                # Отложенный перезапуск не отменяется массовым запуском - иначе бюджет падений
+                # и экспоненциальная задержка теряют смысл (ручной start_service его отменяет)
+                return 'backoff'
+            for dependency in self.manifests[name].depends_on:
+                if dependency in tasks:
+                    satisfied = await tasks[dependency] in ('ready', 'skipped')
+                else:
+                    dependency_service = self.services.get(dependency)
+                    satisfied = dependency_service is not None and dependency_service.state == 'ready'
+                if not satisfied:
+                    logger.error(f"Сервис {name} не запущен: зависимость {dependency} не готова")
+                    return 'blocked'
+            if not await self.loop.run_in_executor(None, self.start_service, name):
+                return 'failed'
+            try:
+                ready = await asyncio.wrap_future(self.services[name].ready_future)
+            except asyncio.CancelledError:
+                return 'failed'  # Процесс завершился до готовности
+            return 'ready' if ready else 'unready'
         
-        if started_count > 0 or skipped_count > 0:
-            logger.warning(f"Запущено {started_count}, пропущено {skipped_count} сервисов")
+        # В порядке зависимостей: задача зависимости создана раньше задачи зависящего
+        for name in order:
+            tasks[name] = self.loop.create_task(start_one(name))
+        return {name: await task for name, task in tasks.items()}
 
-    def stop_all_services(self):
-        """Остановка всех сервисов"""
+    def stop_all_services(self, deadline: float = SERVICE_STOP_DEADLINE):
+        """Остановка всех сервисов: зависящие раньше зависимостей, независимые параллельно,
+        общий срок deadline секунд"""
         logger.warning("Остановка всех сервисов...")
+        for service in list(self.services.values()):
+            if service.restart_handle is not None:
+                with self.lock:
+                    self._cancel_restart(service)
+                    service.state = 'stopped'
+        running = [name for name, service in list(self.services.items()) if service.is_running]
+        if not running:
+            return
+        depends_on = {name: [dependency for dependency in (self.services[name].manifest.depends_on
+                                                            if self.services[name].manifest else [])
+                             if dependency in running]
+                      for name in running}
         
-        stopped_count = 0
-        for service_name in list(self.services.keys()):
-            if self.stop_service(service_name):
-                stopped_count += 1
-        
+        started_at = time.monotonic()
+        if self.loop.is_running():
+            results = asyncio.run_coroutine_threadsafe(
+                self._stop_graph(depends_on, started_at + deadline), self.loop).result()
+        else:
+            results = {name: self.stop_service(name) for name in reversed(dependency_order(depends_on))}
+        stopped_count = sum(results.values())
         if stopped_count > 0:
-            logger.warning(f"Остановлено {stopped_count} сервисов")
+            logger.warning("Остановлено %d сервисов за %.2f с", stopped_count, time.monotonic() - started_at)
+
+    async def _stop_graph(self, depends_on: Dict[str, List[str]], deadline: float) -> Dict[str, bool]:
+        dependents = {name: [other for other, deps in depends_on.items() if name in deps] for name in depends_on}
+        tasks: Dict[str, asyncio.Task] = {}
+        
+        async def stop_one(name: str) -> bool:
+            await asyncio.gather(*(tasks[dependent] for dependent in dependents[name]))
+            service = self.services[name]
+            timeout = service.manifest.stop_timeout if service.manifest else 5.0
+            # Остаток общего срока: сервисы в конце цепочки не получают лишнего времени
+            timeout = min(timeout, max(0.1, deadline - time.monotonic()))
+            return await self.loop.run_in_executor(None, self.stop_service, name, timeout)
+        
+        for name in reversed(dependency_order(depends_on)):
+            tasks[name] = self.loop.create_task(stop_one(name))
+        return {name: await task for name, task in tasks.items()}
 
     def cleanup_services_state(self):
         """Очистка состояния сервисов - сброс флагов для несуществующих процессов"""
@@ -486,6 +2093,8 @@ class ServiceManager:
                 logger.error("Не удалось создать виртуальное окружение")
                 return
         
+        self.start_api()
+        
         # Очищаем состояние сервисов при запуске
         self.cleanup_services_state()
         
@@ -497,10 +2106,6 @@ class ServiceManager:
         self.nodejs_monitoring_thread = threading.Thread(target=self.monitor_nodejs_server, daemon=True)
         self.nodejs_monitoring_thread.start()
         
-        # Запускаем мониторинг сервисов в отдельном потоке
-        self.monitoring_thread = threading.Thread(target=self.monitor_services, daemon=True)
-        self.monitoring_thread.start()
-        
         try:
             # Основной цикл
             while self.is_running:
@@ -519,10 +2124,21 @@ class ServiceManager:
         self.stop_all_services()
         
         # Ждем завершения потоков
-        if self.monitoring_thread:
-            self.monitoring_thread.join(timeout=5)
         if self.nodejs_monitoring_thread:
             self.nodejs_monitoring_thread.join(timeout=5)
+        if self.api_server is not None:
+            self.api_server.shutdown()
+            self.api_server = None
+        for sock in self.listen_sockets.values():
+            sock.close()
+        self.listen_sockets.clear()
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.child_watcher.close)
+            self.loop.call_soon_threadsafe(self.heartbeats.close)
+            self.loop.call_soon_threadsafe(self._stop_sampler)
+            self.loop.call_soon_threadsafe(self.log_pump.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join(timeout=5)
         
         logger.warning("Сервис-менеджер остановлен")
 
@@ -545,6 +2161,11 @@ if __name__ == "__main__":
     logger.warning(f"  NODEJS_HOST: {os.environ.get('NODEJS_HOST', 'localhost')}")
     logger.warning(f"  NODEJS_PORT: {os.environ.get('NODEJS_PORT', '3001')}")
     logger.warning(f"  CHECK_INTERVAL: {os.environ.get('CHECK_INTERVAL', '5')}")
+    logger.warning(f"  SERVICE_MANAGER_PORT: {MANAGER_PORT}")
+    logger.warning(f"  SERVICE_MANAGER_HOST: {MANAGER_HOST}")
+    logger.warning(f"  SERVICE_READY: {SERVICE_READY_SPEC or 'не установлена'}")
+    logger.warning(f"  SERVICE_PORT_CONFLICT: {SERVICE_PORT_CONFLICT}")
+    logger.warning(f"  SERVICE_LOG_DIR: {SERVICE_LOG_DIR or 'не установлена'}")
     
     try:
         # Создаем и запускаем менеджер
@@ -9,7 +9,7 @@ import asyncio
 import time
 import threading
 import numpy as np
-from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Header, HTTPException, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
@@ -18,35 +18,57 @@ import os
 import signal
 import sys
 from typing import Dict, List, Optional, Any, Set
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, asdict, replace
 from queue import Queue, Empty, Full
 import uvicorn
 from concurrent.futures import ThreadPoolExecutor
 import json
+import math
 import base64
+import copy
+from collections import deque
+import subprocess
+import shutil
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from common.pixel_timestamp import encode_timestamp
+from common.frame_ring import FrameRingWriter, ring_name
+from common.log_setup import setup_logging, get_logging_stats
+from common.jpeg_codec import EncoderPreset, get_codec, preset_from_config, decode_scaled
+from common.rtp_jpeg import RtpJpegSender, UnsupportedJpeg, is_multicast, make_sdp
+from common.socket_activation import listen_sockets
+from common.handover import ControlChannel, standby_requested
+from common.heartbeat import Heartbeat
+from common.stream_limits import (ADMISSION_MAX_DEGRADED, ADMISSION_MAX_STREAMS, ADMISSION_MAX_STREAMS_PER_CAMERA,
+                                  ADMISSION_OVERFLOW, ADMISSION_RETRY_AFTER, EGRESS_BUDGET_BPS, EGRESS_MIN_FPS,
+                                  EGRESS_MIN_QUALITY, OPERATOR_TOKENS, AdmissionController, AdmissionTicket,
+                                  EgressScheduler, resolve_priority)
 
 # Единая конфигурация стримов для всего приложения
 STREAM_CONFIGS = [
     {
+        'id': 'extreme',
         'name': 'Экстримальное качество',
         'quality': 5,
         'fps': 10,
         'description': '10 FPS, качество 5%'
     },
     {
+        'id': 'low',
         'name': 'Низкое качество',
         'quality': 20,
         'fps': 30,
         'description': '20 FPS, качество 10%'
     },
     {
+        'id': 'standard',
         'name': 'Стандартное качество', 
         'quality': 50,
         'fps': 30,
         'description': '30 FPS, качество 50%'
     },
     {
+        'id': 'high',
         'name': 'Высокое качество',
         'quality': 85,
         'fps': 60,
@@ -54,19 +76,185 @@ STREAM_CONFIGS = [
     }
 ]
 
-# Настройка логирования для контейнера (только stdout)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()  # Убираем файловое логирование для контейнера
-    ]
-)
+# JSON файл со списком профилей (формат как у STREAM_CONFIGS), перечитывается без перезапуска
+STREAM_CONFIG_PATH = os.environ.get('CAMERA_STREAM_CONFIG', '')
+
+# Качество JPEG, с которым кодируется исходный кадр камеры
+CAPTURE_JPEG_QUALITY = 85
+# Пресет кодирования исходного кадра; выходы с таким же пресетом отдают его без перекодирования.
+# Профили могут задать свой пресет ключами subsampling (444/422/420/gray), optimize, fast_dct
+CAPTURE_PRESET = EncoderPreset(quality=CAPTURE_JPEG_QUALITY)
+
+# Синтетическая камера с меткой времени в пикселях (для измерения задержки)
+SYNTHETIC_CAMERA_ENABLED = os.environ.get('CAMERA_SYNTHETIC', '0') == '1'
+SYNTHETIC_CAMERA_ID = -2
+
+# Экспорт сырых и JPEG кадров в разделяемую память для локальных процессов и camera_worker.py
+SHM_EXPORT_ENABLED = os.environ.get('CAMERA_SHM_EXPORT', '1') == '1'
+SHM_RING_SLOTS = int(os.environ.get('CAMERA_SHM_SLOTS', '4'))
+
+# Группы синхронного захвата при старте: "stereo=0,1@30;body=2,3"
+SYNC_GROUPS_SPEC = os.environ.get('CAMERA_SYNC_GROUPS', '')
+
+# Общие выходы профилей останавливаются через столько секунд без подписчиков
+OUTPUT_IDLE_TIMEOUT = float(os.environ.get('CAMERA_OUTPUT_IDLE_TIMEOUT', 5.0))
+
+def parse_resolution(value: str) -> tuple:
+    """Разбор разрешения "1280x720" -> (1280, 720)"""
+    width, _, height = value.lower().partition('x')
+    return int(width), int(height)
+
+# Разрешение захвата по запросам подписчиков: максимум запрошенного в пределах MIN..MAX.
+# Без подписчиков камера снимает в базовом разрешении (CAMERA_RESOLUTION)
+CAPTURE_BASE_RESOLUTION = parse_resolution(os.environ.get('CAMERA_RESOLUTION', '640x480'))
+CAPTURE_MIN_RESOLUTION = parse_resolution(os.environ.get('CAMERA_MIN_RESOLUTION', '320x240'))
+CAPTURE_MAX_RESOLUTION = parse_resolution(os.environ.get('CAMERA_MAX_RESOLUTION', '1920x1080'))
+CAPTURE_MAX_FPS = float(os.environ.get('CAMERA_MAX_FPS', 30.0))
+# Понижение разрешения/FPS применяется, если спрос ниже текущего столько секунд подряд
+CAPTURE_DOWNGRADE_DELAY = float(os.environ.get('CAMERA_DOWNGRADE_DELAY', 10.0))
+# Разрешение, с которым камера не открылась, не запрашивается повторно столько секунд
+CAPTURE_FAILED_RETRY = float(os.environ.get('CAMERA_FAILED_RESOLUTION_RETRY', 300.0))
+
+# Рассылка профилей по RTP/JPEG (RFC 2435) в multicast группы: "0:standard,1:low@239.255.42.9:5010".
+# Без адреса сессии получают группу CAMERA_MULTICAST_GROUP и порты CAMERA_MULTICAST_PORT, +2, +4...
+MULTICAST_SPEC = os.environ.get('CAMERA_MULTICAST', '')
+MULTICAST_GROUP = os.environ.get('CAMERA_MULTICAST_GROUP', '239.255.42.1')
+MULTICAST_BASE_PORT = int(os.environ.get('CAMERA_MULTICAST_PORT', 5004))
+MULTICAST_TTL = int(os.environ.get('CAMERA_MULTICAST_TTL', 1))
+MULTICAST_MTU = int(os.environ.get('CAMERA_MULTICAST_MTU', 1400))
+MULTICAST_INTERFACE = os.environ.get('CAMERA_MULTICAST_IF', '')
+
+# Логирование через общую очередь с ограничением частоты (common/log_setup.py)
+setup_logging("camera_service", logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Кодек JPEG (libjpeg-turbo при наличии, иначе OpenCV; CAMERA_JPEG_CODEC)
+jpeg_codec = get_codec()
+
+# Журнал HTTP запросов uvicorn (каждый запрос - запись в лог)
+ACCESS_LOG_ENABLED = os.environ.get('CAMERA_ACCESS_LOG', '0') == '1'
+
+# Дообслуживание открытых соединений при остановке и после передачи камер новому экземпляру, секунд
+DRAIN_TIMEOUT = float(os.environ.get('CAMERA_DRAIN_TIMEOUT', 2.0))
+# Допустимая пауза пульса потоков захвата для сторожа менеджера: переподключение камеры
+# занимает секунды, event loop пульсирует с hang_timeout манифеста. Потоки захвата ждут
+# драйвер (read, переоткрытие устройства), поэтому их зависание - только дамп стеков:
+# перезапуск сервиса из-за одной камеры оборвал бы раздачу остальных
+CAPTURE_HANG_TIMEOUT = float(os.environ.get('CAMERA_CAPTURE_HANG_TIMEOUT', 10.0))
+CAPTURE_HANG_ACTION = 'dump'
+
 # Глобальная переменная для graceful shutdown
 shutdown_event = threading.Event()
 
+# Кэш согласованных параметров захвата (backend, FOURCC, разрешение, FPS) по устройствам.
+# Пустое значение переменной окружения отключает сохранение на диск
+NEGOTIATION_CACHE_PATH = os.environ.get(
+    'CAMERA_NEGOTIATION_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'control_robot', 'camera_negotiation.json')
+)
+
+# Backend'ы захвата в порядке перебора
+CAPTURE_BACKENDS = [
+    (cv2.CAP_V4L2, "Video4Linux2"),  # Основной Linux backend
+    (cv2.CAP_ANY, "Auto"),           # Автоматический выбор
+    (cv2.CAP_V4L, "Video4Linux"),    # Старый Linux backend
+]
+
+def fourcc_to_str(value: float) -> str:
+    """Преобразование числового FOURCC из OpenCV в строку"""
+    code = int(value)
+    if code <= 0:
+        return ""
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+def get_device_identity(camera_id: int) -> str:
+    """Стабильный идентификатор устройства (не зависит от порядка нумерации /dev/videoN)"""
+    device_path = os.path.realpath(f"/dev/video{camera_id}")
+    
+    # by-id содержит производителя и серийный номер, by-path - физический порт
+    for links_dir in ("/dev/v4l/by-id", "/dev/v4l/by-path"):
+        try:
+            for link_name in sorted(os.listdir(links_dir)):
+                if os.path.realpath(os.path.join(links_dir, link_name)) == device_path:
+                    return f"{os.path.basename(links_dir)}:{link_name}"
+        except OSError:
+            continue
+    
+    # Без udev-ссылок используем имя устройства и путь в sysfs
+    sysfs_dir = f"/sys/class/video4linux/video{camera_id}"
+    try:
+        with open(os.path.join(sysfs_dir, "name"), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+        bus_path = os.path.realpath(os.path.join(sysfs_dir, "device"))
+        return f"sysfs:{name}@{bus_path}"
+    except OSError:
+        return f"index:{camera_id}"
+
+class CaptureNegotiationCache:
+    """Небольшой дисковый кэш успешных параметров открытия камер"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Optional[Dict[str, Dict[str, Any]]] = None
+    
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self.entries is None:
+            self.entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if isinstance(data, dict):
+                        self.entries = data
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Не удалось прочитать кэш согласования камер {self.path}: {e}")
+        return self.entries
+    
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш согласования камер {self.path}: {e}")
+    
+    def get(self, identity: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self._load().get(identity)
+            return dict(entry) if entry else None
+    
+    def put(self, identity: str, entry: Dict[str, Any]):
+        with self.lock:
+            entries = self._load()
+            if entries.get(identity) == entry:
+                return
+            entries[identity] = entry
+            self._save()
+    
+    def invalidate(self, identity: str):
+        with self.lock:
+            if self._load().pop(identity, None) is not None:
+                self._save()
+
+negotiation_cache = CaptureNegotiationCache(NEGOTIATION_CACHE_PATH)
+
+# H.264 стриминг: программный кодер libx264 через ffmpeg
+FFMPEG_BINARY = os.environ.get('CAMERA_FFMPEG_BINARY', 'ffmpeg')
+H264_GOP_SECONDS = float(os.environ.get('CAMERA_H264_GOP_SECONDS', 1.0))
+H264_IDLE_TIMEOUT = float(os.environ.get('CAMERA_H264_IDLE_TIMEOUT', 5.0))
+H264_SUBSCRIBER_QUEUE = int(os.environ.get('CAMERA_H264_SUBSCRIBER_QUEUE', 30))
+# Деградированный (сверх лимита стримов) H.264 стрим: предельные ширина и битрейт
+H264_DEGRADED_WIDTH = 320
+H264_DEGRADED_BITRATE = 200
+
+# Деградированный стрим сверх лимита: профиль низкого качества (лимиты - common/stream_limits.py)
+ADMISSION_DEGRADED_PROFILE = os.environ.get('CAMERA_DEGRADED_PROFILE', 'extreme')
+
 @dataclass
 class CameraInfo:
     """Информация о камере"""
@@ -87,11 +275,216 @@ class CameraFrame:
     """Кадр с камеры"""
     camera_id: int
     jpeg_data: bytes
-    timestamp: float
+    timestamp: float  # Время публикации (после кодирования JPEG)
     width: int
     height: int
     is_fallback: bool = False
     error: Optional[str] = None
+    image: Optional[np.ndarray] = field(default=None, repr=False)  # Исходный BGR кадр
+    seq: int = 0  # Порядковый номер кадра камеры
+    capture_ts: float = 0.0  # Время получения кадра с устройства
+
+class LatencyHistogram:
+    """Гистограмма задержек в миллисекундах с логарифмическими корзинами"""
+    
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, value_ms: float):
+        index = len(self.BOUNDS_MS)
+        for i, bound in enumerate(self.BOUNDS_MS):
+            if value_ms <= bound:
+                index = i
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += value_ms
+            self.max_ms = max(self.max_ms, value_ms)
+    
+    def _percentile(self, counts: List[int], total: int, fraction: float) -> Optional[float]:
+        """Оценка перцентиля по верхней границе корзины"""
+        if total == 0:
+            return None
+        threshold = total * fraction
+        cumulative = 0
+        for i, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return float(self.BOUNDS_MS[i]) if i < len(self.BOUNDS_MS) else None
+        return None
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+            total_ms = self.total_ms
+            max_ms = self.max_ms
+        buckets = {f"le_{bound}": counts[i] for i, bound in enumerate(self.BOUNDS_MS)}
+        buckets["inf"] = counts[-1]
+        return {
+            "count": total,
+            "mean_ms": round(total_ms / total, 3) if total else None,
+            "max_ms": round(max_ms, 3),
+            "p50_ms": self._percentile(counts, total, 0.5),
+            "p90_ms": self._percentile(counts, total, 0.9),
+            "p99_ms": self._percentile(counts, total, 0.99),
+            "buckets": buckets
+        }
+
+class LatencyMetrics:
+    """Гистограммы задержек по камерам и этапам (capture->publish, publish->send)"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms: Dict[tuple, LatencyHistogram] = {}
+    
+    def record(self, camera_id: int, stage: str, value_ms: float):
+        key = (camera_id, stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram())
+        histogram.record(value_ms)
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            items = list(self.histograms.items())
+        result: Dict[str, Dict[str, Any]] = {}
+        for (camera_id, stage), histogram in items:
+            result.setdefault(str(camera_id), {})[stage] = histogram.snapshot()
+        return result
+
+latency_metrics = LatencyMetrics()
+
+# Ограничения сеанса профилирования
+PROFILE_MAX_DURATION = 120.0
+PROFILE_MAX_SAMPLE_HZ = 1000
+PROFILE_MAX_SAMPLES_PER_KEY = 100000
+
+class HotPathProfiler:
+    """Сеанс профилирования ограниченной длительности: таймеры этапов и выборка стеков потоков.
+    
+    Точки замера проверяют только флаг enabled, поэтому без сеанса накладные расходы
+    сводятся к одной проверке атрибута на кадр.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.timers: Dict[tuple, List[float]] = {}  # (этап, ключ) -> длительности, мс
+        self.stacks: Dict[str, int] = {}  # свернутый стек -> число выборок
+        self.session: Optional[Dict[str, Any]] = None
+        self.thread: Optional[threading.Thread] = None
+    
+    def record(self, stage: str, key: Any, started: float):
+        """Замер этапа от started (time.perf_counter()) до текущего момента"""
+        self.record_ms(stage, key, (time.perf_counter() - started) * 1000.0)
+    
+    def record_ms(self, stage: str, key: Any, value_ms: float):
+        if not self.enabled:
+            return
+        values = self.timers.get((stage, key))
+        if values is None:
+            with self.lock:
+                values = self.timers.setdefault((stage, key), [])
+        if len(values) < PROFILE_MAX_SAMPLES_PER_KEY:
+            values.append(value_ms)
+    
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+    
+    def start(self, duration: float, sample_hz: int, stacks: bool) -> Dict[str, Any]:
+        with self.lock:
+            if self.is_running:
+                raise RuntimeError("Сеанс профилирования уже идет")
+            self.timers = {}
+            self.stacks = {}
+            self.session = {
+                "started": time.time(),
+                "duration": duration,
+                "sample_hz": sample_hz if stacks else 0,
+                "stack_samples": 0,
+                "finished": None
+            }
+            self.enabled = True
+            self.thread = threading.Thread(target=self._run, args=(duration, sample_hz, stacks),
+                                           name="profiler", daemon=True)
+            self.thread.start()
+        logger.warning(f"Начат сеанс профилирования на {duration} с (стеки: {sample_hz if stacks else 0} Гц)")
+        return self.status()
+    
+    def _sample_stacks(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            parts.append(names.get(ident, f"thread-{ident}").replace(';', '_').replace(' ', '_'))
+            stack = ';'.join(reversed(parts))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.session["stack_samples"] += 1
+    
+    def _run(self, duration: float, sample_hz: int, stacks: bool):
+        deadline = time.time() + duration
+        interval = 1.0 / sample_hz if stacks else 0.5
+        try:
+            while time.time() < deadline and not shutdown_event.is_set():
+                if stacks:
+                    self._sample_stacks()
+                time.sleep(interval)
+        except Exception as e:
+            logger.error(f"Ошибка сеанса профилирования: {e}")
+        finally:
+            self.enabled = False
+            self.session["finished"] = time.time()
+            logger.warning("Сеанс профилирования завершен")
+    
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Сводка по этапам: число замеров, суммарное время и перцентили по каждому ключу"""
+        with self.lock:
+            items = [(key, list(values)) for key, values in self.timers.items()]
+        result: Dict[str, Dict[str, Any]] = {}
+        for (stage, key), values in items:
+            if not values:
+                continue
+            data = np.array(values)
+            result.setdefault(stage, {})[str(key)] = {
+                "count": len(values),
+                "total_ms": round(float(data.sum()), 3),
+                "mean_ms": round(float(data.mean()), 3),
+                "p50_ms": round(float(np.percentile(data, 50)), 3),
+                "p90_ms": round(float(np.percentile(data, 90)), 3),
+                "p99_ms": round(float(np.percentile(data, 99)), 3),
+                "max_ms": round(float(data.max()), 3)
+            }
+        return result
+    
+    def collapsed(self) -> str:
+        """Стеки в свернутом формате flamegraph.pl / speedscope: "поток;файл:функция;... число" """
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(list(self.stacks.items())))
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.is_running,
+            "session": dict(self.session) if self.session else None,
+            "stages": self.summary() if self.session else {},
+            "distinct_stacks": len(self.stacks)
+        }
+
+profiler = HotPathProfiler()
 
 class CameraStream:
     """Оптимизированный поток для чтения кадров с камеры"""
@@ -111,17 +504,36 @@ class CameraStream:
         self.last_frame_time = 0
         self.lock = threading.Lock()  # Добавляем блокировку
         self.stop_event = threading.Event()  # Событие для остановки
+        self.frame_cond = threading.Condition()  # Уведомление о новом кадре
+        self.frame_seq = 0
+        self.external_driver = False  # Кадры читает группа синхронного захвата
+        self.driver_idle = threading.Event()
+        self.shm_rings: Dict[str, FrameRingWriter] = {}  # Кольца кадров в разделяемой памяти
+        self.device_identity: Optional[str] = None
+        self.negotiated: Optional[Dict[str, Any]] = None
+        self.negotiation_stats = {
+            "last_ms": None,
+            "last_source": None,
+            "total_ms": 0.0,
+            "count": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "failures": 0
+        }
+        self.pending_settings: Optional[tuple] = None  # (разрешение, FPS) для применения владельцем чтения
+        self.settings_seq = 0  # Номер первого кадра после последнего изменения параметров захвата
+        self.renegotiation_stats = {
+            "count": 0,
+            "property": 0,
+            "reopen": 0,
+            "failures": 0,
+            "last_ms": None
+        }
+        self.failed_resolutions: Dict[tuple, float] = {}  # Разрешение -> время неудачного переоткрытия
         
     def _try_backends(self) -> Optional[cv2.VideoCapture]:
         """Попытка открыть камеру с разными backend'ами для Linux"""
-        # Linux backends для контейнера
-        backends = [
-            (cv2.CAP_V4L2, "Video4Linux2"),  # Основной Linux backend
-            (cv2.CAP_ANY, "Auto"),           # Автоматический выбор
-            (cv2.CAP_V4L, "Video4Linux"),    # Старый Linux backend
-        ]
-        
-        for backend_id, backend_name in backends:
+        for backend_id, backend_name in CAPTURE_BACKENDS:
             try:
                 cap = cv2.VideoCapture(self.camera_id, backend_id)
                 
@@ -144,6 +556,186 @@ class CameraStream:
         
         return None
     
+    def _apply_capture_settings(self, cap: cv2.VideoCapture, fourcc: str = ""):
+        """Установка FOURCC, разрешения и FPS на открытом устройстве"""
+        if fourcc and len(fourcc) == 4:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    
+    def _open_cached(self, config: Dict[str, Any]) -> Optional[cv2.VideoCapture]:
+        """Открытие камеры по ранее согласованной конфигурации"""
+        backend_ids = {name: backend_id for backend_id, name in CAPTURE_BACKENDS}
+        backend_id = backend_ids.get(config.get("backend"))
+        if backend_id is None:
+            return None
+        
+        cap = None
+        try:
+            cap = cv2.VideoCapture(self.camera_id, backend_id)
+            if not cap.isOpened():
+                cap.release()
+                return None
+            self._apply_capture_settings(cap, config.get("fourcc", ""))
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                cap.release()
+                return None
+            self.backend = config["backend"]
+            return cap
+        except Exception as e:
+            logger.warning(f"Ошибка открытия камеры {self.camera_id} по кэшированной конфигурации: {e}")
+            if cap is not None:
+                cap.release()
+            return None
+    
+    def _open_capture(self) -> Optional[cv2.VideoCapture]:
+        """Открытие камеры: сначала кэшированная конфигурация, затем полный перебор backend'ов"""
+        started = time.perf_counter()
+        if self.device_identity is None:
+            self.device_identity = get_device_identity(self.camera_id)
+        
+        cap = None
+        source = "search"
+        cached = negotiation_cache.get(self.device_identity)
+        if cached:
+            cap = self._open_cached(cached)
+            if cap is not None:
+                source = "cache"
+                self.negotiation_stats["cache_hits"] += 1
+            else:
+                logger.warning(f"Кэшированная конфигурация камеры {self.camera_id} не подошла, выполняем полный поиск")
+                self.negotiation_stats["cache_misses"] += 1
+                negotiation_cache.invalidate(self.device_identity)
+        
+        if cap is None:
+            cap = self._try_backends()
+            if cap is not None:
+                try:
+                    self._apply_capture_settings(cap)
+                    ret, frame = cap.read()
+                    if not ret or frame is None:
+                        logger.error(f"Камера {self.camera_id} не может читать кадры после настройки параметров")
+                        cap.release()
+                        cap = None
+                except Exception as e:
+                    logger.error(f"Ошибка настройки камеры {self.camera_id}: {e}")
+                    cap.release()
+                    cap = None
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        stats = self.negotiation_stats
+        stats["last_ms"] = round(elapsed_ms, 2)
+        stats["total_ms"] += elapsed_ms
+        stats["count"] += 1
+        
+        if cap is None:
+            stats["last_source"] = "failed"
+            stats["failures"] += 1
+            return None
+        
+        stats["last_source"] = source
+        self.negotiated = {
+            "backend": self.backend,
+            "fourcc": fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS)
+        }
+        negotiation_cache.put(self.device_identity, self.negotiated)
+        logger.info(f"Камера {self.camera_id} ({self.device_identity}) открыта за {elapsed_ms:.0f} мс ({source})")
+        return cap
+    
+    def get_negotiation_metrics(self) -> Dict[str, Any]:
+        """Метрики согласования параметров захвата"""
+        stats = dict(self.negotiation_stats)
+        stats["total_ms"] = round(stats["total_ms"], 2)
+        stats["device_identity"] = self.device_identity
+        stats["negotiated"] = self.negotiated
+        stats["requested"] = {"width": self.resolution[0], "height": self.resolution[1], "fps": self.fps}
+        stats["renegotiation"] = dict(self.renegotiation_stats)
+        stats["renegotiation"]["failed_resolutions"] = [
+            f"{width}x{height}" for width, height in list(self.failed_resolutions)]
+        return stats
+    
+    def request_settings(self, resolution: tuple, fps: float):
+        """Запрос нового разрешения и FPS захвата; применяет поток, который читает камеру"""
+        self.pending_settings = (tuple(resolution), float(fps))
+    
+    def resolution_failed(self, resolution: tuple) -> bool:
+        """Камера недавно не открылась с этим разрешением (повтор через CAPTURE_FAILED_RETRY)"""
+        failed_at = self.failed_resolutions.get(tuple(resolution))
+        if failed_at is None:
+            return False
+        if time.time() - failed_at >= CAPTURE_FAILED_RETRY:
+            self.failed_resolutions.pop(tuple(resolution), None)
+            return False
+        return True
+    
+    def apply_pending_settings(self) -> bool:
+        """Смена разрешения и FPS на открытом устройстве.
+        
+        Сначала параметры меняются на лету через cap.set(); если драйвер их не применил
+        (кадр прежнего размера), устройство переоткрывается по кэшированной конфигурации
+        без перебора backend'ов. Вызывается только владельцем чтения камеры.
+        """
+        pending, self.pending_settings = self.pending_settings, None
+        if pending is None or pending == (self.resolution, self.fps):
+            return False
+        previous = (self.resolution, self.fps)
+        self.resolution, self.fps = pending
+        if self.capture is None:
+            return False
+        
+        started = time.perf_counter()
+        old_size = (self.last_frame.width, self.last_frame.height) if self.last_frame is not None else None
+        size = None
+        method = "property"
+        try:
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+            self.capture.set(cv2.CAP_PROP_FPS, self.fps)
+            ret, frame = self.capture.read()
+            if ret and frame is not None:
+                size = (frame.shape[1], frame.shape[0])
+        except Exception as e:
+            logger.warning(f"Камера {self.camera_id} не приняла параметры на лету: {e}")
+        
+        if size is None or (size != self.resolution and size == old_size):
+            # Драйвер не меняет формат без перезапуска потока - переоткрываем устройство
+            method = "reopen"
+            try:
+                self.capture.release()
+            except Exception as e:
+                logger.warning(f"Ошибка при закрытии камеры {self.camera_id}: {e}")
+            self.capture = self._open_capture()
+            if self.capture is None:
+                logger.error(f"Не удалось открыть камеру {self.camera_id} с разрешением "
+                             f"{self.resolution[0]}x{self.resolution[1]}, возвращаем прежние параметры")
+                self.renegotiation_stats["failures"] += 1
+                self.failed_resolutions[tuple(self.resolution)] = time.time()
+                self.resolution, self.fps = previous
+                self.capture = self._open_capture()
+                return False
+        elif self.negotiated is not None:
+            self.negotiated.update(width=size[0], height=size[1], fps=self.capture.get(cv2.CAP_PROP_FPS))
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        stats = self.renegotiation_stats
+        stats["count"] += 1
+        stats[method] += 1
+        stats["last_ms"] = round(elapsed_ms, 2)
+        self.settings_seq = self.frame_seq + 1
+        actual = self.negotiated or {}
+        logger.info("Камера %s: захват %sx%s@%g -> %sx%s@%g (фактически %sx%s, %s, %.0f мс)",
+                    self.camera_id, previous[0][0], previous[0][1], previous[1],
+                    self.resolution[0], self.resolution[1], self.fps,
+                    actual.get('width'), actual.get('height'), method, elapsed_ms,
+                    extra={"log_key": f"renegotiate:{self.camera_id}"})
+        return True
+    
     def start(self) -> bool:
         """Запуск потока камеры"""
         with self.lock:
@@ -151,15 +743,10 @@ class CameraStream:
                 return True
             try:
                 self.stop_event.clear()
-                self.capture = self._try_backends()
+                self.capture = self._open_capture()
                 if self.capture is None:
                     logger.error(f"Не удалось открыть камеру {self.camera_id}")
                     return False
-                # Настройка параметров камеры
-                self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
-                self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
-                self.capture.set(cv2.CAP_PROP_FPS, self.fps)
-                self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                 self.is_running = True
                 self.thread = threading.Thread(target=self._read_frames, daemon=True)
                 self.thread.start()
@@ -192,6 +779,34 @@ class CameraStream:
                     self.frame_queue.get_nowait()
                 except Empty:
                     break
+            for ring in self.shm_rings.values():
+                ring.close()
+            self.shm_rings.clear()
+    
+    def _export_shm(self, kind: str, data, timestamp: float, seq: int):
+        """Запись кадра в кольцо разделяемой памяти (кольцо пересоздается, если кадр не помещается)"""
+        try:
+            nbytes = len(data) if isinstance(data, bytes) else data.nbytes
+            ring = self.shm_rings.get(kind)
+            if ring is None or not ring.fits(nbytes):
+                if ring is not None:
+                    ring.close()
+                # Запас под JPEG переменного размера
+                capacity = nbytes if kind == 'raw' else nbytes * 2
+                ring = FrameRingWriter(ring_name(self.camera_id, kind), capacity, SHM_RING_SLOTS)
+                self.shm_rings[kind] = ring
+                logger.info(f"Камера {self.camera_id}: кольцо кадров {ring.name} ({ring.slot_size} байт x {SHM_RING_SLOTS})")
+            ring.write(data, timestamp, seq)
+        except Exception as e:
+            logger.error(f"Ошибка экспорта кадра камеры {self.camera_id} в разделяемую память: {e}")
+            self.shm_rings.pop(kind, None)
+    
+    def get_shm_info(self) -> List[Dict[str, Any]]:
+        return [
+            {"kind": kind, "name": ring.name, "slot_size": ring.slot_size,
+             "slots": ring.slot_count, "latest_seq": ring.seq}
+            for kind, ring in list(self.shm_rings.items())
+        ]
     
     def _read_frames(self):
         """Постоянное чтение кадров в отдельном потоке с автоматическим перезапуском камеры"""
@@ -199,10 +814,24 @@ class CameraStream:
         consecutive_errors = 0
         max_consecutive_errors = 10
         
+        heartbeat_source = f"capture-{self.camera_id}"
         while self.is_running and not self.stop_event.is_set():
+            heartbeat.beat(heartbeat_source, CAPTURE_HANG_TIMEOUT, CAPTURE_HANG_ACTION)
+            # В группе синхронного захвата кадры читает группа
+            if self.external_driver:
+                self.driver_idle.set()
+                self.stop_event.wait(0.05)
+                continue
+            self.driver_idle.clear()
+            
             try:
+                if self.pending_settings is not None:
+                    self.apply_pending_settings()
+                    frame_interval = max(0.01, 1.0 / self.fps)
+                
                 if self.capture is None or not self.capture.isOpened():
-                    logger.warning(f"Камера {self.camera_id} недоступна, пытаемся переподключиться...")
+                    logger.warning("Камера %s недоступна, пытаемся переподключиться...", self.camera_id,
+                                   extra={"log_key": f"reconnect:{self.camera_id}"})
                     consecutive_errors += 1
                     if consecutive_errors >= max_consecutive_errors:
                         logger.error(f"Слишком много ошибок с камеры {self.camera_id}, перезапускаем камеру...")
@@ -213,9 +842,14 @@ class CameraStream:
                 
                 # Безопасное чтение кадра с обработкой OpenCV ошибок
                 try:
+                    profile_start = time.perf_counter() if profiler.enabled else 0.0
                     ret, frame = self.capture.read()
+                    capture_ts = time.time()
+                    if profile_start:
+                        profiler.record("read", self.camera_id, profile_start)
                 except Exception as opencv_error:
-                    logger.error(f"OpenCV ошибка при чтении кадра с камеры {self.camera_id}: {opencv_error}")
+                    logger.error("OpenCV ошибка при чтении кадра с камеры %s: %s", self.camera_id, opencv_error,
+                                 extra={"log_key": f"opencv_read:{self.camera_id}"})
                     self.error_count += 1
                     consecutive_errors += 1
                     
@@ -232,42 +866,15 @@ class CameraStream:
                     self.error_count = 0
                     consecutive_errors = 0
                     
-                    # Безопасное кодирование в JPEG
-                    try:
-                        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 85]
-                        _, buffer = cv2.imencode('.jpg', frame, encode_param)
-                        jpeg_data = buffer.tobytes()
-                    except Exception as encode_error:
-                        logger.error(f"Ошибка кодирования JPEG для камеры {self.camera_id}: {encode_error}")
+                    if self.publish_frame(frame, capture_ts) is None:
                         time.sleep(0.1)
                         continue
-                    
-                    camera_frame = CameraFrame(
-                        camera_id=self.camera_id,
-                        jpeg_data=jpeg_data,
-                        timestamp=time.time(),
-                        width=frame.shape[1],
-                        height=frame.shape[0]
-                    )
-                    
-                    # Очищаем очередь и добавляем новый кадр
-                    while not self.frame_queue.empty():
-                        try:
-                            self.frame_queue.get_nowait()
-                        except Empty:
-                            break
-                    
-                    try:
-                        self.frame_queue.put(camera_frame, block=False)
-                        self.last_frame = camera_frame
-                        self.last_frame_time = camera_frame.timestamp
-                    except Full:
-                        self.last_frame = camera_frame
-                        self.last_frame_time = camera_frame.timestamp
                 else:
                     self.error_count += 1
                     consecutive_errors += 1
-                    logger.warning(f"Не удалось прочитать кадр с камеры {self.camera_id} (ошибка #{self.error_count}, последовательных: {consecutive_errors})")
+                    logger.warning("Не удалось прочитать кадр с камеры %s (ошибка #%s, последовательных: %s)",
+                                   self.camera_id, self.error_count, consecutive_errors,
+                                   extra={"log_key": f"read_failed:{self.camera_id}"})
                     
                     if consecutive_errors >= max_consecutive_errors:
                         logger.error(f"Слишком много последовательных ошибок с камеры {self.camera_id}, перезапускаем камеру...")
@@ -282,7 +889,8 @@ class CameraStream:
             except Exception as e:
                 self.error_count += 1
                 consecutive_errors += 1
-                logger.error(f"Общая ошибка в потоке камеры {self.camera_id}: {e}")
+                logger.error("Общая ошибка в потоке камеры %s: %s", self.camera_id, e,
+                             extra={"log_key": f"reader_error:{self.camera_id}"})
                 
                 # При любых критических ошибках пытаемся перезапустить камеру
                 if consecutive_errors >= max_consecutive_errors:
@@ -294,91 +902,1347 @@ class CameraStream:
                         logger.error(f"Не удалось перезапустить камеру {self.camera_id}: {restart_error}")
                 
                 time.sleep(0.5)
+        heartbeat.leave(heartbeat_source)
+    
+    def publish_frame(self, frame: np.ndarray, capture_ts: float) -> Optional[CameraFrame]:
+        """Кодирование кадра в JPEG и публикация для потребителей"""
+        # Безопасное кодирование в JPEG
+        try:
+            profile_start = time.perf_counter() if profiler.enabled else 0.0
+            jpeg_data = jpeg_codec.encode(frame, CAPTURE_PRESET)
+            if profile_start:
+                profiler.record("encode", self.camera_id, profile_start)
+        except Exception as encode_error:
+            logger.error("Ошибка кодирования JPEG для камеры %s: %s", self.camera_id, encode_error,
+                         extra={"log_key": f"encode_error:{self.camera_id}"})
+            return None
+        
+        camera_frame = CameraFrame(
+            camera_id=self.camera_id,
+            jpeg_data=jpeg_data,
+            timestamp=time.time(),
+            width=frame.shape[1],
+            height=frame.shape[0],
+            image=frame,
+            seq=self.frame_seq + 1,
+            capture_ts=capture_ts
+        )
+        self.frame_seq = camera_frame.seq
+        if SHM_EXPORT_ENABLED:
+            # Сырые кадры для локальных процессов и JPEG для раздающих воркеров (camera_worker.py)
+            self._export_shm('raw', frame, capture_ts, camera_frame.seq)
+            self._export_shm('jpeg', jpeg_data, capture_ts, camera_frame.seq)
+        latency_metrics.record(self.camera_id, "capture_to_publish",
+                               (camera_frame.timestamp - capture_ts) * 1000.0)
+        
+        # Очищаем очередь и добавляем новый кадр
+        while not self.frame_queue.empty():
+            try:
+                self.frame_queue.get_nowait()
+            except Empty:
+                break
+        
+        try:
+            self.frame_queue.put(camera_frame, block=False)
+            self.last_frame = camera_frame
+            self.last_frame_time = camera_frame.timestamp
+        except Full:
+            self.last_frame = camera_frame
+            self.last_frame_time = camera_frame.timestamp
+        
+        with self.frame_cond:
+            self.frame_cond.notify_all()
+        return camera_frame
+    
+    def set_external_driver(self, enabled: bool, timeout: float = 1.0) -> bool:
+        """Передача чтения кадров внешнему владельцу (группе синхронного захвата) и обратно"""
+        self.external_driver = enabled
+        if not enabled:
+            return True
+        # Ждем, пока собственный поток закончит текущее чтение
+        return self.driver_idle.wait(timeout) if self.is_running else True
+    
+    def _restart_camera(self):
+        """Перезапуск камеры при проблемах"""
+        try:
+            # Закрываем текущий capture
+            if self.capture:
+                try:
+                    self.capture.release()
+                except Exception as e:
+                    logger.warning(f"Ошибка при закрытии камеры {self.camera_id}: {e}")
+                finally:
+                    self.capture = None
+            
+            # Увеличиваем паузу перед перезапуском для стабильности
+            time.sleep(1.0)
+            # Пауза сторожа отсчитывается от начала открытия устройства, а не от начала итерации
+            heartbeat.beat(f"capture-{self.camera_id}", CAPTURE_HANG_TIMEOUT, CAPTURE_HANG_ACTION)
+            
+            # Пытаемся открыть камеру заново (кэшированная конфигурация, затем полный поиск)
+            try:
+                self.capture = self._open_capture()
+                if self.capture is None:
+                    logger.error(f"Не удалось перезапустить камеру {self.camera_id}")
+                    return False
+                return True
+                
+            except Exception as e:
+                logger.error(f"Ошибка при открытии камеры {self.camera_id} после перезапуска: {e}")
+                return False
+            
+        except Exception as e:
+            logger.error(f"Критическая ошибка при перезапуске камеры {self.camera_id}: {e}")
+            return False
+    
+    def wait_new_frame(self, last_timestamp: Optional[float], timeout: float) -> Optional[CameraFrame]:
+        """Ожидание кадра новее last_timestamp (без извлечения из очереди)"""
+        with self.frame_cond:
+            frame = self.last_frame
+            if frame is None or frame.timestamp == last_timestamp:
+                self.frame_cond.wait(timeout)
+                frame = self.last_frame
+        return frame
+    
+    def get_frame(self) -> Optional[CameraFrame]:
+        """Получение последнего кадра"""
+        if not self.is_running:
+            return self.last_frame
+        
+        try:
+            return self.frame_queue.get_nowait()
+        except Empty:
+            return self.last_frame
+
+class SyntheticCapture:
+    """Синтетический источник с интерфейсом cv2.VideoCapture.
+    
+    Рисует движущийся градиент и метку времени захвата в пикселях
+    (common.pixel_timestamp), чтобы клиент мог измерить полную задержку.
+    """
+    
+    def __init__(self, resolution: tuple, fps: float):
+        self.props = {
+            cv2.CAP_PROP_FRAME_WIDTH: float(resolution[0]),
+            cv2.CAP_PROP_FRAME_HEIGHT: float(resolution[1]),
+            cv2.CAP_PROP_FPS: float(fps),
+            cv2.CAP_PROP_FOURCC: float(cv2.VideoWriter_fourcc(*'SYNT'))
+        }
+        self.opened = True
+        self.next_time = time.time()
+        self.frame_index = 0
+        self.grabbed_ts: Optional[float] = None
+    
+    def isOpened(self) -> bool:
+        return self.opened
+    
+    def set(self, prop: int, value: float) -> bool:
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS):
+            self.props[prop] = float(value)
+            return True
+        return False
+    
+    def get(self, prop: int) -> float:
+        return self.props.get(prop, 0.0)
+    
+    def grab(self) -> bool:
+        if not self.opened:
+            return False
+        # Выдерживаем частоту кадров как настоящая камера
+        delay = self.next_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + 1.0 / max(1.0, self.props[cv2.CAP_PROP_FPS]), time.time())
+        self.grabbed_ts = time.time()
+        return True
+    
+    def retrieve(self):
+        if self.grabbed_ts is None:
+            return False, None
+        width = int(self.props[cv2.CAP_PROP_FRAME_WIDTH])
+        height = int(self.props[cv2.CAP_PROP_FRAME_HEIGHT])
+        self.frame_index += 1
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        row = ((x + self.frame_index * 4) % 256).astype(np.uint8)
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:, :, 0] = row
+        image[:, :, 1] = row[::-1]
+        image[:, :, 2] = (self.frame_index * 2) % 256
+        encode_timestamp(image, self.grabbed_ts)
+        return True, image
+    
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+    
+    def release(self):
+        self.opened = False
+
+class SyntheticCameraStream(CameraStream):
+    """Поток синтетической камеры"""
+    
+    def _open_capture(self) -> Optional[SyntheticCapture]:
+        self.backend = "Synthetic"
+        self.device_identity = "synthetic"
+        self.negotiated = {"backend": self.backend, "fourcc": "SYNT",
+                           "width": self.resolution[0], "height": self.resolution[1], "fps": self.fps}
+        return SyntheticCapture(self.resolution, self.fps)
+
+@dataclass
+class FrameSet:
+    """Согласованный набор кадров группы камер"""
+    group: str
+    seq: int
+    deadline: float
+    frames: Dict[int, CameraFrame]
+    grab_ts: Dict[int, float]
+    skew_ms: float
+    missing: List[int]
+
+class CaptureGroup:
+    """Группа синхронного захвата: grab() всех камер подряд в общий момент, затем параллельный retrieve()"""
+    
+    MAX_CONSECUTIVE_ERRORS = 10
+    
+    def __init__(self, name: str, camera_ids: List[int], fps: float):
+        self.name = name
+        self.camera_ids = list(camera_ids)
+        self.fps = fps
+        self.is_running = False
+        self.thread: Optional[threading.Thread] = None
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(camera_ids)), thread_name_prefix=f"group-{name}")
+        self.latest: Optional[FrameSet] = None
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.skew = LatencyHistogram()
+        self.errors: Dict[int, int] = {camera_id: 0 for camera_id in camera_ids}
+        self.stats = {"sets": 0, "incomplete_sets": 0, "overruns": 0, "last_skew_ms": None}
+    
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.is_running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=3.0)
+        self.executor.shutdown(wait=False)
+        # Возвращаем камерам собственное чтение
+        for camera_id in self.camera_ids:
+            stream = camera_service.streams.get(camera_id)
+            if stream is not None:
+                stream.set_external_driver(False)
+    
+    def _acquire_streams(self) -> Dict[int, CameraStream]:
+        """Актуальные потоки камер группы (поток мог быть пересоздан перезапуском)"""
+        streams = {}
+        for camera_id in self.camera_ids:
+            stream = camera_service.streams.get(camera_id)
+            if stream is None or not stream.is_running:
+                continue
+            if not stream.external_driver:
+                if not stream.set_external_driver(True):
+                    # Собственный поток камеры еще читает VideoCapture (не потокобезопасен) -
+                    # камера пропускает этот цикл группы
+                    logger.warning(f"Группа {self.name}: камера {camera_id} не освободила захват, пропускаем цикл",
+                                   extra={"log_key": f"group_handover:{self.name}:{camera_id}"})
+                    continue
+            elif stream.is_running and not stream.driver_idle.is_set():
+                continue  # Передача чтения группе еще не подтверждена потоком камеры
+            if stream.pending_settings is not None:
+                stream.apply_pending_settings()
+            streams[camera_id] = stream
+        return streams
+    
+    def _retrieve(self, stream: CameraStream, capture_ts: float) -> Optional[CameraFrame]:
+        profile_start = time.perf_counter() if profiler.enabled else 0.0
+        ret, frame = stream.capture.retrieve()
+        if profile_start:
+            profiler.record("read", stream.camera_id, profile_start)
+        if not ret or frame is None:
+            return None
+        return stream.publish_frame(frame, capture_ts)
+    
+    def _handle_error(self, stream: CameraStream):
+        self.errors[stream.camera_id] = self.errors.get(stream.camera_id, 0) + 1
+        stream.error_count += 1
+        if self.errors[stream.camera_id] >= self.MAX_CONSECUTIVE_ERRORS:
+            logger.error(f"Группа {self.name}: слишком много ошибок камеры {stream.camera_id}, перезапускаем камеру...")
+            stream._restart_camera()
+            self.errors[stream.camera_id] = 0
+    
+    def _run(self):
+        interval = 1.0 / self.fps
+        deadline = time.time()
+        heartbeat_source = f"group-{self.name}"
+        while self.is_running and not shutdown_event.is_set():
+            heartbeat.beat(heartbeat_source, CAPTURE_HANG_TIMEOUT, CAPTURE_HANG_ACTION)
+            try:
+                deadline += interval
+                delay = deadline - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Не успели к сроку - сдвигаем расписание, не накапливая отставание
+                    self.stats["overruns"] += 1
+                    deadline = time.time()
+                
+                streams = self._acquire_streams()
+                # Фаза 1: grab() подряд, чтобы кадры были как можно ближе по времени
+                grab_ts: Dict[int, float] = {}
+                for camera_id, stream in streams.items():
+                    capture = stream.capture
+                    try:
+                        if capture is not None and capture.grab():
+                            grab_ts[camera_id] = time.time()
+                            self.errors[camera_id] = 0
+                        else:
+                            self._handle_error(stream)
+                    except Exception as e:
+                        logger.warning(f"Группа {self.name}: ошибка grab() камеры {camera_id}: {e}")
+                        self._handle_error(stream)
+                
+                # Фаза 2: параллельный retrieve() и кодирование
+                futures = {
+                    camera_id: self.executor.submit(self._retrieve, streams[camera_id], ts)
+                    for camera_id, ts in grab_ts.items()
+                }
+                frames: Dict[int, CameraFrame] = {}
+                for camera_id, future in futures.items():
+                    try:
+                        frame = future.result(timeout=max(1.0, interval * 4))
+                    except Exception as e:
+                        logger.warning(f"Группа {self.name}: ошибка retrieve() камеры {camera_id}: {e}")
+                        frame = None
+                    if frame is not None:
+                        frames[camera_id] = frame
+                    else:
+                        self._handle_error(streams[camera_id])
+                
+                if not frames:
+                    continue
+                times = [grab_ts[camera_id] for camera_id in frames]
+                skew_ms = (max(times) - min(times)) * 1000.0
+                missing = [camera_id for camera_id in self.camera_ids if camera_id not in frames]
+                self.skew.record(skew_ms)
+                with self.lock:
+                    self.seq += 1
+                    self.latest = FrameSet(
+                        group=self.name,
+                        seq=self.seq,
+                        deadline=deadline,
+                        frames=frames,
+                        grab_ts={camera_id: grab_ts[camera_id] for camera_id in frames},
+                        skew_ms=skew_ms,
+                        missing=missing
+                    )
+                    self.stats["sets"] += 1
+                    self.stats["last_skew_ms"] = round(skew_ms, 3)
+                    if missing:
+                        self.stats["incomplete_sets"] += 1
+            except Exception as e:
+                logger.error(f"Ошибка в группе синхронного захвата {self.name}: {e}")
+                time.sleep(0.5)
+        heartbeat.leave(heartbeat_source)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+        return {
+            "name": self.name,
+            "camera_ids": self.camera_ids,
+            "fps": self.fps,
+            "is_running": self.is_running,
+            "skew": self.skew.snapshot(),
+            **stats
+        }
+
+def parse_sync_groups(spec: str) -> List[tuple]:
+    """Разбор CAMERA_SYNC_GROUPS: "stereo=0,1@30;body=2,3" -> [(имя, [id], fps)]"""
+    groups = []
+    for item in filter(None, (part.strip() for part in spec.split(';'))):
+        name, _, rest = item.partition('=')
+        ids, _, fps = rest.partition('@')
+        try:
+            camera_ids = [int(value) for value in ids.split(',') if value.strip()]
+            groups.append((name.strip(), camera_ids, float(fps) if fps else 30.0))
+        except ValueError:
+            logger.error(f"Некорректное описание группы камер: {item}")
+    return groups
+
+@dataclass
+class H264AccessUnit:
+    """Закодированный кадр H.264 (Annex-B, начинается с AUD)"""
+    data: bytes
+    keyframe: bool
+    timestamp: float
+
+class StreamSubscriber:
+    """Подписчик общего кодера: asyncio очередь в цикле событий клиента"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.waiting_keyframe = True
+        self.dropped = 0
+        self.closed = False
+    
+    def deliver(self, unit: H264AccessUnit):
+        """Вызывается в цикле событий подписчика"""
+        if self.closed:
+            return
+        if self.waiting_keyframe:
+            if not unit.keyframe:
+                return
+            self.waiting_keyframe = False
+        if self.queue.full():
+            # Клиент не успевает: сбрасываем очередь и ждем следующий ключевой кадр
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.waiting_keyframe = True
+            return
+        self.queue.put_nowait(unit)
+    
+    def close(self):
+        """Кодер остановлен: None в очереди завершает обработчик клиента (цикл событий подписчика)"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(None)
+
+def iter_nal_types(data: bytes):
+    """Типы NAL-блоков в Annex-B буфере"""
+    pos = data.find(b'\x00\x00\x01')
+    while pos != -1 and pos + 3 < len(data):
+        yield data[pos + 3] & 0x1F
+        pos = data.find(b'\x00\x00\x01', pos + 3)
+
+class H264Encoder:
+    """Общий H.264 кодер для профиля камеры (один процесс ffmpeg на всех зрителей)"""
+    
+    AUD = b'\x00\x00\x00\x01\x09'
+    
+    def __init__(self, key: tuple, camera_id: int, width: int, fps: int, bitrate_kbps: int):
+        self.key = key
+        self.camera_id = camera_id
+        self.width = width
+        self.fps = fps
+        self.bitrate_kbps = bitrate_kbps
+        self.frame_size: Optional[tuple] = None
+        self.process: Optional[subprocess.Popen] = None  # ffmpeg текущего поколения (для статистики)
+        self.subscribers: Set[StreamSubscriber] = set()
+        self.gop: List[H264AccessUnit] = []  # Кадры с последнего IDR для мгновенного старта новых зрителей
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.generation = 0
+        self.idle_since: Optional[float] = None
+        self.stats = {"frames_in": 0, "units_out": 0, "bytes_out": 0, "keyframes": 0, "restarts": 0}
+        self.demand_id: Optional[int] = None  # Запрос к разрешению захвата на время работы кодера
+    
+    def _command(self, width: int, height: int) -> List[str]:
+        gop = max(1, int(round(self.fps * H264_GOP_SECONDS)))
+        return [
+            FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostdin',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
+            '-profile:v', 'baseline', '-pix_fmt', 'yuv420p',
+            '-bf', '0', '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+            '-b:v', f'{self.bitrate_kbps}k', '-maxrate', f'{self.bitrate_kbps}k',
+            '-bufsize', f'{max(1, self.bitrate_kbps // 2)}k',
+            '-x264-params', 'aud=1:repeat-headers=1',
+            '-flush_packets', '1', '-f', 'h264', '-'
+        ]
+    
+    def _spawn(self, width: int, height: int, generation: int) -> subprocess.Popen:
+        """Процесс ffmpeg поколения generation; устаревшее поколение его сразу завершает"""
+        process = subprocess.Popen(
+            self._command(width, height),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        with self.lock:
+            if self.generation == generation:
+                self.process = process
+                self.frame_size = (width, height)
+        threading.Thread(target=self._read_output, args=(process,), daemon=True).start()
+        return process
+    
+    def _terminate(self, process: Optional[subprocess.Popen]):
+        """Завершение процесса ffmpeg; процесс каждого поколения завершает только его поток"""
+        if process is None:
+            return
+        with self.lock:
+            if self.process is process:
+                self.process = None
+        try:
+            process.stdin.close()
+        except Exception:
+            pass
+        try:
+            process.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    
+    def start(self):
+        with self.lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            # Без подписчиков кодер остановится по H264_IDLE_TIMEOUT, даже если обработчик
+            # не дошел до subscribe() (ошибка accept, отключение клиента); subscribe() сбрасывает отсчет
+            self.idle_since = None if self.subscribers else time.time()
+            self.generation += 1
+            generation = self.generation
+            if self.demand_id is None:
+                self.demand_id = camera_service.capture_demand.add(self.camera_id, *demand_size(self.width or None, None),
+                                                                   self.fps)
+        threading.Thread(target=self._feed_frames, args=(generation,), daemon=True).start()
+    
+    def stop(self):
+        with self.lock:
+            self.is_running = False
+    
+    def subscribe(self, loop: asyncio.AbstractEventLoop) -> StreamSubscriber:
+        # Очередь вмещает весь GOP, который отдается новому зрителю при подключении
+        gop_frames = int(self.fps * H264_GOP_SECONDS)
+        subscriber = StreamSubscriber(loop, H264_SUBSCRIBER_QUEUE + gop_frames)
+        with self.lock:
+            if not self.is_running:
+                # Подача кадров уже завершилась (нет ffmpeg, ошибка): обработчик закроет стрим
+                subscriber.close()
+                return subscriber
+            self.subscribers.add(subscriber)
+            self.idle_since = None
+            # Новый зритель сразу получает текущий GOP начиная с ключевого кадра
+            for unit in self.gop:
+                subscriber.deliver(unit)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: StreamSubscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+            if not self.subscribers:
+                self.idle_since = time.time()
+    
+    def _prepare_image(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        if self.width and self.width < width:
+            height = int(height * self.width / width)
+            width = self.width
+        # libx264 с yuv420p требует четные размеры
+        width, height = width & ~1, height & ~1
+        if (width, height) != (image.shape[1], image.shape[0]):
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(image)
+    
+    def _feed_frames(self, generation: int):
+        """Подача сырых кадров в ffmpeg с постоянной частотой профиля"""
+        interval = 1.0 / self.fps
+        next_time = time.time()
+        process: Optional[subprocess.Popen] = None
+        frame_size: Optional[tuple] = None
+        try:
+            while self.is_running and self.generation == generation and not shutdown_event.is_set():
+                with self.lock:
+                    if self.idle_since and time.time() - self.idle_since > H264_IDLE_TIMEOUT:
+                        self.is_running = False
+                        break
+                
+                frame = camera_service.get_camera_frame(self.camera_id)
+                image = None
+                if frame is not None:
+                    image = frame.image
+                    if image is None and frame.jpeg_data:
+                        # Уменьшение в DCT-домене сразу до ширины кодера
+                        if self.width and self.width < frame.width:
+                            image = decode_scaled(frame.jpeg_data, self.width, codec=jpeg_codec)
+                        else:
+                            image = jpeg_codec.decode(frame.jpeg_data)
+                
+                if image is not None:
+                    image = self._prepare_image(image)
+                    size = (image.shape[1], image.shape[0])
+                    if process is None or process.poll() is not None or size != frame_size:
+                        if process is not None:
+                            self.stats["restarts"] += 1
+                        self._terminate(process)
+                        process, frame_size = self._spawn(*size, generation), size
+                    try:
+                        profile_start = time.perf_counter() if profiler.enabled else 0.0
+                        process.stdin.write(image.tobytes())
+                        self.stats["frames_in"] += 1
+                        if profile_start:
+                            profiler.record("h264_feed", self.camera_id, profile_start)
+                    except (BrokenPipeError, OSError) as e:
+                        logger.warning(f"H.264 кодер камеры {self.camera_id} недоступен: {e}")
+                        self._terminate(process)
+                        process = None
+                
+                next_time += interval
+                delay = next_time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.time()
+        except FileNotFoundError:
+            logger.error(f"ffmpeg не найден ({FFMPEG_BINARY}), H.264 стриминг недоступен")
+        except Exception as e:
+            logger.error(f"Ошибка H.264 кодера камеры {self.camera_id}: {e}")
+        finally:
+            subscribers: List[StreamSubscriber] = []
+            with self.lock:
+                is_current = self.generation == generation
+                if is_current:
+                    self.is_running = False
+                    if self.demand_id is not None:
+                        camera_service.capture_demand.remove(self.camera_id, self.demand_id)
+                        self.demand_id = None
+                    # Зрители текущего поколения больше не получат кадров
+                    subscribers = list(self.subscribers)
+                    self.subscribers.clear()
+                    self.gop = []
+            for subscriber in subscribers:
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.close)
+                except RuntimeError:
+                    pass
+            # Свой процесс завершается всегда: у нового поколения после stop()/start() - свой
+            self._terminate(process)
+            if is_current:
+                camera_service.release_h264_encoder(self)
+    
+    def _read_output(self, process: subprocess.Popen):
+        """Разбор Annex-B потока ffmpeg на access unit'ы по AUD"""
+        buffer = b''
+        fd = process.stdout.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                break
+            if not chunk:
+                break
+            buffer += chunk
+            start = buffer.find(self.AUD)
+            if start == -1:
+                continue
+            while True:
+                end = buffer.find(self.AUD, start + len(self.AUD))
+                if end == -1:
+                    break
+                self._publish(buffer[start:end])
+                start = end
+            buffer = buffer[start:]
+    
+    def _publish(self, data: bytes):
+        unit = H264AccessUnit(data=data, keyframe=5 in set(iter_nal_types(data)), timestamp=time.time())
+        with self.lock:
+            if unit.keyframe:
+                self.gop = [unit]
+                self.stats["keyframes"] += 1
+            elif self.gop:
+                self.gop.append(unit)
+            self.stats["units_out"] += 1
+            self.stats["bytes_out"] += len(data)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, unit)
+            except RuntimeError:
+                # Цикл событий клиента уже закрыт
+                self.unsubscribe(subscriber)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "camera_id": self.camera_id,
+                "width": self.width,
+                "fps": self.fps,
+                "bitrate_kbps": self.bitrate_kbps,
+                "frame_size": self.frame_size,
+                "subscribers": len(self.subscribers),
+                "gop_length": len(self.gop),
+                **self.stats
+            }
+
+egress_scheduler = EgressScheduler(EGRESS_BUDGET_BPS)
+
+admission_controller = AdmissionController(ADMISSION_MAX_STREAMS, ADMISSION_MAX_STREAMS_PER_CAMERA,
+                                           ADMISSION_OVERFLOW, ADMISSION_MAX_DEGRADED)
+
+def demand_size(width: Optional[int], height: Optional[int]) -> tuple:
+    """Размер кадра по ширине и/или высоте; недостающая сторона - по пропорциям базового разрешения"""
+    base_w, base_h = CAPTURE_BASE_RESOLUTION
+    if width and not height:
+        height = int(round(width * base_h / base_w))
+    elif height and not width:
+        width = int(round(height * base_w / base_h))
+    elif not width:
+        width, height = base_w, base_h
+    return int(width), int(height)
+
+class CaptureDemand:
+    """Запросы подписчиков к разрешению и FPS захвата камер.
+
+    Целевые параметры камеры - максимум запрошенного (в пределах CAPTURE_MIN/MAX_RESOLUTION
+    и CAPTURE_MAX_FPS), без запросов - базовые параметры сервиса.
+    """
+
+    def __init__(self, base_resolution: tuple, base_fps: float):
+        self.base_resolution = tuple(base_resolution)
+        self.base_fps = base_fps
+        self.lock = threading.Lock()
+        self.requests: Dict[int, Dict[int, tuple]] = {}  # камера -> id запроса -> (ширина, высота, FPS)
+        self.next_id = 0
+        self.changed = threading.Event()
+
+    def add(self, camera_id: int, width: int, height: int, fps: float) -> int:
+        with self.lock:
+            self.next_id += 1
+            self.requests.setdefault(camera_id, {})[self.next_id] = (width, height, fps)
+            request_id = self.next_id
+        self.changed.set()
+        return request_id
+
+    def remove(self, camera_id: int, request_id: int):
+        with self.lock:
+            requests = self.requests.get(camera_id, {})
+            requests.pop(request_id, None)
+            if not requests:
+                self.requests.pop(camera_id, None)
+        self.changed.set()
+
+    def target(self, camera_id: int) -> tuple:
+        """Целевые (разрешение, FPS) камеры"""
+        with self.lock:
+            requests = list(self.requests.get(camera_id, {}).values())
+        if not requests:
+            return self.base_resolution, self.base_fps
+        width = max(request[0] for request in requests)
+        height = max(request[1] for request in requests)
+        fps = max(request[2] for request in requests)
+        width = min(max(width, CAPTURE_MIN_RESOLUTION[0]), CAPTURE_MAX_RESOLUTION[0])
+        height = min(max(height, CAPTURE_MIN_RESOLUTION[1]), CAPTURE_MAX_RESOLUTION[1])
+        return (width, height), float(min(max(fps, 1.0), CAPTURE_MAX_FPS))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            cameras = {camera_id: list(requests.values()) for camera_id, requests in self.requests.items()}
+        result = {}
+        for camera_id, requests in cameras.items():
+            resolution, fps = self.target(camera_id)
+            result[str(camera_id)] = {
+                "requests": [{"width": w, "height": h, "fps": f} for w, h, f in requests],
+                "target": {"width": resolution[0], "height": resolution[1], "fps": fps}
+            }
+        return result
+
+def enhance_low_quality(img: np.ndarray) -> np.ndarray:
+    """Улучшение резкости и контрастности перед сильным сжатием"""
+    # Увеличиваем контрастность
+    img = cv2.convertScaleAbs(img, alpha=1.5, beta=10)
+    
+    # Применяем фильтр резкости (kernel для увеличения резкости)
+    kernel = np.array([[-1,-1,-1],
+                      [-1, 9,-1],
+                      [-1,-1,-1]])
+    img = cv2.filter2D(img, -1, kernel)
+    
+    # Дополнительное улучшение резкости через unsharp mask
+    gaussian = cv2.GaussianBlur(img, (0, 0), 2.0)
+    img = cv2.addWeighted(img, 1.5, gaussian, -0.5, 0)
+    
+    # Нормализация значений пикселей
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+@dataclass(frozen=True)
+class RoiSpec:
+    """Область интереса: прямоугольник (доли кадра или пиксели), цифровой зум и размер выхода.
+    
+    Зум уменьшает область относительно ее центра, размер выхода по умолчанию -
+    размер области без зума, поэтому zoom=2 дает двукратное увеличение.
+    """
+    x: float
+    y: float
+    w: float
+    h: float
+    normalized: bool = True
+    zoom: float = 1.0
+    out_w: Optional[int] = None
+    out_h: Optional[int] = None
+    
+    def crop_rect(self, width: int, height: int) -> tuple:
+        """Прямоугольник (x0, y0, x1, y1) в пикселях кадра заданного размера.
+        
+        Пиксельные координаты заданы в базовом разрешении захвата и масштабируются
+        под фактический размер кадра.
+        """
+        if self.normalized:
+            x, y, w, h = self.x * width, self.y * height, self.w * width, self.h * height
+        else:
+            scale_x = width / CAPTURE_BASE_RESOLUTION[0]
+            scale_y = height / CAPTURE_BASE_RESOLUTION[1]
+            x, y, w, h = self.x * scale_x, self.y * scale_y, self.w * scale_x, self.h * scale_y
+        center_x, center_y = x + w / 2.0, y + h / 2.0
+        w, h = w / self.zoom, h / self.zoom
+        x0 = int(round(min(max(0.0, center_x - w / 2.0), width - 1)))
+        y0 = int(round(min(max(0.0, center_y - h / 2.0), height - 1)))
+        x1 = int(round(min(float(width), max(x0 + 1.0, center_x + w / 2.0))))
+        y1 = int(round(min(float(height), max(y0 + 1.0, center_y + h / 2.0))))
+        return x0, y0, x1, y1
+    
+    def output_size(self, width: int, height: int) -> tuple:
+        """Размер выходного кадра; по умолчанию - размер области в базовом разрешении захвата"""
+        base_w, base_h = CAPTURE_BASE_RESOLUTION
+        if self.normalized:
+            region_w, region_h = self.w * width, self.h * height
+        else:
+            region_w, region_h = self.w * width / base_w, self.h * height / base_h
+        out_w = self.out_w or max(1, int(round(region_w * base_w / width)))
+        out_h = self.out_h or max(1, int(round(out_w * region_h / max(1.0, region_w))))
+        return out_w, out_h
+    
+    def capture_size(self) -> tuple:
+        """Разрешение захвата, при котором область дает выход без увеличения"""
+        base_w, base_h = CAPTURE_BASE_RESOLUTION
+        out_w, out_h = self.output_size(base_w, base_h)
+        fraction_w = self.w if self.normalized else self.w / base_w
+        fraction_h = self.h if self.normalized else self.h / base_h
+        return (int(math.ceil(out_w / min(1.0, fraction_w / self.zoom))),
+                int(math.ceil(out_h / min(1.0, fraction_h / self.zoom))))
+    
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = self.crop_rect(width, height)
+        crop = image[y0:y1, x0:x1]
+        size = self.output_size(width, height)
+        if (crop.shape[1], crop.shape[0]) == size:
+            return np.ascontiguousarray(crop)
+        upscale = size[0] > crop.shape[1]
+        return cv2.resize(crop, size, interpolation=cv2.INTER_LINEAR if upscale else cv2.INTER_AREA)
+
+def parse_roi(roi: Optional[str], zoom: float = 1.0, out_w: Optional[int] = None,
+              out_h: Optional[int] = None) -> Optional[RoiSpec]:
+    """Разбор параметров ROI из запроса: roi=x,y,w,h (доли 0..1 или пиксели)"""
+    if not roi:
+        if zoom == 1.0 and not out_w and not out_h:
+            return None
+        roi = "0,0,1,1"
+    try:
+        x, y, w, h = (float(value) for value in roi.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="roi должен иметь вид x,y,w,h")
+    if w <= 0 or h <= 0 or x < 0 or y < 0:
+        raise HTTPException(status_code=400, detail="Некорректная область roi")
+    if not 1.0 <= zoom <= 16.0:
+        raise HTTPException(status_code=400, detail="zoom должен быть в диапазоне 1..16")
+    for size in (out_w, out_h):
+        if size is not None and not 16 <= size <= 3840:
+            raise HTTPException(status_code=400, detail="Размер выхода должен быть в диапазоне 16..3840")
+    normalized = max(x + w, y + h) <= 1.0
+    if normalized:
+        # Округляем, чтобы почти одинаковые запросы попадали в один общий выход
+        x, y, w, h = (round(value, 3) for value in (x, y, w, h))
+    else:
+        # Пиксели базового разрешения: область обрезается по кадру
+        base_w, base_h = CAPTURE_BASE_RESOLUTION
+        x, y = float(int(x)), float(int(y))
+        if x >= base_w or y >= base_h:
+            raise HTTPException(status_code=400, detail=f"Область roi вне кадра {base_w}x{base_h}")
+        w, h = float(max(1, min(int(w), base_w - int(x)))), float(max(1, min(int(h), base_h - int(y))))
+    spec = RoiSpec(x, y, w, h, normalized, round(zoom, 2), out_w, out_h)
+    # Размер выхода по умолчанию выводится из области: тот же предел, что и для заданного явно
+    if not all(16 <= size <= 3840 for size in spec.output_size(*CAPTURE_BASE_RESOLUTION)):
+        raise HTTPException(status_code=400, detail="Размер выхода должен быть в диапазоне 16..3840")
+    return spec
+
+# Весь кадр в базовом разрешении: выходы без ROI, когда камера снимает крупнее по запросу других подписчиков
+FULL_FRAME_ROI = RoiSpec(0.0, 0.0, 1.0, 1.0)
+
+@dataclass
+class EncodedFrame:
+    """Кадр общего выхода (профиля)"""
+    seq: int
+    jpeg_data: bytes
+    source: CameraFrame
+    encode_ms: float
+
+class SharedJpegOutput:
+    """Общий выход камеры с заданным качеством и FPS.
+    
+    Кодируется один раз для всех подписчиков и только пока они есть.
+    """
+    
+    def __init__(self, key: tuple, camera_id: int, quality: int, fps: int, roi: Optional[RoiSpec] = None,
+                 preset: Optional[EncoderPreset] = None):
+        self.key = key
+        self.camera_id = camera_id
+        self.quality = quality
+        self.fps = fps
+        self.roi = roi
+        self.preset = (preset or CAPTURE_PRESET).with_quality(quality)
+        self.latest: Optional[EncodedFrame] = None
+        self.subscribers = 0
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.generation = 0
+        self.idle_since: Optional[float] = None
+        self.seq = 0
+        self.history = deque(maxlen=256)  # (время публикации, размер, время кодирования мс)
+        self.demand_id: Optional[int] = None  # Запрос к разрешению захвата, пока есть подписчики
+        self.frame_cond = threading.Condition(self.lock)
+    
+    def subscribe(self):
+        with self.lock:
+            self.subscribers += 1
+            self.idle_since = None
+            if self.demand_id is None:
+                width, height = self.roi.capture_size() if self.roi is not None else CAPTURE_BASE_RESOLUTION
+                self.demand_id = camera_service.capture_demand.add(self.camera_id, width, height, self.fps)
+            if self.is_running:
+                return
+            self.is_running = True
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(target=self._run, args=(generation,), daemon=True).start()
+    
+    def unsubscribe(self):
+        with self.lock:
+            self.subscribers = max(0, self.subscribers - 1)
+            if self.subscribers == 0:
+                self.idle_since = time.time()
+                if self.demand_id is not None:
+                    camera_service.capture_demand.remove(self.camera_id, self.demand_id)
+                    self.demand_id = None
     
-    def _restart_camera(self):
-        """Перезапуск камеры при проблемах"""
+    def _encode(self, frame: CameraFrame) -> Optional[bytes]:
+        roi = self.roi
+        if roi is None and frame.width > CAPTURE_BASE_RESOLUTION[0]:
+            # Камера снимает крупнее по запросу другого подписчика - уменьшаем до базового разрешения
+            roi = FULL_FRAME_ROI
+        # Исходный JPEG закодирован тем же пресетом - отдаем без перекодирования
+        if (self.preset == CAPTURE_PRESET and roi is None) or frame.is_fallback:
+            return frame.jpeg_data
+        if roi is not None:
+            img = camera_service.get_roi_image(frame, roi)
+        else:
+            img = frame.image
+            if img is None:
+                img = jpeg_codec.decode(frame.jpeg_data)
+        if img is None:
+            return frame.jpeg_data
+        if self.quality < 30:
+            img = enhance_low_quality(img)
+        return jpeg_codec.encode(img, self.preset)
+    
+    def _run(self, generation: int):
+        """Кодирование новых кадров камеры не чаще FPS профиля"""
+        interval = 1.0 / self.fps
+        next_time = 0.0
+        last_timestamp = None
         try:
-            # Закрываем текущий capture
-            if self.capture:
-                try:
-                    self.capture.release()
-                except Exception as e:
-                    logger.warning(f"Ошибка при закрытии камеры {self.camera_id}: {e}")
-                finally:
-                    self.capture = None
-            
-            # Увеличиваем паузу перед перезапуском для стабильности
-            time.sleep(1.0)
-            
-            # Пытаемся открыть камеру заново с обработкой ошибок
-            try:
-                self.capture = self._try_backends()
-                if self.capture is None:
-                    logger.error(f"Не удалось перезапустить камеру {self.camera_id}")
-                    return False
+            while self.generation == generation and not shutdown_event.is_set():
+                with self.lock:
+                    if self.idle_since and time.time() - self.idle_since > OUTPUT_IDLE_TIMEOUT:
+                        # Под той же блокировкой, что и проверка в subscribe(): новый подписчик
+                        # после этой точки запустит свой поток кодирования
+                        self.is_running = False
+                        break
                 
-                # Настройка параметров камеры с проверкой
-                try:
-                    self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
-                    self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
-                    self.capture.set(cv2.CAP_PROP_FPS, self.fps)
-                    self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                except Exception as e:
-                    logger.warning(f"Не удалось установить параметры камеры {self.camera_id}: {e}")
+                frame = camera_service.wait_for_frame(self.camera_id, last_timestamp, timeout=min(1.0, interval * 2))
+                if frame is None or frame.timestamp == last_timestamp:
+                    continue
+                
+                now = time.time()
+                # Пропускаем кадры сверх FPS профиля (с допуском на дрожание захвата)
+                if now < next_time - interval * 0.25:
+                    last_timestamp = frame.timestamp
+                    continue
+                next_time = max(next_time + interval, now)
+                last_timestamp = frame.timestamp
                 
-                # Проверяем, что камера работает
                 try:
-                    ret, test_frame = self.capture.read()
-                    if not ret or test_frame is None:
-                        logger.error(f"Камера {self.camera_id} не может читать кадры после перезапуска")
-                        self.capture.release()
-                        self.capture = None
-                        return False
+                    started = time.perf_counter()
+                    jpeg_data = self._encode(frame)
+                    encode_ms = (time.perf_counter() - started) * 1000.0
+                    if profiler.enabled:
+                        profiler.record_ms("transcode", f"{self.camera_id}/q{self.quality}", encode_ms)
                 except Exception as e:
-                    logger.error(f"Ошибка тестирования камеры {self.camera_id} после перезапуска: {e}")
-                    if self.capture:
-                        self.capture.release()
-                        self.capture = None
-                    return False
+                    logger.warning(f"Ошибка перекодирования кадра для камеры {self.camera_id}: {e}")
+                    continue
                 
-                return True
+                with self.lock:
+                    self.seq += 1
+                    self.latest = EncodedFrame(seq=self.seq, jpeg_data=jpeg_data, source=frame, encode_ms=encode_ms)
+                    self.history.append((time.time(), len(jpeg_data), encode_ms))
+                    self.frame_cond.notify_all()
+        except Exception as e:
+            logger.error(f"Ошибка общего выхода камеры {self.camera_id} (качество {self.quality}): {e}")
+        finally:
+            with self.lock:
+                is_current = self.generation == generation
+                if is_current:
+                    self.is_running = False
+                    self.latest = None
+            if is_current:
+                camera_service.release_output(self)
+    
+    def wait_latest(self, after_seq: int, timeout: float) -> Optional[EncodedFrame]:
+        """Ожидание кадра новее after_seq"""
+        with self.frame_cond:
+            if self.latest is None or self.latest.seq == after_seq:
+                self.frame_cond.wait(timeout)
+            return self.latest
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            history = list(self.history)
+            subscribers = self.subscribers
+            is_running = self.is_running
+        now = time.time()
+        recent = [item for item in history if now - item[0] <= 5.0]
+        achieved_fps = 0.0
+        if len(recent) > 1:
+            achieved_fps = (len(recent) - 1) / max(1e-3, recent[-1][0] - recent[0][0])
+        return {
+            "camera_id": self.camera_id,
+            "quality": self.quality,
+            "fps": self.fps,
+            "roi": None if self.roi is None else asdict(self.roi),
+            "preset": asdict(self.preset),
+            "codec": jpeg_codec.name,
+            "is_running": is_running,
+            "subscribers": subscribers,
+            "achieved_fps": round(achieved_fps, 2),
+            "mean_frame_bytes": int(sum(item[1] for item in recent) / len(recent)) if recent else 0,
+            "mean_encode_ms": round(sum(item[2] for item in recent) / len(recent), 3) if recent else 0.0
+        }
+
+class StreamProfileRegistry:
+    """Профили стримов (STREAM_CONFIGS или JSON файл) с перезагрузкой во время работы"""
+    
+    def __init__(self, defaults: List[Dict[str, Any]], path: str = ""):
+        self.defaults = defaults
+        self.path = path
+        self.lock = threading.Lock()
+        self.version = 0
+        self.profiles: List[Dict[str, Any]] = []
+        try:
+            self.reload()
+        except (OSError, ValueError) as e:
+            # Ошибка в файле профилей не должна останавливать сервис при запуске
+            logger.error(f"Не удалось загрузить профили стримов из {self.path}: {e}, используются STREAM_CONFIGS")
+            self.profiles = self._validate(copy.deepcopy(self.defaults))
+            self.version = 1
+    
+    @staticmethod
+    def _validate(profiles: Any) -> List[Dict[str, Any]]:
+        if not isinstance(profiles, list):
+            raise ValueError("Конфигурация профилей должна быть списком")
+        result = []
+        seen = set()
+        for entry in profiles:
+            if not isinstance(entry, dict) or not entry.get('id'):
+                raise ValueError(f"У профиля нет поля id: {entry}")
+            if entry['id'] in seen:
+                raise ValueError(f"Повторяющийся id профиля: {entry['id']}")
+            seen.add(entry['id'])
+            profile = dict(entry)
+            # Профили задаются явно (в том числе 'extreme' с качеством 5) - только допустимый диапазон JPEG
+            profile['quality'] = max(1, min(100, int(entry.get('quality', CAPTURE_JPEG_QUALITY))))
+            profile['fps'] = max(1, min(60, int(entry.get('fps', 30))))
+            preset = preset_from_config(profile)
+            profile.update(subsampling=preset.subsampling, optimize=preset.optimize, fast_dct=preset.fast_dct)
+            profile.setdefault('name', profile['id'])
+            profile.setdefault('description', f"{profile['fps']} FPS, качество {profile['quality']}%")
+            result.append(profile)
+        return result
+    
+    def reload(self) -> int:
+        """Перечитывание профилей; при ошибке остается прежняя конфигурация"""
+        source = self.defaults
+        if self.path and os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                source = json.load(f)
+        profiles = self._validate(copy.deepcopy(source))
+        with self.lock:
+            self.profiles = profiles
+            self.version += 1
+            logger.info(f"Загружено {len(profiles)} профилей стримов (версия {self.version})")
+            return self.version
+    
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            for profile in self.profiles:
+                if profile['id'] == name or profile['name'] == name:
+                    return dict(profile)
+        return None
+    
+    def get_all(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(profile) for profile in self.profiles]
+
+stream_profiles = StreamProfileRegistry(STREAM_CONFIGS, STREAM_CONFIG_PATH)
+
+def rtp_preset(profile: Dict[str, Any]) -> EncoderPreset:
+    """Пресет профиля, совместимый с RFC 2435: 4:2:0/4:2:2 и стандартные таблицы Хаффмана"""
+    preset = preset_from_config(profile)
+    if preset.subsampling not in ('420', '422'):
+        preset = replace(preset, subsampling='420')
+    return replace(preset, optimize=False)
+
+class MulticastSession:
+    """RTP/JPEG рассылка профиля камеры в multicast группу.
+    
+    Кадр общего выхода профиля отправляется один раз, сколько бы зрителей ни было
+    в группе, поэтому нагрузка на сервис не зависит от их числа.
+    """
+    
+    def __init__(self, camera_id: int, profile_id: str, group: str, port: int):
+        self.camera_id = camera_id
+        self.profile_id = profile_id
+        self.group = group
+        self.port = port
+        self.sender = RtpJpegSender(group, port, ttl=MULTICAST_TTL, mtu=MULTICAST_MTU, interface=MULTICAST_INTERFACE)
+        self.is_running = False
+        self.thread: Optional[threading.Thread] = None
+        self.started_at = time.time()
+        self.stats = {"unsupported_frames": 0, "last_send_ms": None}
+    
+    @property
+    def key(self) -> tuple:
+        return self.camera_id, self.profile_id
+    
+    @property
+    def exited(self) -> bool:
+        """Поток рассылки завершился (ошибка или остановка) - сессию можно создать заново"""
+        return self.thread is not None and not self.thread.is_alive()
+    
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.is_running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=3.0)
+        self.sender.close()
+    
+    def _acquire(self) -> Optional[SharedJpegOutput]:
+        profile = stream_profiles.get(self.profile_id)
+        if profile is None:
+            logger.warning(f"Профиль {self.profile_id} удален из конфигурации, multicast рассылка камеры "
+                           f"{self.camera_id} приостановлена")
+            return None
+        return camera_service.acquire_output(self.camera_id, profile['quality'], profile['fps'],
+                                             preset=rtp_preset(profile))
+    
+    def _run(self):
+        output: Optional[SharedJpegOutput] = None
+        profile_version = -1
+        last_seq = 0
+        try:
+            while self.is_running and not shutdown_event.is_set():
+                if stream_profiles.version != profile_version or (output is not None and not output.is_running):
+                    profile_version = stream_profiles.version
+                    if output is not None:
+                        output.unsubscribe()
+                    output = self._acquire()
+                    last_seq = 0
+                if output is None:
+                    time.sleep(1.0)
+                    continue
                 
-            except Exception as e:
-                logger.error(f"Ошибка при открытии камеры {self.camera_id} после перезапуска: {e}")
-                return False
-            
+                frame = output.wait_latest(last_seq, timeout=1.0)
+                if frame is None or frame.seq == last_seq:
+                    continue
+                last_seq = frame.seq
+                try:
+                    started = time.perf_counter()
+                    self.sender.send(frame.jpeg_data, frame.source.capture_ts or frame.source.timestamp)
+                    send_ms = (time.perf_counter() - started) * 1000.0
+                    self.stats["last_send_ms"] = round(send_ms, 3)
+                    if profiler.enabled:
+                        profiler.record_ms("multicast", f"{self.camera_id}/{self.profile_id}", send_ms)
+                except UnsupportedJpeg as e:
+                    self.stats["unsupported_frames"] += 1
+                    logger.warning("Кадр камеры %s нельзя передать по RTP/JPEG: %s", self.camera_id, e,
+                                   extra={"log_key": f"multicast_unsupported:{self.camera_id}"})
         except Exception as e:
-            logger.error(f"Критическая ошибка при перезапуске камеры {self.camera_id}: {e}")
-            return False
+            logger.error(f"Ошибка multicast рассылки камеры {self.camera_id} ({self.profile_id}): {e}")
+        finally:
+            if output is not None:
+                output.unsubscribe()
+            self.is_running = False
     
-    def get_frame(self) -> Optional[CameraFrame]:
-        """Получение последнего кадра"""
-        if not self.is_running:
-            return self.last_frame
-        
+    def sdp(self) -> str:
+        return make_sdp(self.group, self.port, f"camera {self.camera_id} {self.profile_id}", MULTICAST_TTL)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        uptime = max(1e-3, time.time() - self.started_at)
+        return {
+            "camera_id": self.camera_id,
+            "profile": self.profile_id,
+            "group": self.group,
+            "port": self.port,
+            "is_running": self.is_running,
+            "ssrc": self.sender.ssrc,
+            "bitrate_kbps": round(self.sender.stats["bytes"] * 8 / uptime / 1000.0, 1),
+            **self.sender.stats,
+            **self.stats
+        }
+
+def parse_multicast_sessions(spec: str) -> List[tuple]:
+    """Разбор CAMERA_MULTICAST: "0:standard,1:low@239.255.42.9:5010" -> [(камера, профиль, группа, порт)]"""
+    sessions = []
+    for index, item in enumerate(filter(None, (part.strip() for part in spec.split(',')))):
+        target, _, address = item.partition('@')
+        camera, _, profile_id = target.partition(':')
         try:
-            return self.frame_queue.get_nowait()
-        except Empty:
-            return self.last_frame
+            if address:
+                group, _, port = address.rpartition(':')
+                sessions.append((int(camera), profile_id, group, int(port)))
+            else:
+                sessions.append((int(camera), profile_id, MULTICAST_GROUP, MULTICAST_BASE_PORT + 2 * index))
+        except ValueError:
+            logger.error(f"Некорректное описание multicast сессии: {item}")
+    return sessions
 
 class CameraService:
     """Оптимизированный сервис управления камерами"""
     
-    def __init__(self):
+    def __init__(self, open_devices: bool = True):
         self.cameras: Dict[int, CameraInfo] = {}
         self.streams: Dict[int, CameraStream] = {}
         self.fallback_frame: Optional[bytes] = None
         self.discovery_cache: List[CameraInfo] = []
         self.last_discovery_time = 0
         self.cache_ttl = 30  # секунд
-        self.resolution = (640, 480)
+        self.resolution = CAPTURE_BASE_RESOLUTION
         self.default_fps = 30.0
+        self.capture_demand = CaptureDemand(self.resolution, self.default_fps)
+        self.downgrade_since: Dict[int, float] = {}  # камера -> начало пониженного спроса
+        self.h264_encoders: Dict[tuple, H264Encoder] = {}
+        self.h264_lock = threading.Lock()
+        self.outputs: Dict[tuple, SharedJpegOutput] = {}
+        self.outputs_lock = threading.Lock()
+        self.roi_cache: Dict[tuple, tuple] = {}  # (камера, ROI) -> (номер кадра, изображение)
+        self.roi_lock = threading.Lock()
+        self.capture_groups: Dict[str, CaptureGroup] = {}
+        self.groups_lock = threading.Lock()
+        self.multicast_sessions: Dict[tuple, MulticastSession] = {}
+        self.multicast_lock = threading.Lock()
+        # Камеры переданы новому экземпляру (перезапуск без простоя) - повторно не открываются
+        self.devices_released = False
         
-        # Автоматический запуск всех камер при старте сервиса
-        self.auto_start_cameras()
+        # Резервный экземпляр открывает камеры только после передачи от старого
+        if open_devices:
+            self.acquire_devices()
         
         # Запуск автоматической очистки кэша каждые 5 секунд
         self.start_cache_cleanup_thread()
+        self.start_capture_tuning_thread()
+    
+    def acquire_devices(self):
+        """Открытие камер, групп синхронного захвата и рассылок из конфигурации"""
+        # Автоматический запуск всех камер при старте сервиса
+        self.auto_start_cameras()
+        
+        for name, camera_ids, fps in parse_sync_groups(SYNC_GROUPS_SPEC):
+            try:
+                self.create_capture_group(name, camera_ids, fps)
+            except ValueError as e:
+                logger.error(f"Не удалось создать группу синхронного захвата {name}: {e}")
+        self.start_multicast_sessions(MULTICAST_SPEC)
+    
+    def release_devices(self):
+        """Освобождение камер для нового экземпляра; после этого камеры не запускаются"""
+        self.devices_released = True
+        for camera_id, profile_id in list(self.multicast_sessions):
+            self.remove_multicast_session(camera_id, profile_id)
+        self.stop_all_cameras()
+    
+    def start_capture_tuning_thread(self):
+        """Запуск потока, подстраивающего разрешение и FPS захвата под запросы подписчиков"""
+        def tuning_worker():
+            while not shutdown_event.is_set():
+                self.capture_demand.changed.wait(1.0)
+                self.capture_demand.changed.clear()
+                try:
+                    self.update_capture_settings()
+                except Exception as e:
+                    logger.error(f"Ошибка подстройки параметров захвата: {e}")
+        
+        threading.Thread(target=tuning_worker, daemon=True).start()
+    
+    def update_capture_settings(self):
+        """Запрос новых параметров захвата у камер, чей спрос изменился.
+        
+        Повышение применяется сразу, понижение - после CAPTURE_DOWNGRADE_DELAY секунд
+        пониженного спроса, чтобы разовые снимки и переключения зрителей не дергали камеру.
+        """
+        now = time.time()
+        for camera_id, stream in list(self.streams.items()):
+            resolution, fps = self.capture_demand.target(camera_id)
+            current = stream.pending_settings or (stream.resolution, stream.fps)
+            raised = ((max(resolution[0], current[0][0]), max(resolution[1], current[0][1])), max(fps, current[1]))
+            # Разрешение, с которым камера недавно не открылась, не запрашиваем снова каждую секунду
+            if raised[0] != current[0] and stream.resolution_failed(raised[0]):
+                raised = (current[0], raised[1])
+            if stream.resolution_failed(resolution):
+                resolution = current[0]
+            if raised != current:
+                stream.request_settings(*raised)
+            if raised == (resolution, fps):
+                self.downgrade_since.pop(camera_id, None)
+            elif now - self.downgrade_since.setdefault(camera_id, now) >= CAPTURE_DOWNGRADE_DELAY:
+                self.downgrade_since.pop(camera_id, None)
+                stream.request_settings(resolution, fps)
+            
+            camera = self.cameras.get(camera_id)
+            if camera is not None and stream.negotiated:
+                camera.width = stream.negotiated.get("width") or camera.width
+                camera.height = stream.negotiated.get("height") or camera.height
+                camera.fps = stream.fps
+    
+    def capture_snapshot(self, camera_id: int, width: Optional[int], height: Optional[int],
+                         timeout: float) -> Optional[CameraFrame]:
+        """Кадр не меньше width x height: камера на время запроса переключается на нужное разрешение.
+        
+        Если камера не может снимать так крупно, возвращается первый кадр после смены параметров.
+        """
+        stream = self.streams.get(camera_id)
+        if stream is None or (not width and not height):
+            return self.get_camera_frame(camera_id)
+        size = demand_size(width, height)
+        request_id = self.capture_demand.add(camera_id, size[0], size[1], stream.fps)
+        try:
+            deadline = time.time() + timeout
+            frame = stream.last_frame
+            while True:
+                if frame is not None and frame.width >= size[0] and frame.height >= size[1]:
+                    return frame
+                target = self.capture_demand.target(camera_id)[0]
+                settled = (stream.pending_settings is None and stream.resolution[0] >= target[0]
+                           and stream.resolution[1] >= target[1])
+                if frame is not None and settled and frame.seq >= stream.settings_seq:
+                    return frame
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return frame
+                frame = stream.wait_new_frame(frame.timestamp if frame else None, min(0.2, remaining))
+        finally:
+            self.capture_demand.remove(camera_id, request_id)
     
     def start_cache_cleanup_thread(self):
         """Запуск потока для автоматической очистки кэша стримов"""
@@ -440,8 +2304,7 @@ class CameraService:
             cv2.putText(white_frame, text, (text_x, text_y), font, 1, (0, 0, 0), 2)
             
             # Конвертируем в JPEG
-            _, buffer = cv2.imencode('.jpg', white_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            self.fallback_frame = buffer.tobytes()
+            self.fallback_frame = jpeg_codec.encode(white_frame, CAPTURE_PRESET.with_quality(80))
         
         return self.fallback_frame
     
@@ -480,6 +2343,18 @@ class CameraService:
                 logger.debug(f"Ошибка при проверке камеры {i}: {e}")
                 continue
         
+        if SYNTHETIC_CAMERA_ENABLED:
+            available_cameras.append(CameraInfo(
+                id=SYNTHETIC_CAMERA_ID,
+                name='Синтетическая камера',
+                width=self.resolution[0],
+                height=self.resolution[1],
+                fps=self.default_fps,
+                is_active=SYNTHETIC_CAMERA_ID in self.cameras,
+                backend="Synthetic",
+                service_info="available"
+            ))
+        
         # Добавляем fallback камеру если нет реальных камер
         if not available_cameras:
             fallback_camera = CameraInfo(
@@ -517,7 +2392,7 @@ class CameraService:
             time.sleep(0.5)
             
             # Создаем новый поток
-            new_stream = CameraStream(camera_id, self.resolution, self.default_fps)
+            new_stream = self._create_stream(camera_id)
             
             if new_stream.start():
                 self.streams[camera_id] = new_stream
@@ -532,11 +2407,19 @@ class CameraService:
             logger.error(f"Ошибка при принудительном перезапуске камеры {camera_id}: {e}")
             return False
     
+    def _create_stream(self, camera_id: int) -> CameraStream:
+        if camera_id == SYNTHETIC_CAMERA_ID:
+            return SyntheticCameraStream(camera_id, self.resolution, self.default_fps)
+        return CameraStream(camera_id, self.resolution, self.default_fps)
+    
     def start_camera(self, camera_id: int) -> bool:
         """Запуск камеры"""
         if camera_id in self.cameras:
             logger.warning(f"Камера {camera_id} уже запущена")
             return True
+        if self.devices_released:
+            logger.warning(f"Камера {camera_id} не запускается: камеры переданы новому экземпляру сервиса")
+            return False
         
         # Специальная обработка для fallback камеры
         if camera_id == -1:
@@ -553,13 +2436,13 @@ class CameraService:
             return True
         
         # Создаем поток для камеры
-        stream = CameraStream(camera_id, self.resolution, self.default_fps)
+        stream = self._create_stream(camera_id)
         
         if stream.start():
             self.streams[camera_id] = stream
             self.cameras[camera_id] = CameraInfo(
                 id=camera_id,
-                name=f'Камера {camera_id}',
+                name='Синтетическая камера' if camera_id == SYNTHETIC_CAMERA_ID else f'Камера {camera_id}',
                 width=self.resolution[0],
                 height=self.resolution[1],
                 fps=self.default_fps,
@@ -616,6 +2499,150 @@ class CameraService:
         
         return None
     
+    def wait_for_frame(self, camera_id: int, last_timestamp: Optional[float], timeout: float) -> Optional[CameraFrame]:
+        """Ожидание нового кадра камеры"""
+        stream = self.streams.get(camera_id)
+        if stream is not None:
+            return stream.wait_new_frame(last_timestamp, timeout)
+        # Fallback камера не имеет потока: отдаем статичный кадр с частотой опроса
+        time.sleep(timeout)
+        return self.get_camera_frame(camera_id)
+    
+    def acquire_output(self, camera_id: int, quality: int, fps: int, roi: Optional[RoiSpec] = None,
+                       preset: Optional[EncoderPreset] = None) -> SharedJpegOutput:
+        """Подписка на общий выход камеры (создается при первом подписчике)"""
+        preset = (preset or CAPTURE_PRESET).with_quality(quality)
+        key = (camera_id, quality, fps, roi, preset)
+        with self.outputs_lock:
+            output = self.outputs.get(key)
+            if output is None:
+                output = SharedJpegOutput(key, camera_id, quality, fps, roi, preset)
+                self.outputs[key] = output
+            output.subscribe()
+            return output
+    
+    def release_output(self, output: SharedJpegOutput):
+        """Удаление остановленного выхода из реестра"""
+        with self.outputs_lock:
+            if self.outputs.get(output.key) is output and not output.is_running:
+                del self.outputs[output.key]
+            if output.roi is not None and not any(o.roi == output.roi for o in self.outputs.values()):
+                with self.roi_lock:
+                    self.roi_cache.pop((output.camera_id, output.roi), None)
+    
+    def get_roi_image(self, frame: CameraFrame, roi: RoiSpec) -> Optional[np.ndarray]:
+        """Вырезка и масштабирование области: один раз на кадр для всех выходов с этим ROI"""
+        key = (frame.camera_id, roi)
+        with self.roi_lock:
+            cached = self.roi_cache.get(key)
+            if cached is not None and cached[0] == frame.seq and frame.seq:
+                return cached[1]
+        image = frame.image
+        if image is None:
+            image = jpeg_codec.decode(frame.jpeg_data)
+            if image is None:
+                return None
+        result = roi.apply(image)
+        with self.roi_lock:
+            self.roi_cache[key] = (frame.seq, result)
+        return result
+    
+    def get_output_stats(self, camera_id: int, quality: int, fps: int,
+                         preset: Optional[EncoderPreset] = None) -> Optional[Dict[str, Any]]:
+        preset = (preset or CAPTURE_PRESET).with_quality(quality)
+        output = self.outputs.get((camera_id, quality, fps, None, preset))
+        return output.get_stats() if output else None
+    
+    def create_capture_group(self, name: str, camera_ids: List[int], fps: float) -> CaptureGroup:
+        """Создание группы синхронного захвата (камеры должны быть запущены и не входить в другие группы)"""
+        with self.groups_lock:
+            if name in self.capture_groups:
+                raise ValueError(f"Группа {name} уже существует")
+            for group in self.capture_groups.values():
+                busy = set(group.camera_ids) & set(camera_ids)
+                if busy:
+                    raise ValueError(f"Камеры {sorted(busy)} уже входят в группу {group.name}")
+            missing = [camera_id for camera_id in camera_ids if camera_id not in self.streams]
+            if missing:
+                raise ValueError(f"Камеры {missing} не запущены")
+            group = CaptureGroup(name, camera_ids, fps)
+            self.capture_groups[name] = group
+        group.start()
+        logger.info(f"Запущена группа синхронного захвата {name}: камеры {camera_ids}, {fps} FPS")
+        return group
+    
+    def remove_capture_group(self, name: str) -> bool:
+        with self.groups_lock:
+            group = self.capture_groups.pop(name, None)
+        if group is None:
+            return False
+        group.stop()
+        return True
+    
+    def create_multicast_session(self, camera_id: int, profile_id: str, group: Optional[str] = None,
+                                 port: Optional[int] = None) -> MulticastSession:
+        """Запуск RTP/JPEG рассылки профиля камеры (адрес по умолчанию - следующий свободный порт группы)"""
+        profile = stream_profiles.get(profile_id)
+        if profile is None:
+            raise ValueError(f"Профиль {profile_id} не найден")
+        group = group or MULTICAST_GROUP
+        if not is_multicast(group):
+            raise ValueError(f"{group} не является multicast адресом IPv4 (224.0.0.0/4)")
+        with self.multicast_lock:
+            # Завершившиеся рассылки не занимают ключ и порт
+            exited = [session for session in self.multicast_sessions.values() if session.exited]
+            for session in exited:
+                del self.multicast_sessions[session.key]
+            key = (camera_id, profile['id'])
+            if key in self.multicast_sessions:
+                raise ValueError(f"Рассылка профиля {profile['id']} камеры {camera_id} уже запущена")
+            if port is None:
+                used = {(session.group, session.port) for session in self.multicast_sessions.values()}
+                port = MULTICAST_BASE_PORT
+                while (group, port) in used:
+                    port += 2
+            session = MulticastSession(camera_id, profile['id'], group, port)
+            self.multicast_sessions[key] = session
+        for stale in exited:
+            logger.warning(f"Рассылка камеры {stale.camera_id} ({stale.profile_id}) завершилась, сессия удалена")
+            stale.stop()
+        session.start()
+        logger.info(f"Запущена RTP/JPEG рассылка камеры {camera_id} ({profile['id']}) на {group}:{port}")
+        return session
+    
+    def remove_multicast_session(self, camera_id: int, profile_id: str) -> bool:
+        with self.multicast_lock:
+            session = self.multicast_sessions.pop((camera_id, profile_id), None)
+        if session is None:
+            return False
+        session.stop()
+        return True
+    
+    def start_multicast_sessions(self, spec: str):
+        """Рассылки из CAMERA_MULTICAST"""
+        for camera_id, profile_id, group, port in parse_multicast_sessions(spec):
+            try:
+                self.create_multicast_session(camera_id, profile_id, group, port)
+            except (ValueError, OSError) as e:
+                logger.error(f"Не удалось запустить multicast рассылку {camera_id}:{profile_id}: {e}")
+    
+    def get_h264_encoder(self, camera_id: int, width: int, fps: int, bitrate_kbps: int) -> H264Encoder:
+        """Общий H.264 кодер для профиля (создается при первом зрителе)"""
+        key = (camera_id, width, fps, bitrate_kbps)
+        with self.h264_lock:
+            encoder = self.h264_encoders.get(key)
+            if encoder is None:
+                encoder = H264Encoder(key, camera_id, width, fps, bitrate_kbps)
+                self.h264_encoders[key] = encoder
+            encoder.start()
+            return encoder
+    
+    def release_h264_encoder(self, encoder: H264Encoder):
+        """Удаление остановленного кодера из реестра"""
+        with self.h264_lock:
+            if self.h264_encoders.get(encoder.key) is encoder and not encoder.is_running:
+                del self.h264_encoders[encoder.key]
+    
     def get_all_frames(self) -> List[CameraFrame]:
         """Получение кадров со всех активных камер"""
         frames = []
@@ -638,6 +2665,8 @@ class CameraService:
     
     def stop_all_cameras(self):
         """Остановка всех камер"""
+        for name in list(self.capture_groups):
+            self.remove_capture_group(name)
         camera_ids = list(self.cameras.keys())
         
         for camera_id in camera_ids:
@@ -663,12 +2692,49 @@ class CameraService:
                 for cam in self.cameras.values()
             ]
         }
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Метрики работы камер"""
+        return {
+            "timestamp": time.time(),
+            "cameras": {
+                str(camera_id): {
+                    "backend": stream.backend,
+                    "error_count": stream.error_count,
+                    "last_frame_time": stream.last_frame_time,
+                    "negotiation": stream.get_negotiation_metrics()
+                }
+                for camera_id, stream in list(self.streams.items())
+            },
+            "h264_encoders": [encoder.get_stats() for encoder in list(self.h264_encoders.values())],
+            "outputs": [output.get_stats() for output in list(self.outputs.values())],
+            "latency": latency_metrics.snapshot(),
+            "admission": admission_controller.snapshot(),
+            "logging": get_logging_stats(),
+            "capture_groups": [group.get_stats() for group in list(self.capture_groups.values())],
+            "capture_demand": self.capture_demand.snapshot(),
+            "multicast": [session.get_stats() for session in list(self.multicast_sessions.values())]
+        }
+
+# Канал управления сервис-менеджера (restart_mode "hot-swap"); резервный экземпляр
+# ждет передачи камер от работающего и до нее устройства не открывает
+control_channel = ControlChannel.from_environment()
+STANDBY = control_channel is not None and standby_requested()
+# Пульс для сторожа менеджера: event loop и потоки захвата
+heartbeat = Heartbeat.from_environment()
 
 # Создаем экземпляр сервиса
-camera_service = CameraService()
+camera_service = CameraService(open_devices=not STANDBY)
 
 # Создаем FastAPI приложение
-app = FastAPI(title="Camera Service", version="3.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Заблокированный синхронным вызовом event loop перестает пульсировать
+    heartbeat_task = asyncio.create_task(heartbeat.run('loop'))
+    yield
+    heartbeat_task.cancel()
+
+app = FastAPI(title="Camera Service", version="3.0.0", lifespan=lifespan)
 
 # Добавляем CORS с улучшенными настройками для веб-приложений
 app.add_middleware(
@@ -704,131 +2770,585 @@ class CameraActionResponse(BaseModel):
     status: str
     message: str
 
+class CaptureGroupRequest(BaseModel):
+    name: str
+    camera_ids: List[int]
+    fps: float = 30.0
+
+class MulticastRequest(BaseModel):
+    camera_id: int
+    profile: str
+    group: Optional[str] = None
+    port: Optional[int] = None
+
+@app.get("/health")
+async def health():
+    """Проба готовности для сервис-менеджера: ответ означает, что event loop обслуживает запросы"""
+    return {"status": "ok", "pid": os.getpid(),
+            "active_cameras": sum(1 for stream in camera_service.streams.values() if stream.is_running)}
+
 @app.get("/api/cameras/streams/config")
 async def get_streams_config():
-    """Получение конфигурации постоянных стримов"""
+    """Получение конфигурации постоянных стримов со статистикой по камерам"""
+    profiles = stream_profiles.get_all()
+    for profile in profiles:
+        profile['url'] = f"/api/cameras/{{camera_id}}/profiles/{profile['id']}"
+        profile['stats'] = {
+            str(camera_id): camera_service.get_output_stats(camera_id, profile['quality'], profile['fps'],
+                                                             preset_from_config(profile)) or {
+                "camera_id": camera_id, "quality": profile['quality'], "fps": profile['fps'],
+                "is_running": False, "subscribers": 0,
+                "achieved_fps": 0.0, "mean_frame_bytes": 0, "mean_encode_ms": 0.0
+            }
+            for camera_id in list(camera_service.cameras)
+        }
     return {
-        'permanent_streams': STREAM_CONFIGS,
-        'total_configs': len(STREAM_CONFIGS),
-        'instructions': 'Для добавления нового стрима отредактируйте список STREAM_CONFIGS в camera_service.py'
+        'permanent_streams': profiles,
+        'total_configs': len(profiles),
+        'version': stream_profiles.version,
+        'instructions': 'Для добавления нового стрима отредактируйте STREAM_CONFIGS в camera_service.py '
+                        'или JSON файл CAMERA_STREAM_CONFIG и вызовите POST /api/cameras/streams/config/reload'
     }
 
-@app.get("/api/cameras/{camera_id}/mjpeg")
-async def mjpeg_stream(camera_id: int, quality: int = 85, fps: int = 30):
-    """Постоянный MJPEG стрим для конкретной камеры с настраиваемым качеством и FPS (ухудшение кадра на лету)"""
-    quality = max(10, min(100, quality))
-    fps = max(1, min(60, fps))
+@app.post("/api/cameras/streams/config/reload")
+async def reload_streams_config():
+    """Перезагрузка профилей стримов без перезапуска сервиса"""
+    try:
+        version = stream_profiles.reload()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка загрузки профилей: {e}")
+    return {'status': 'ok', 'version': version, 'total_configs': len(stream_profiles.get_all())}
 
-    async def generate():
-        try:
-            target_interval = max(0.033, 1.0 / fps)
-            last_frame_time = 0
-            frame_count = 0
-            max_frames_without_data = 50
-            fallback_sent = False
-            cleanup_counter = 0  # Счетчик для очистки кэша
-            
-            while True:
-                try:
-                    current_time = time.time()
-                    frame_data = camera_service.get_camera_frame(camera_id)
-                    
-                    # Очистка кэша каждые 10 кадров
-                    cleanup_counter += 1
-                    if cleanup_counter >= 10:
-                        camera_service.cleanup_stream_cache()
-                        cleanup_counter = 0
-                    
-                    if frame_data and frame_data.jpeg_data:
-                        frame_count = 0
-                        fallback_sent = False
-                        # Если нужно ухудшить качество, перекодируем JPEG -> numpy -> JPEG
-                        if quality != 85:
+@app.get("/api/cameras/metrics")
+async def get_metrics():
+    """Метрики сервиса камер"""
+    return camera_service.get_metrics()
+
+MJPEG_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0',
+    'Access-Control-Allow-Origin': '*',
+    'Cross-Origin-Resource-Policy': 'cross-origin',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no',
+    'Content-Disposition': 'inline'
+}
+
+async def iter_stream_frames(camera_id: int, quality: int, fps: int, priority: str, profile_id: Optional[str] = None,
+                             roi: Optional[RoiSpec] = None, ticket: Optional[AdmissionTicket] = None):
+    """Поток кадров клиента поверх общих выходов камеры: пары (JPEG, исходный кадр или None для заглушки).
+    
+    Фактические FPS и качество назначает планировщик исходящего трафика в пределах общего бюджета.
+    Для профиля параметры перечитываются после перезагрузки конфигурации.
+    """
+    client = egress_scheduler.register(camera_id, priority, fps, quality)
+    output: Optional[SharedJpegOutput] = None
+    profile_version = stream_profiles.version
+    preset = None
+    if profile_id is not None:
+        profile = stream_profiles.get(profile_id)
+        preset = preset_from_config(profile) if profile else None
+    try:
+        frame_count = 0
+        max_frames_without_data = 50
+        fallback_sent = False
+        last_seq = 0
+        
+        while True:
+            try:
+                current_time = time.time()
+                
+                if profile_id is not None and stream_profiles.version != profile_version:
+                    profile_version = stream_profiles.version
+                    profile = stream_profiles.get(profile_id)
+                    if profile is None:
+                        logger.warning(f"Профиль {profile_id} удален из конфигурации, завершаем стрим камеры {camera_id}")
+                        break
+                    egress_scheduler.unregister(client)
+                    client = egress_scheduler.register(camera_id, priority, profile['fps'], profile['quality'])
+                    preset = preset_from_config(profile)
+                
+                target_interval = max(0.033, 1.0 / max(0.1, client.allowed_fps))
+                frame_quality = client.allowed_quality
+                
+                # Переключаемся на общий выход с качеством, назначенным планировщиком
+                frame_preset = (preset or CAPTURE_PRESET).with_quality(frame_quality)
+                if output is None or output.preset != frame_preset or output.fps != client.requested_fps:
+                    if output is not None:
+                        output.unsubscribe()
+                    output = camera_service.acquire_output(camera_id, frame_quality, client.requested_fps, roi, preset)
+                    last_seq = 0
+                
+                frame_data = output.latest
+                if frame_data is not None:
+                    frame_count = 0
+                    fallback_sent = False
+                    if frame_data.seq != last_seq:
+                        last_seq = frame_data.seq
+                        jpeg_data = frame_data.jpeg_data
+                        egress_scheduler.record_frame(client, len(jpeg_data), frame_quality)
+                        await egress_scheduler.throttle(client, len(jpeg_data))
+                        latency_metrics.record(camera_id, "publish_to_send",
+                                               (time.time() - frame_data.source.timestamp) * 1000.0)
+                        profile_start = time.perf_counter() if profiler.enabled else 0.0
+                        yield jpeg_data, frame_data.source
+                        if profile_start:
+                            # Время до следующего запроса кадра - отправка клиенту
+                            profiler.record("send", f"{camera_id}/client{client.id}", profile_start)
+                elif camera_service.get_camera_frame(camera_id) is not None:
+                    # Камера работает, общий выход еще не закодировал первый кадр
+                    pass
+                else:
+                    frame_count += 1
+                    if frame_count > max_frames_without_data or not fallback_sent:
+                        yield camera_service.create_fallback_frame(), None
+                        fallback_sent = True
+                        if frame_count > max_frames_without_data * 2:
+                            logger.warning(f"Камера {camera_id} недоступна долгое время, пытаемся перезапустить...")
                             try:
-                                nparr = np.frombuffer(frame_data.jpeg_data, np.uint8)
-                                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                                if img is not None:
-                                    # Улучшение резкости и контрастности для низкого качества
-                                    if quality < 30:
-                                        # Увеличиваем контрастность
-                                        img = cv2.convertScaleAbs(img, alpha=1.5, beta=10)
-                                        
-                                        # Применяем фильтр резкости (kernel для увеличения резкости)
-                                        kernel = np.array([[-1,-1,-1],
-                                                          [-1, 9,-1],
-                                                          [-1,-1,-1]])
-                                        img = cv2.filter2D(img, -1, kernel)
-                                        
-                                        # Дополнительное улучшение резкости через unsharp mask
-                                        gaussian = cv2.GaussianBlur(img, (0, 0), 2.0)
-                                        img = cv2.addWeighted(img, 1.5, gaussian, -0.5, 0)
-                                        
-                                        # Нормализация значений пикселей
-                                        img = np.clip(img, 0, 255).astype(np.uint8)
-                                    
-                                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
-                                    _, buffer = cv2.imencode('.jpg', img, encode_param)
-                                    jpeg_data = buffer.tobytes()
-                                else:
-                                    jpeg_data = frame_data.jpeg_data
+                                # Перезапуск ждет остановки потока и переоткрывает устройство -
+                                # не в event loop (иначе сторож зависаний сочтет сервис зависшим)
+                                await asyncio.get_running_loop().run_in_executor(
+                                    None, camera_service.restart_camera, camera_id)
+                                frame_count = 0
                             except Exception as e:
-                                logger.warning(f"Ошибка перекодирования кадра для камеры {camera_id}: {e}")
-                                jpeg_data = frame_data.jpeg_data
-                        else:
-                            jpeg_data = frame_data.jpeg_data
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + jpeg_data + b'\r\n')
-                        last_frame_time = current_time
+                                logger.error(f"Ошибка при перезапуске камеры {camera_id}: {e}")
                     else:
-                        frame_count += 1
-                        if frame_count > max_frames_without_data or not fallback_sent:
-                            fallback_frame = camera_service.create_fallback_frame()
-                            yield (b'--frame\r\n'
-                                   b'Content-Type: image/jpeg\r\n\r\n' + fallback_frame + b'\r\n')
-                            fallback_sent = True
-                            if frame_count > max_frames_without_data * 2:
-                                logger.warning(f"Камера {camera_id} недоступна долгое время, пытаемся перезапустить...")
-                                try:
-                                    camera_service.restart_camera(camera_id)
-                                    frame_count = 0
-                                except Exception as e:
-                                    logger.error(f"Ошибка при перезапуске камеры {camera_id}: {e}")
-                        else:
-                            yield (b'--frame\r\n'
-                                   b'Content-Type: image/jpeg\r\n\r\n' + b'\r\n')
-                    elapsed = time.time() - current_time
-                    sleep_time = max(0.001, target_interval - elapsed)
-                    if sleep_time > 0:
-                        await asyncio.sleep(sleep_time)
-                    else:
-                        await asyncio.sleep(0.001)
-                except Exception as e:
-                    logger.error(f"Ошибка в MJPEG стриме камеры {camera_id}: {e}")
-                    try:
-                        fallback_frame = camera_service.create_fallback_frame()
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + fallback_frame + b'\r\n')
-                    except Exception:
-                        pass
-                    await asyncio.sleep(0.1)
-        except Exception as e:
-            logger.error(f"Критическая ошибка в MJPEG стриме камеры {camera_id}: {e}")
+                        yield b'', None
+                elapsed = time.time() - current_time
+                sleep_time = max(0.001, target_interval - elapsed)
+                await asyncio.sleep(sleep_time)
+            except Exception as e:
+                logger.error("Ошибка в MJPEG стриме камеры %s: %s", camera_id, e,
+                             extra={"log_key": f"stream_error:{camera_id}"})
+                try:
+                    fallback_frame = camera_service.create_fallback_frame()
+                except Exception:
+                    fallback_frame = None
+                if fallback_frame:
+                    yield fallback_frame, None
+                await asyncio.sleep(0.1)
+    except Exception as e:
+        logger.error(f"Критическая ошибка в MJPEG стриме камеры {camera_id}: {e}")
+    finally:
+        if output is not None:
+            output.unsubscribe()
+        egress_scheduler.unregister(client)
+        if ticket is not None:
+            ticket.release()
+
+def frame_timing(source: CameraFrame) -> Dict[str, Any]:
+    """Метки кадра для клиентов: номер, время захвата, публикации и отправки"""
+    return {
+        "seq": source.seq,
+        "capture_ts": source.capture_ts,
+        "publish_ts": source.timestamp,
+        "send_ts": time.time()
+    }
 
+def mjpeg_part(jpeg_data: bytes, source: Optional[CameraFrame]) -> bytes:
+    """Часть multipart ответа; для кадров камеры с заголовками X-Frame-Seq/X-Capture-Ts/X-Publish-Ts"""
+    headers = 'Content-Type: image/jpeg\r\n'
+    if jpeg_data:
+        headers += f'Content-Length: {len(jpeg_data)}\r\n'
+    if source is not None and source.seq:
+        timing = frame_timing(source)
+        headers += (f'X-Frame-Seq: {timing["seq"]}\r\n'
+                    f'X-Capture-Ts: {timing["capture_ts"]:.6f}\r\n'
+                    f'X-Publish-Ts: {timing["publish_ts"]:.6f}\r\n'
+                    f'X-Send-Ts: {timing["send_ts"]:.6f}\r\n')
+    return b'--frame\r\n' + headers.encode('ascii') + b'\r\n' + jpeg_data + b'\r\n'
+
+async def generate_mjpeg(camera_id: int, quality: int, fps: int, priority: str, profile_id: Optional[str] = None,
+                         roi: Optional[RoiSpec] = None, ticket: Optional[AdmissionTicket] = None):
+    """MJPEG генератор поверх общих выходов камеры"""
+    async for jpeg_data, source in iter_stream_frames(camera_id, quality, fps, priority, profile_id, roi, ticket):
+        yield mjpeg_part(jpeg_data, source)
+
+def admit_stream(camera_id: int, priority: str) -> AdmissionTicket:
+    """Допуск стрима или быстрый 503 с Retry-After"""
+    ticket = admission_controller.admit(camera_id, priority)
+    if ticket is None:
+        raise HTTPException(status_code=503, detail=f"Превышен лимит стримов камеры {camera_id}",
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+    return ticket
+
+def degraded_stream_params(quality: int, fps: int) -> tuple:
+    """Качество, FPS и профиль для деградированного стрима"""
+    profile = stream_profiles.get(ADMISSION_DEGRADED_PROFILE)
+    if profile is None:
+        return min(quality, EGRESS_MIN_QUALITY), min(fps, EGRESS_MIN_FPS), None
+    return profile['quality'], profile['fps'], profile['id']
+
+def mjpeg_response(camera_id: int, quality: int, fps: int, priority: str, ticket: AdmissionTicket,
+                   profile_id: Optional[str] = None, roi: Optional[RoiSpec] = None) -> StreamingResponse:
+    headers = MJPEG_HEADERS
+    if ticket.degraded:
+        quality, fps, profile_id = degraded_stream_params(quality, fps)
+        headers = {**MJPEG_HEADERS, 'X-Stream-Degraded': '1'}
     return StreamingResponse(
-        generate(),
+        generate_mjpeg(camera_id, quality, fps, priority, profile_id, roi, ticket),
         media_type='multipart/x-mixed-replace; boundary=frame',
-        headers={
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0',
-            'Access-Control-Allow-Origin': '*',
-            'Cross-Origin-Resource-Policy': 'cross-origin',
-            'Connection': 'keep-alive',
-            'X-Accel-Buffering': 'no',
-            'Content-Disposition': 'inline'
-        }
+        headers=headers
     )
 
+@app.get("/api/cameras/{camera_id}/mjpeg")
+async def mjpeg_stream(camera_id: int, quality: int = 85, fps: int = 30, priority: str = "observer",
+                       roi: Optional[str] = None, zoom: float = 1.0,
+                       out_w: Optional[int] = None, out_h: Optional[int] = None,
+                       token: Optional[str] = None, x_operator_token: Optional[str] = Header(None)):
+    """Постоянный MJPEG стрим для конкретной камеры с настраиваемым качеством и FPS.
+    
+    Клиенты с одинаковыми параметрами (включая область roi=x,y,w,h, zoom, out_w/out_h)
+    получают один и тот же перекодированный кадр.
+    """
+    quality = max(10, min(100, quality))
+    fps = max(1, min(60, fps))
+    roi_spec = parse_roi(roi, zoom, out_w, out_h)
+    priority = resolve_priority(priority, token or x_operator_token)
+    ticket = admit_stream(camera_id, priority)
+    return mjpeg_response(camera_id, quality, fps, priority, ticket, roi=roi_spec)
+
+@app.get("/api/cameras/{camera_id}/profiles/{profile_id}")
+async def profile_stream(camera_id: int, profile_id: str, priority: str = "observer",
+                         roi: Optional[str] = None, zoom: float = 1.0,
+                         out_w: Optional[int] = None, out_h: Optional[int] = None,
+                         token: Optional[str] = None, x_operator_token: Optional[str] = Header(None)):
+    """MJPEG стрим постоянного профиля из STREAM_CONFIGS (общий для всех зрителей)"""
+    profile = stream_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Профиль {profile_id} не найден")
+    roi_spec = parse_roi(roi, zoom, out_w, out_h)
+    priority = resolve_priority(priority, token or x_operator_token)
+    ticket = admit_stream(camera_id, priority)
+    return mjpeg_response(camera_id, profile['quality'], profile['fps'], priority, ticket,
+                          profile_id=profile['id'], roi=roi_spec)
+
+def encode_snapshot(frame: CameraFrame, width: Optional[int], height: Optional[int], quality: int) -> bytes:
+    """JPEG снимка, уменьшенный до width/height (с сохранением пропорций)"""
+    scale = min(width / frame.width if width else 1.0, height / frame.height if height else 1.0)
+    if scale >= 1.0 and quality == CAPTURE_JPEG_QUALITY:
+        return frame.jpeg_data
+    size = (max(1, int(round(frame.width * scale))), max(1, int(round(frame.height * scale))))
+    image = frame.image
+    if image is None:
+        image = decode_scaled(frame.jpeg_data, *size, codec=jpeg_codec) if scale < 1.0 else jpeg_codec.decode(frame.jpeg_data)
+    elif scale < 1.0:
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return jpeg_codec.encode(image, CAPTURE_PRESET.with_quality(quality))
+
+@app.get("/api/cameras/{camera_id}/snapshot")
+async def camera_snapshot(camera_id: int, width: Optional[int] = None, height: Optional[int] = None,
+                          quality: int = 90, timeout: float = 3.0):
+    """Одиночный JPEG кадр. С width/height (например, width=1920 для HD снимка) камера
+    на время запроса снимает в нужном разрешении, кадр уменьшается до запрошенного размера.
+    """
+    for size in (width, height):
+        if size is not None and not 16 <= size <= 3840:
+            raise HTTPException(status_code=400, detail="Размер снимка должен быть в диапазоне 16..3840")
+    if camera_id not in camera_service.cameras:
+        raise HTTPException(status_code=404, detail=f"Камера {camera_id} не найдена")
+    quality = max(10, min(100, quality))
+    timeout = max(0.1, min(10.0, timeout))
+    loop = asyncio.get_running_loop()
+    frame = await loop.run_in_executor(None, camera_service.capture_snapshot, camera_id, width, height, timeout)
+    if frame is None:
+        raise HTTPException(status_code=503, detail=f"Нет кадров камеры {camera_id}")
+    if frame.is_fallback:
+        jpeg_data = frame.jpeg_data
+    else:
+        jpeg_data = await loop.run_in_executor(None, encode_snapshot, frame, width, height, quality)
+    headers = {'Cache-Control': 'no-cache', 'X-Capture-Width': str(frame.width), 'X-Capture-Height': str(frame.height)}
+    if frame.seq:
+        headers.update({'X-Frame-Seq': str(frame.seq), 'X-Capture-Ts': f'{frame.capture_ts:.6f}'})
+    return Response(content=jpeg_data, media_type='image/jpeg', headers=headers)
+
+@app.websocket("/api/cameras/{camera_id}/ws")
+async def jpeg_websocket(websocket: WebSocket, camera_id: int, quality: int = 85, fps: int = 30,
+                         priority: str = "observer", roi: Optional[str] = None, zoom: float = 1.0,
+                         out_w: Optional[int] = None, out_h: Optional[int] = None, token: Optional[str] = None):
+    """JPEG кадры через WebSocket (параметры как у MJPEG, включая ROI).
+    
+    Каждое бинарное сообщение: 4 байта длины заголовка (big-endian), JSON заголовок
+    (camera_id, seq, capture_ts, publish_ts, send_ts, fallback), затем JPEG.
+    """
+    quality = max(10, min(100, quality))
+    fps = max(1, min(60, fps))
+    try:
+        roi_spec = parse_roi(roi, zoom, out_w, out_h)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    priority = resolve_priority(priority, token or websocket.headers.get('x-operator-token'))
+    ticket = admission_controller.admit(camera_id, priority)
+    if ticket is None:
+        # 1013: повторите позже
+        await websocket.close(code=1013, reason=f"Превышен лимит стримов, повторите через {ADMISSION_RETRY_AFTER} с")
+        return
+    if ticket.degraded:
+        quality, fps, _ = degraded_stream_params(quality, fps)
+    await websocket.accept()
+    frames = iter_stream_frames(camera_id, quality, fps, priority, roi=roi_spec, ticket=ticket)
+    try:
+        async for jpeg_data, source in frames:
+            if not jpeg_data:
+                continue
+            header = {"camera_id": camera_id, "fallback": source is None}
+            if source is not None:
+                header.update(frame_timing(source))
+            header_bytes = json.dumps(header).encode('utf-8')
+            await websocket.send_bytes(len(header_bytes).to_bytes(4, 'big') + header_bytes + jpeg_data)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Ошибка WebSocket стрима камеры {camera_id}: {e}")
+    finally:
+        await frames.aclose()
+
+@app.get("/api/cameras/shm")
+async def get_shm_rings():
+    """Кольца сырых кадров в разделяемой памяти (формат: common/frame_ring.py)"""
+    return {
+        "enabled": SHM_EXPORT_ENABLED,
+        "cameras": {
+            str(camera_id): stream.get_shm_info()
+            for camera_id, stream in list(camera_service.streams.items())
+        }
+    }
+
+def require_operator(token: Optional[str]):
+    """Служебные эндпоинты требуют токен оператора; без настроенных токенов они закрыты"""
+    if not OPERATOR_TOKENS:
+        raise HTTPException(status_code=403, detail="Токены оператора не настроены (CAMERA_OPERATOR_TOKENS)")
+    if token not in OPERATOR_TOKENS:
+        raise HTTPException(status_code=403, detail="Нужен токен оператора")
+
+@app.post("/api/cameras/profile")
+async def start_profiling(duration: float = 10.0, sample_hz: int = 100, stacks: bool = True, wait: bool = False,
+                          token: Optional[str] = None, x_operator_token: Optional[str] = Header(None)):
+    """Сеанс профилирования: таймеры этапов read/encode/transcode/h264_feed/send и выборка стеков.
+    
+    С wait=true ответ приходит после завершения сеанса.
+    """
+    require_operator(token or x_operator_token)
+    duration = max(0.5, min(PROFILE_MAX_DURATION, duration))
+    sample_hz = max(1, min(PROFILE_MAX_SAMPLE_HZ, sample_hz))
+    try:
+        status = profiler.start(duration, sample_hz, stacks)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if wait:
+        while profiler.is_running:
+            await asyncio.sleep(0.2)
+        status = profiler.status()
+    return status
+
+@app.get("/api/cameras/profile")
+async def get_profiling_status():
+    """Состояние сеанса профилирования и сводка по этапам"""
+    return profiler.status()
+
+@app.get("/api/cameras/profile/collapsed")
+async def get_profiling_stacks():
+    """Стеки последнего сеанса в свернутом формате (flamegraph.pl, speedscope)"""
+    if not profiler.stacks:
+        raise HTTPException(status_code=404, detail="Нет выборок стеков")
+    return Response(content=profiler.collapsed(), media_type='text/plain; charset=utf-8',
+                    headers={'Content-Disposition': 'attachment; filename="camera_service.collapsed"'})
+
+@app.get("/api/cameras/groups")
+async def list_capture_groups():
+    """Группы синхронного захвата и статистика рассинхронизации"""
+    return {"groups": [group.get_stats() for group in list(camera_service.capture_groups.values())]}
+
+@app.post("/api/cameras/groups")
+async def create_capture_group(request: CaptureGroupRequest):
+    """Создание группы синхронного захвата"""
+    if not request.camera_ids or not 1 <= request.fps <= 60:
+        raise HTTPException(status_code=400, detail="Нужен непустой список камер и FPS 1..60")
+    try:
+        group = await asyncio.get_running_loop().run_in_executor(
+            None, camera_service.create_capture_group, request.name, request.camera_ids, request.fps)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return group.get_stats()
+
+@app.delete("/api/cameras/groups/{name}")
+async def delete_capture_group(name: str):
+    """Удаление группы: камеры возвращаются к независимому захвату"""
+    removed = await asyncio.get_running_loop().run_in_executor(None, camera_service.remove_capture_group, name)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Группа {name} не найдена")
+    return CameraActionResponse(status="ok", message=f"Группа {name} удалена")
+
+@app.get("/api/cameras/groups/{name}/latest")
+async def get_capture_group_latest(name: str, images: bool = True):
+    """Последний согласованный набор кадров группы одним ответом (JPEG в base64)"""
+    group = camera_service.capture_groups.get(name)
+    if group is None:
+        raise HTTPException(status_code=404, detail=f"Группа {name} не найдена")
+    frame_set = group.latest
+    if frame_set is None:
+        raise HTTPException(status_code=503, detail="Группа еще не получила ни одного набора кадров")
+    return {
+        "group": frame_set.group,
+        "seq": frame_set.seq,
+        "deadline": frame_set.deadline,
+        "skew_ms": round(frame_set.skew_ms, 3),
+        "missing": frame_set.missing,
+        "frames": {
+            str(camera_id): {
+                "seq": frame.seq,
+                "grab_ts": frame_set.grab_ts[camera_id],
+                "publish_ts": frame.timestamp,
+                "width": frame.width,
+                "height": frame.height,
+                **({"jpeg_base64": base64.b64encode(frame.jpeg_data).decode('ascii')} if images else {})
+            }
+            for camera_id, frame in frame_set.frames.items()
+        }
+    }
+
+@app.get("/api/cameras/multicast")
+async def list_multicast_sessions():
+    """RTP/JPEG рассылки профилей со статистикой и SDP для плееров"""
+    return {"sessions": [{**session.get_stats(), "sdp": session.sdp()}
+                         for session in list(camera_service.multicast_sessions.values())]}
+
+@app.post("/api/cameras/multicast")
+async def create_multicast_session(request: MulticastRequest, token: Optional[str] = None,
+                                   x_operator_token: Optional[str] = Header(None)):
+    """Запуск RTP/JPEG рассылки профиля камеры в multicast группу (токен оператора)"""
+    require_operator(token or x_operator_token)
+    if request.camera_id not in camera_service.cameras:
+        raise HTTPException(status_code=404, detail=f"Камера {request.camera_id} не найдена")
+    if request.port is not None and not 1024 <= request.port <= 65535:
+        raise HTTPException(status_code=400, detail="Порт должен быть в диапазоне 1024..65535")
+    try:
+        session = camera_service.create_multicast_session(request.camera_id, request.profile,
+                                                          request.group, request.port)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Не удалось открыть сокет рассылки: {e}")
+    return {**session.get_stats(), "sdp": session.sdp()}
+
+@app.delete("/api/cameras/multicast/{camera_id}/{profile_id}")
+async def delete_multicast_session(camera_id: int, profile_id: str, token: Optional[str] = None,
+                                   x_operator_token: Optional[str] = Header(None)):
+    require_operator(token or x_operator_token)
+    removed = await asyncio.get_running_loop().run_in_executor(
+        None, camera_service.remove_multicast_session, camera_id, profile_id)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Рассылка профиля {profile_id} камеры {camera_id} не найдена")
+    return {"success": True}
+
+@app.get("/api/cameras/{camera_id}/profiles/{profile_id}/sdp")
+async def multicast_sdp(camera_id: int, profile_id: str):
+    """SDP рассылки для ffplay/VLC: ffplay -protocol_whitelist file,udp,rtp camera.sdp"""
+    session = camera_service.multicast_sessions.get((camera_id, profile_id))
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Рассылка профиля {profile_id} камеры {camera_id} не найдена")
+    return Response(content=session.sdp(), media_type='application/sdp')
+
+@app.get("/api/cameras/egress")
+async def get_egress_allocation():
+    """Текущее распределение бюджета исходящего трафика между зрителями"""
+    return egress_scheduler.snapshot()
+
+@app.put("/api/cameras/egress")
+async def set_egress_budget(budget: int):
+    """Изменение общего бюджета исходящего трафика (байт/с, 0 - без ограничения)"""
+    egress_scheduler.set_budget(budget)
+    return egress_scheduler.snapshot()
+
+def _open_h264_stream(camera_id: int, width: int, fps: int, bitrate: int) -> H264Encoder:
+    if camera_id not in camera_service.cameras:
+        raise HTTPException(status_code=404, detail=f"Камера {camera_id} не запущена")
+    if shutil.which(FFMPEG_BINARY) is None:
+        raise HTTPException(status_code=503, detail="ffmpeg не установлен, H.264 стриминг недоступен")
+    return camera_service.get_h264_encoder(camera_id, width, fps, bitrate)
+
+def h264_stream_params(width: int, fps: int, bitrate: int, ticket: AdmissionTicket) -> tuple:
+    """Ширина, FPS и битрейт H.264 стрима; деградированный стрим - предельно низкие"""
+    width = max(160, min(1920, width))
+    fps = max(1, min(60, fps))
+    bitrate = max(100, min(8000, bitrate))
+    if ticket.degraded:
+        _, degraded_fps, _ = degraded_stream_params(EGRESS_MIN_QUALITY, fps)
+        width, fps, bitrate = min(width, H264_DEGRADED_WIDTH), degraded_fps, min(bitrate, H264_DEGRADED_BITRATE)
+    return width, fps, bitrate
+
+@app.get("/api/cameras/{camera_id}/h264")
+async def h264_stream(camera_id: int, width: int = 640, fps: int = 30, bitrate: int = 800,
+                      priority: str = "observer", token: Optional[str] = None,
+                      x_operator_token: Optional[str] = Header(None)):
+    """H.264 (Annex-B) стрим с низкой задержкой: один кодер на профиль для всех зрителей"""
+    priority = resolve_priority(priority, token or x_operator_token)
+    ticket = admit_stream(camera_id, priority)
+    try:
+        width, fps, bitrate = h264_stream_params(width, fps, bitrate, ticket)
+        encoder = _open_h264_stream(camera_id, width, fps, bitrate)
+        subscriber = encoder.subscribe(asyncio.get_running_loop())
+    except Exception:
+        ticket.release()
+        raise
+
+    async def generate():
+        try:
+            while True:
+                unit = await subscriber.queue.get()
+                if unit is None:
+                    break  # Кодер остановлен
+                yield unit.data
+        finally:
+            encoder.unsubscribe(subscriber)
+            ticket.release()
+
+    headers = {
+        'Cache-Control': 'no-cache, no-store, must-revalidate',
+        'Access-Control-Allow-Origin': '*',
+        'X-Accel-Buffering': 'no'
+    }
+    if ticket.degraded:
+        headers['X-Stream-Degraded'] = '1'
+    return StreamingResponse(generate(), media_type='video/h264', headers=headers)
+
+@app.websocket("/api/cameras/{camera_id}/h264/ws")
+async def h264_websocket(websocket: WebSocket, camera_id: int, width: int = 640, fps: int = 30, bitrate: int = 800,
+                         priority: str = "observer", token: Optional[str] = None):
+    """H.264 через WebSocket: одно бинарное сообщение на access unit"""
+    priority = resolve_priority(priority, token or websocket.headers.get('x-operator-token'))
+    ticket = admission_controller.admit(camera_id, priority)
+    if ticket is None:
+        await websocket.close(code=1013, reason=f"Превышен лимит стримов, повторите через {ADMISSION_RETRY_AFTER} с")
+        return
+    try:
+        width, fps, bitrate = h264_stream_params(width, fps, bitrate, ticket)
+        try:
+            encoder = _open_h264_stream(camera_id, width, fps, bitrate)
+        except HTTPException as e:
+            await websocket.close(code=1011, reason=str(e.detail))
+            return
+        await websocket.accept()
+        subscriber = encoder.subscribe(asyncio.get_running_loop())
+        try:
+            while True:
+                unit = await subscriber.queue.get()
+                if unit is None:
+                    await websocket.close(code=1011, reason="H.264 кодер остановлен")
+                    break
+                await websocket.send_bytes(unit.data)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.warning(f"Ошибка H.264 WebSocket стрима камеры {camera_id}: {e}")
+        finally:
+            encoder.unsubscribe(subscriber)
+    finally:
+        ticket.release()
+
 # Обработчики сигналов для корректного завершения
 def signal_handler(signum, frame):
     logger.warning(f"Получен сигнал {signum}, останавливаем сервер...")
@@ -845,9 +3365,44 @@ def signal_handler(signum, frame):
         logger.warning("Завершение работы сервиса")
         sys.exit(0)
 
+def reload_signal_handler(signum, frame):
+    """SIGHUP - перезагрузка профилей стримов"""
+    try:
+        stream_profiles.reload()
+    except (OSError, ValueError) as e:
+        logger.error(f"Ошибка перезагрузки профилей стримов: {e}")
+
+def serve_control(channel: ControlChannel, server: uvicorn.Server):
+    """Команды сервис-менеджера: release - передача камер новому экземпляру сервиса"""
+    while True:
+        command = channel.receive()
+        if command is None:
+            return  # Менеджер закрыл канал
+        if command != 'release':
+            continue
+        logger.warning("Передача камер новому экземпляру сервиса")
+        # Закрываем свою копию слушающего сокета в цикле uvicorn: уже принятые соединения
+        # обслуживаются, новые ждут нового экземпляра в backlog сокета менеджера
+        if server.servers:
+            server.servers[0].get_loop().call_soon_threadsafe(
+                lambda: [listener.close() for listener in server.servers])
+            deadline = time.monotonic() + 1.0
+            while any(listener.is_serving() for listener in server.servers) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        try:
+            camera_service.release_devices()
+        except Exception as e:
+            logger.error(f"Ошибка при освобождении камер: {e}")
+        channel.send('released')
+        # Дообслуживание открытых соединений (не дольше DRAIN_TIMEOUT) и выход
+        server.should_exit = True
+        logger.warning("Камеры освобождены, дообслуживание соединений до %.1f с", DRAIN_TIMEOUT)
+
 # Регистрируем обработчики сигналов
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
+if hasattr(signal, 'SIGHUP'):
+    signal.signal(signal.SIGHUP, reload_signal_handler)
 
 if __name__ == "__main__":
     import uvicorn
@@ -856,17 +3411,39 @@ if __name__ == "__main__":
     port = int(os.environ.get('CAMERA_SERVICE_PORT', 5002))
     host = os.environ.get('CAMERA_SERVICE_HOST', '0.0.0.0')
     
-    logger.warning(f"Запуск веб-сервера на http://{host}:{port}")
-    logger.warning(f"Переменные окружения: CAMERA_SERVICE_PORT={port}, CAMERA_SERVICE_HOST={host}")
+    # Сокет от сервис-менеджера (LISTEN_FDS): соединения во время перезапуска ждут в очереди ядра
+    inherited_sockets = listen_sockets()
+    if inherited_sockets:
+        logger.warning("Запуск веб-сервера на унаследованном сокете %s", inherited_sockets[0].getsockname())
+    else:
+        logger.warning(f"Запуск веб-сервера на http://{host}:{port}")
+        logger.warning(f"Переменные окружения: CAMERA_SERVICE_PORT={port}, CAMERA_SERVICE_HOST={host}")
     
     try:
-        uvicorn.run(
+        if STANDBY:
+            # Резерв готов: импорт и инициализация позади, камеры откроются после передачи
+            logger.warning("Резервный экземпляр готов, ожидание передачи камер")
+            control_channel.send('standby')
+            if control_channel.receive() != 'takeover':
+                logger.warning("Передача камер отменена менеджером")
+                sys.exit(0)
+            camera_service.acquire_devices()
+            logger.warning("Камеры приняты от предыдущего экземпляра")
+        config = uvicorn.Config(
             app, 
             host=host, 
             port=port,
             log_level="info",
-            access_log=True
+            access_log=ACCESS_LOG_ENABLED,
+            timeout_graceful_shutdown=DRAIN_TIMEOUT,
+            # Логгеры uvicorn пишут через общую очередь корневого логгера
+            log_config=None
         )
+        server = uvicorn.Server(config)
+        if control_channel is not None:
+            threading.Thread(target=serve_control, args=(control_channel, server),
+                             name="control", daemon=True).start()
+        server.run(sockets=inherited_sockets or None)
     except KeyboardInterrupt:
         logger.warning("Получен KeyboardInterrupt, завершение работы...")
     except Exception as e:
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Раздающие воркеры MJPEG поверх колец кадров сервиса камер.
+
+camera_service.py владеет камерами, захватывает и кодирует кадры и публикует
+JPEG в разделяемую память (common/frame_ring.py, кольца control_robot_cam{id}_jpeg).
+Этот сервис запускает несколько процессов uvicorn на одном порту; каждый
+процесс читает кольца сам, поэтому число зрителей масштабируется по ядрам
+и не конкурирует за камеры и event loop сервиса камер.
+
+Лимиты стримов, приоритет оператора и бюджет трафика - те же, что у сервиса
+камер (common/stream_limits.py, те же переменные окружения), и действуют на весь
+пул воркеров: счетчики процессов сводятся в общей таблице, которую создает
+родительский процесс uvicorn.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+
+from common.frame_ring import FrameRingReader, ring_name
+from common.log_setup import setup_logging
+from common.jpeg_codec import EncoderPreset, get_codec, decode_scaled, jpeg_size
+from common.stream_limits import (ADMISSION_MAX_DEGRADED, ADMISSION_MAX_STREAMS, ADMISSION_MAX_STREAMS_PER_CAMERA,
+                                  ADMISSION_OVERFLOW, ADMISSION_RETRY_AFTER, EGRESS_BUDGET_BPS, EGRESS_MIN_FPS,
+                                  EGRESS_MIN_QUALITY, EGRESS_REBALANCE_INTERVAL, WORKER_TABLE_CAMERAS,
+                                  AdmissionController, AdmissionTicket, EgressScheduler, SharedAdmissionController,
+                                  WorkerStreamTable, resolve_priority)
+
+# Опрос заголовка кольца со зрителями: после кадра лента спит FEED_EARLY_WAKE от среднего
+# интервала кадров, затем опрашивает каждые FEED_POLL_INTERVAL до следующего кадра
+FEED_POLL_INTERVAL = 0.003
+FEED_EARLY_WAKE = 0.8
+# Камера молчит дольше двух интервалов кадров - опрос реже
+FEED_STALL_POLL_INTERVAL = 0.05
+# Без зрителей кольцо опрашивается редко (новый зритель будит ленту сразу)
+FEED_IDLE_POLL_INTERVAL = 0.25
+# Лента без зрителей закрывается через столько секунд
+FEED_IDLE_TIMEOUT = 10.0
+# Базовое разрешение захвата сервиса камер (CAMERA_RESOLUTION). Пока камера снимает крупнее
+# по запросу HD снимка или зума, кадры для зрителей без width уменьшаются до базовой ширины
+BASE_WIDTH = int(os.environ.get('CAMERA_RESOLUTION', '640x480').lower().partition('x')[0])
+DEFAULT_QUALITY = 85
+# Перекодированных вариантов (качество, ширина) на ленту: хранятся только для текущего кадра
+FEED_MAX_VARIANTS = 16
+# Путь к таблице стримов пула воркеров; задает родительский процесс
+WORKER_TABLE_VARIABLE = 'CAMERA_WORKER_TABLE'
+# Сколько секунд воркер ждет завершения открытых потоков при остановке
+WORKER_SHUTDOWN_TIMEOUT = float(os.environ.get('CAMERA_WORKER_SHUTDOWN_TIMEOUT', 3.0))
+
+setup_logging("camera_worker", logging.WARNING)
+logger = logging.getLogger(__name__)
+
+class CameraFeed:
+    """Последний JPEG камеры из кольца, общий для всех зрителей процесса"""
+
+    def __init__(self, camera_id: int):
+        self.camera_id = camera_id
+        self.reader: Optional[FrameRingReader] = None
+        self.seq = 0
+        self.jpeg_data: Optional[bytes] = None
+        self.timestamp = 0.0
+        # Событие текущего кадра: при новом кадре срабатывает и заменяется свежим.
+        # Отмена ожидания при отключении зрителя не трогает общих блокировок
+        self.frame_event = asyncio.Event()
+        self.subscribers = 0
+        self.last_used = time.time()
+        self.reencoded: Dict[tuple, Tuple[int, bytes]] = OrderedDict()  # (качество, ширина) -> (номер кадра, JPEG), LRU
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+        self.frame_interval = 1.0 / 30  # Средний интервал между кадрами кольца, секунд
+        self.polls = 0  # Опросы заголовка кольца (для /health)
+
+    def subscribe(self):
+        self.subscribers += 1
+        self.wakeup.set()
+
+    def unsubscribe(self):
+        self.subscribers -= 1
+        self.last_used = time.time()
+
+    def _poll_delay(self, got_frame: bool, since_frame: float) -> float:
+        """Пауза до следующего опроса кольца"""
+        if self.subscribers == 0:
+            return FEED_IDLE_POLL_INTERVAL
+        if got_frame:
+            return max(FEED_POLL_INTERVAL, self.frame_interval * FEED_EARLY_WAKE)
+        if since_frame > self.frame_interval * 2:
+            return FEED_STALL_POLL_INTERVAL
+        return FEED_POLL_INTERVAL
+
+    def _attach(self) -> bool:
+        if self.reader is None:
+            try:
+                self.reader = FrameRingReader(ring_name(self.camera_id, 'jpeg'))
+            except (FileNotFoundError, ValueError):
+                return False
+        return True
+
+    async def _run(self):
+        last_frame = time.monotonic()
+        while True:
+            if self.subscribers == 0 and time.time() - self.last_used > FEED_IDLE_TIMEOUT:
+                break
+            if not self._attach():
+                await asyncio.sleep(0.5)
+                continue
+            self.polls += 1
+            got_frame = False
+            frame = self.reader.latest()
+            if frame is not None and frame.seq != self.seq:
+                data = frame.array.tobytes()
+                if frame.valid():
+                    now = time.monotonic()
+                    if self.seq:
+                        # Интервал по моменту обнаружения: при пропуске кадров - на кадр
+                        interval = (now - last_frame) / max(1, frame.seq - self.seq)
+                        self.frame_interval += (min(1.0, interval) - self.frame_interval) * 0.1
+                    last_frame = now
+                    got_frame = True
+                    self.seq = frame.seq
+                    self.jpeg_data = data
+                    self.timestamp = frame.timestamp
+                    event, self.frame_event = self.frame_event, asyncio.Event()
+                    event.set()
+            delay = self._poll_delay(got_frame, time.monotonic() - last_frame)
+            if delay < FEED_IDLE_POLL_INTERVAL:
+                await asyncio.sleep(delay)
+            else:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        feeds.pop(self.camera_id, None)
+        if self.reader is not None:
+            self.reader.close()
+
+    def ensure_running(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def wait_frame(self, after_seq: int, timeout: float = 2.0) -> Optional[Tuple[int, bytes]]:
+        if self.seq == after_seq or self.jpeg_data is None:
+            try:
+                await asyncio.wait_for(self.frame_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.seq, self.jpeg_data
+
+    async def get_variant(self, seq: int, jpeg_data: bytes, quality: int, width: Optional[int]) -> bytes:
+        """Перекодирование (качество, ширина) один раз на кадр для всех зрителей процесса"""
+        variant = (quality, width)
+        cached = self.reencoded.get(variant)
+        if cached is not None and cached[0] == seq:
+            self.reencoded.move_to_end(variant)
+            return cached[1]
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, reencode_jpeg, jpeg_data, quality, width)
+        if seq == self.seq:
+            self.reencoded[variant] = (seq, data)
+            self.reencoded.move_to_end(variant)
+        # Варианты прошлых кадров больше не нужны; число вариантов кадра ограничено
+        for stale in [key for key, (cached_seq, _) in self.reencoded.items() if cached_seq != self.seq]:
+            del self.reencoded[stale]
+        while len(self.reencoded) > FEED_MAX_VARIANTS:
+            self.reencoded.popitem(last=False)
+        return data
+
+def output_width(jpeg_data: bytes, width: Optional[int]) -> Optional[int]:
+    """Ширина для зрителя: запрошенная или базовая, если кадр крупнее базового разрешения"""
+    if width is not None:
+        return width
+    return BASE_WIDTH if jpeg_size(jpeg_data)[0] > BASE_WIDTH else None
+
+def reencode_jpeg(jpeg_data: bytes, quality: int, width: Optional[int] = None) -> bytes:
+    """Перекодирование; уменьшенные варианты декодируются сразу в меньшем размере (DCT-домен)"""
+    codec = get_codec()
+    image = decode_scaled(jpeg_data, width, codec=codec) if width else codec.decode(jpeg_data)
+    return codec.encode(image, EncoderPreset(quality=quality))
+
+feeds: Dict[int, CameraFeed] = {}
+
+def get_feed(camera_id: int) -> CameraFeed:
+    feed = feeds.get(camera_id)
+    if feed is None:
+        feed = CameraFeed(camera_id)
+        feeds[camera_id] = feed
+    feed.last_used = time.time()
+    feed.ensure_running()
+    return feed
+
+# Лимиты стримов: в пуле uvicorn - общие для всех процессов через таблицу родителя
+worker_table = WorkerStreamTable(os.environ[WORKER_TABLE_VARIABLE]) if os.environ.get(WORKER_TABLE_VARIABLE) else None
+if worker_table is not None:
+    admission_controller: AdmissionController = SharedAdmissionController(
+        worker_table, ADMISSION_MAX_STREAMS, ADMISSION_MAX_STREAMS_PER_CAMERA, ADMISSION_OVERFLOW, ADMISSION_MAX_DEGRADED)
+else:
+    admission_controller = AdmissionController(ADMISSION_MAX_STREAMS, ADMISSION_MAX_STREAMS_PER_CAMERA,
+                                               ADMISSION_OVERFLOW, ADMISSION_MAX_DEGRADED)
+egress_scheduler = EgressScheduler(EGRESS_BUDGET_BPS)
+egress_share_updated = 0.0
+
+def update_egress_share(force: bool = False):
+    """Доля процесса в бюджете трафика пула - пропорционально числу его стримов"""
+    global egress_share_updated
+    now = time.monotonic()
+    if worker_table is None or EGRESS_BUDGET_BPS <= 0:
+        return
+    if not force and now - egress_share_updated < EGRESS_REBALANCE_INTERVAL:
+        return
+    egress_share_updated = now
+    own, total = worker_table.client_share()
+    # 0 в планировщике - без ограничения, поэтому доля не меньше 1 байта/с
+    share = max(1, EGRESS_BUDGET_BPS * own // total) if total else EGRESS_BUDGET_BPS
+    if share != egress_scheduler.budget_bps:
+        egress_scheduler.set_budget(share)
+
+def admit_stream(camera_id: int, priority: str) -> AdmissionTicket:
+    """Допуск стрима или быстрый 503 с Retry-After"""
+    ticket = admission_controller.admit(camera_id, priority)
+    if ticket is None:
+        raise HTTPException(status_code=503, detail=f"Превышен лимит стримов камеры {camera_id}",
+                            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+    update_egress_share(force=True)
+    return ticket
+
+app = FastAPI(title="Camera Worker", version="1.0.0")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["GET", "OPTIONS"],
+    allow_headers=["*"]
+)
+
+MJPEG_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0',
+    'Access-Control-Allow-Origin': '*',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no'
+}
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "pid": os.getpid(), "feeds": {
+        str(camera_id): {"seq": feed.seq, "subscribers": feed.subscribers, "polls": feed.polls,
+                         "frame_interval_ms": round(feed.frame_interval * 1000.0, 1),
+                         "variants": len(feed.reencoded)}
+        for camera_id, feed in list(feeds.items())
+    }, "admission": admission_controller.snapshot(),
+        "egress": {"budget_bps": egress_scheduler.budget_bps, "clients": len(egress_scheduler.clients)}}
+
+async def generate_mjpeg(feed: CameraFeed, quality: Optional[int], width: Optional[int], fps: int,
+                         priority: str, ticket: AdmissionTicket):
+    # Без quality кадр идет как есть (качество сервиса камер), пока бюджет не потребует ниже
+    client = egress_scheduler.register(feed.camera_id, priority, fps, quality or DEFAULT_QUALITY)
+    seq = 0
+    feed.subscribe()
+    try:
+        while True:
+            started = time.time()
+            update_egress_share()
+            result = await feed.wait_frame(seq)
+            if result is None:
+                continue
+            seq, jpeg_data = result
+            frame_width = output_width(jpeg_data, width)
+            frame_quality = client.allowed_quality
+            if quality is not None or frame_width is not None or frame_quality < client.requested_quality:
+                jpeg_data = await feed.get_variant(seq, jpeg_data, frame_quality, frame_width)
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\n'
+                   + f'Content-Length: {len(jpeg_data)}\r\nX-Frame-Seq: {seq}\r\n\r\n'.encode('ascii')
+                   + jpeg_data + b'\r\n')
+            egress_scheduler.record_frame(client, len(jpeg_data), frame_quality)
+            await egress_scheduler.throttle(client, len(jpeg_data))
+            delay = 1.0 / max(0.1, client.allowed_fps) - (time.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+    finally:
+        feed.unsubscribe()
+        egress_scheduler.unregister(client)
+        ticket.release()
+        update_egress_share(force=True)
+
+@app.get("/api/cameras/{camera_id}/mjpeg")
+async def mjpeg_stream(camera_id: int, fps: int = 30, quality: Optional[int] = None, width: Optional[int] = None,
+                       priority: str = "observer", token: Optional[str] = None,
+                       x_operator_token: Optional[str] = Header(None)):
+    """MJPEG стрим из кольца; без quality и width кадры базового разрешения отдаются как есть,
+    без перекодирования (крупнее базового - уменьшаются до него). Лимиты стримов и
+    бюджет трафика - как у сервиса камер, на весь пул воркеров.
+    """
+    fps = max(1, min(60, fps))
+    if quality is not None:
+        quality = max(10, min(100, quality))
+    if width is not None:
+        width = max(16, min(4096, width))
+    if not 0 <= camera_id < WORKER_TABLE_CAMERAS:
+        raise HTTPException(status_code=404, detail=f"Камера {camera_id} не найдена")
+    priority = resolve_priority(priority, token or x_operator_token)
+    feed = get_feed(camera_id)
+    if await feed.wait_frame(0) is None:
+        raise HTTPException(status_code=404, detail=f"Нет кадров камеры {camera_id} в разделяемой памяти")
+    ticket = admit_stream(camera_id, priority)
+    headers = MJPEG_HEADERS
+    if ticket.degraded:
+        # Как у сервиса камер без профиля деградации: минимальные качество и FPS
+        quality, fps = min(quality or DEFAULT_QUALITY, EGRESS_MIN_QUALITY), min(fps, EGRESS_MIN_FPS)
+        headers = {**MJPEG_HEADERS, 'X-Stream-Degraded': '1'}
+    return StreamingResponse(
+        generate_mjpeg(feed, quality, width, fps, priority, ticket),
+        media_type='multipart/x-mixed-replace; boundary=frame',
+        headers=headers
+    )
+
+@app.get("/api/cameras/{camera_id}/frame")
+async def single_frame(camera_id: int):
+    """Последний кадр камеры одним JPEG"""
+    if not 0 <= camera_id < WORKER_TABLE_CAMERAS:
+        raise HTTPException(status_code=404, detail=f"Камера {camera_id} не найдена")
+    feed = get_feed(camera_id)
+    result = await feed.wait_frame(0)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Нет кадров камеры {camera_id} в разделяемой памяти")
+    seq, jpeg_data = result
+    frame_width = output_width(jpeg_data, None)
+    if frame_width is not None:
+        jpeg_data = await feed.get_variant(seq, jpeg_data, DEFAULT_QUALITY, frame_width)
+    return Response(content=jpeg_data, media_type='image/jpeg', headers={'X-Frame-Seq': str(seq)})
+
+if __name__ == "__main__":
+    port = int(os.environ.get('CAMERA_WORKER_PORT', 5003))
+    host = os.environ.get('CAMERA_SERVICE_HOST', '0.0.0.0')
+    workers = int(os.environ.get('CAMERA_WORKERS', 2))
+
+    # Таблица стримов пула: воркеры находят ее по пути из окружения
+    table_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    table_path = os.path.join(table_dir, f"control_robot_workers_{os.getpid()}")
+    WorkerStreamTable.create(table_path)
+    os.environ[WORKER_TABLE_VARIABLE] = table_path
+
+    # SIGTERM обрабатывает супервизор uvicorn: останавливает и дожидается всех воркеров.
+    # Бесконечные потоки MJPEG обрываются через WORKER_SHUTDOWN_TIMEOUT
+    logger.warning(f"Запуск {workers} воркеров MJPEG на http://{host}:{port}")
+    # Воркеры импортируют модуль заново, поэтому приложение передается строкой
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        uvicorn.run("camera_worker:app", host=host, port=port, workers=workers,
+                    log_level="warning", access_log=False, log_config=None,
+                    timeout_graceful_shutdown=WORKER_SHUTDOWN_TIMEOUT)
+    finally:
+        os.unlink(table_path)
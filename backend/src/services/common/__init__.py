@@ -0,0 +1,4 @@
+"""
+Общие модули сервисов H1 робота (подключаются сервисами и клиентскими утилитами).
+Пакет не запускается сервис-менеджером как сервис.
+"""
@@ -0,0 +1,247 @@
+"""
+Кольцо кадров в именованной разделяемой памяти (multiprocessing.shared_memory).
+
+Сервис камер пишет в кольцо каждый опубликованный кадр, локальные процессы
+читают последний кадр как numpy массив прямо из разделяемой памяти - без HTTP,
+без JPEG и без копирования.
+
+Раскладка сегмента (little-endian):
+
+    Заголовок, 64 байта:
+        0   magic       4s   b'CFRM'
+        4   version     u32  1
+        8   slot_count  u32  число слотов
+        12  closed      u32  1 - сегмент выведен из работы, переоткрыть по имени
+        16  slot_size   u64  вместимость слота, байт
+        24  latest      u64  номер последнего записанного кадра (0 - кадров нет)
+        32  reserved    32 байта
+
+    Заголовки слотов, slot_count x 64 байта:
+        0   seq         u64  номер кадра в слоте (0 - слот пишется)
+        8   timestamp   f64  время захвата кадра, Unix time
+        16  ndim        u32  число измерений
+        20  dtype       4s   numpy dtype.str без выравнивания (например b'|u1')
+        24  shape       4 x u32
+        40  nbytes      u64  размер данных кадра
+        48  reserved    16 байт
+
+    Данные слотов, slot_count x slot_size (каждый слот выровнен на 64 байта).
+
+Кадр с номером N лежит в слоте (N - 1) % slot_count. Писатель обнуляет seq
+слота, копирует данные и метаданные, записывает seq и затем latest. Читатель
+берет latest, проверяет seq слота и отдает view на данные. View остается
+действительным, пока писатель не сделает slot_count новых кадров; проверить
+это можно через RingFrame.valid(), а для долгой обработки - сделать copy().
+"""
+
+import struct
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+MAGIC = b'CFRM'
+VERSION = 1
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+ALIGNMENT = 64
+MAX_DIMS = 4
+
+_HEADER = struct.Struct('<4sIIIQQ')
+_SLOT = struct.Struct('<QdI4s4IQ')
+_LATEST_OFFSET = 24
+_CLOSED_OFFSET = 12
+
+
+def ring_name(camera_id: int, kind: str = 'raw') -> str:
+    """Имя сегмента кольца камеры (как в /dev/shm)"""
+    return f"control_robot_cam{camera_id}_{kind}"
+
+
+def _align(value: int) -> int:
+    return (value + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _data_offset(slot_count: int, slot_size: int, slot: int) -> int:
+    return _align(HEADER_SIZE + slot_count * SLOT_HEADER_SIZE) + slot * slot_size
+
+
+def _untrack(shm: shared_memory.SharedMemory):
+    """Читатель не владеет сегментом: resource_tracker не должен удалять его при выходе"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+class FrameRingWriter:
+    """Запись кадров в кольцо (один писатель на сегмент)"""
+
+    def __init__(self, name: str, slot_size: int, slot_count: int = 4):
+        self.name = name
+        self.slot_count = slot_count
+        self.slot_size = _align(slot_size)
+        total = _data_offset(slot_count, self.slot_size, slot_count)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        except FileExistsError:
+            # Сегмент остался от упавшего процесса - пересоздаем
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        self.buf = self.shm.buf
+        self.buf[:_align(HEADER_SIZE + slot_count * SLOT_HEADER_SIZE)] = bytes(
+            _align(HEADER_SIZE + slot_count * SLOT_HEADER_SIZE))
+        _HEADER.pack_into(self.buf, 0, MAGIC, VERSION, slot_count, 0, self.slot_size, 0)
+        self.seq = 0
+
+    def fits(self, nbytes: int) -> bool:
+        return nbytes <= self.slot_size
+
+    def write(self, data, timestamp: float, seq: Optional[int] = None) -> int:
+        """Запись массива numpy или bytes; seq - возрастающий номер кадра (по умолчанию следующий)"""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            array = np.frombuffer(data, dtype=np.uint8)
+        else:
+            array = np.ascontiguousarray(data)
+        if array.ndim > MAX_DIMS:
+            raise ValueError(f"Кадр с {array.ndim} измерениями не поддерживается")
+        if not self.fits(array.nbytes):
+            raise ValueError(f"Кадр {array.nbytes} байт не помещается в слот {self.slot_size} байт")
+
+        seq = seq if seq is not None and seq > self.seq else self.seq + 1
+        slot = (seq - 1) % self.slot_count
+        slot_offset = HEADER_SIZE + slot * SLOT_HEADER_SIZE
+        struct.pack_into('<Q', self.buf, slot_offset, 0)
+
+        offset = _data_offset(self.slot_count, self.slot_size, slot)
+        target = np.ndarray((array.nbytes,), dtype=np.uint8, buffer=self.buf, offset=offset)
+        target[:] = array.reshape(-1).view(np.uint8)
+
+        shape = list(array.shape) + [0] * (MAX_DIMS - array.ndim)
+        _SLOT.pack_into(self.buf, slot_offset, 0, timestamp, array.ndim,
+                        array.dtype.str.encode('ascii'), *shape, array.nbytes)
+        struct.pack_into('<Q', self.buf, slot_offset, seq)
+        struct.pack_into('<Q', self.buf, _LATEST_OFFSET, seq)
+        self.seq = seq
+        return seq
+
+    def close(self):
+        """Вывод сегмента из работы: читатели увидят флаг closed и переоткроют кольцо по имени"""
+        try:
+            struct.pack_into('<I', self.buf, _CLOSED_OFFSET, 1)
+        except Exception:
+            pass
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+@dataclass
+class RingFrame:
+    """Кадр из кольца: array - view на разделяемую память без копирования"""
+    seq: int
+    timestamp: float
+    array: np.ndarray
+    _reader: 'FrameRingReader'
+    _slot_offset: int
+
+    def valid(self) -> bool:
+        """True, если писатель еще не перезаписал слот этого кадра"""
+        return self._reader._slot_seq(self._slot_offset) == self.seq
+
+    def copy(self) -> Optional[np.ndarray]:
+        """Копия данных кадра; None, если слот успели перезаписать"""
+        data = self.array.copy()
+        return data if self.valid() else None
+
+
+class FrameRingReader:
+    """Чтение кадров из кольца, созданного FrameRingWriter"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self._open()
+
+    def _open(self):
+        shm = shared_memory.SharedMemory(name=self.name)
+        _untrack(shm)
+        magic, version, slot_count, _, slot_size, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            shm.close()
+            raise ValueError(f"{self.name}: неизвестный формат кольца кадров")
+        self.shm = shm
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+
+    def _reopen_if_closed(self) -> bool:
+        if struct.unpack_from('<I', self.shm.buf, _CLOSED_OFFSET)[0] == 0:
+            return True
+        old = self.shm
+        try:
+            self._open()
+        except (FileNotFoundError, ValueError):
+            return False
+        try:
+            old.close()
+        except BufferError:
+            # На старый сегмент еще есть view у потребителя - освободится вместе с ними
+            pass
+        return True
+
+    def _slot_seq(self, slot_offset: int) -> int:
+        return struct.unpack_from('<Q', self.shm.buf, slot_offset)[0]
+
+    @property
+    def latest_seq(self) -> int:
+        return struct.unpack_from('<Q', self.shm.buf, _LATEST_OFFSET)[0]
+
+    def latest(self) -> Optional[RingFrame]:
+        """Последний записанный кадр или None"""
+        if not self._reopen_if_closed():
+            return None
+        for _ in range(3):
+            seq = self.latest_seq
+            if seq == 0:
+                return None
+            slot = (seq - 1) % self.slot_count
+            slot_offset = HEADER_SIZE + slot * SLOT_HEADER_SIZE
+            slot_seq, timestamp, ndim, dtype, *rest = _SLOT.unpack_from(self.shm.buf, slot_offset)
+            if slot_seq != seq:
+                continue  # слот перезаписывается прямо сейчас
+            shape: Tuple[int, ...] = tuple(rest[:ndim])
+            offset = _data_offset(self.slot_count, self.slot_size, slot)
+            array = np.ndarray(shape, dtype=np.dtype(dtype.rstrip(b'\0').decode('ascii')),
+                               buffer=self.shm.buf, offset=offset)
+            return RingFrame(seq, timestamp, array, self, slot_offset)
+        return None
+
+    def wait(self, after_seq: int = 0, timeout: float = 1.0, poll_interval: float = 0.002) -> Optional[RingFrame]:
+        """Ожидание кадра новее after_seq (опрос заголовка, без системных вызовов)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.latest()
+            if frame is not None and frame.seq != after_seq:
+                return frame
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                pass
+            self.shm = None
@@ -0,0 +1,97 @@
+"""
+Канал управления между сервис-менеджером и сервисом для перезапуска без простоя
+(restart_mode "hot-swap" в манифесте).
+
+Менеджер передает сервису конец socketpair, номер дескриптора - в
+SERVICE_CONTROL_FD. Сообщения - строки:
+    новый -> менеджер   standby    инициализирован, устройства не открыты
+    менеджер -> старый  release    перестать принимать соединения, освободить устройства
+    старый -> менеджер  released   устройства свободны, дальше - дообслуживание и выход
+    менеджер -> новый   takeover   открыть устройства и начать принимать соединения
+Устройства открывает ровно один экземпляр: новый - только после released старого
+(или после завершения старого процесса). Слушающий сокет держит менеджер
+(socket_activation), соединения между release и takeover ждут в backlog.
+
+Сторона сервиса:
+    channel = ControlChannel.from_environment()
+    if channel is not None and standby_requested():
+        channel.send('standby')
+        if channel.receive() != 'takeover':
+            sys.exit(0)
+"""
+
+import os
+import socket
+import time
+from typing import Optional, Tuple
+
+CONTROL_FD_VARIABLE = 'SERVICE_CONTROL_FD'
+STANDBY_VARIABLE = 'SERVICE_STANDBY'
+
+
+class ControlChannel:
+    """Строковые сообщения поверх unix-сокета"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.buffer = b''
+
+    @classmethod
+    def pair(cls) -> Tuple['ControlChannel', socket.socket]:
+        """Для менеджера: свой конец канала и сокет для дочернего процесса"""
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        return cls(ours), theirs
+
+    @classmethod
+    def from_environment(cls, unset_environment: bool = True) -> Optional['ControlChannel']:
+        """Канал, переданный менеджером (None - сервис запущен без него)"""
+        value = os.environ.pop(CONTROL_FD_VARIABLE, None) if unset_environment \
+            else os.environ.get(CONTROL_FD_VARIABLE)
+        if not value:
+            return None
+        try:
+            sock = socket.socket(fileno=int(value))
+        except (ValueError, OSError):
+            return None
+        sock.set_inheritable(False)
+        return cls(sock)
+
+    def send(self, message: str) -> bool:
+        try:
+            self.sock.sendall(message.encode() + b'\n')
+            return True
+        except OSError:
+            return False
+
+    def receive(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Следующее сообщение; None - канал закрыт другой стороной или истек timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while b'\n' not in self.buffer:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.sock.settimeout(remaining)
+            else:
+                self.sock.settimeout(None)
+            try:
+                data = self.sock.recv(4096)
+            except OSError:  # socket.timeout - подкласс OSError
+                return None
+            if not data:
+                return None
+            self.buffer += data
+        line, _, self.buffer = self.buffer.partition(b'\n')
+        return line.decode(errors='replace').strip()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def standby_requested(unset_environment: bool = True) -> bool:
+    """Запуск резервным экземпляром: не открывать устройства до takeover"""
+    value = os.environ.pop(STANDBY_VARIABLE, '') if unset_environment else os.environ.get(STANDBY_VARIABLE, '')
+    return value == '1'
@@ -0,0 +1,102 @@
+"""
+Пульс сервиса для сторожа сервис-менеджера: обнаружение зависшего (а не только
+упавшего) процесса.
+
+Менеджер передает сервису конец датаграммного socketpair, номер дескриптора -
+в SERVICE_HEARTBEAT_FD. Источники пульса - event loop и рабочие потоки (захват
+камер) - шлют свое имя и, необязательно, допустимую паузу до следующего пульса:
+"loop", "capture-0 10" (без паузы - hang_timeout манифеста). Источник с действием
+"dump" ("capture-0 10 dump") при зависании дает только дамп стеков, без перезапуска
+сервиса: так зависший драйвер одной камеры не обрывает раздачу остальных. Отправка
+неблокирующая и не чаще HEARTBEAT_INTERVAL на источник; при переполнении
+очереди датаграмма теряется. Штатно завершающийся источник снимается через
+leave(), иначе менеджер сочтет его зависшим.
+
+Замолчавший источник: менеджер шлет STACK_DUMP_SIGNAL - faulthandler пишет стеки
+всех потоков в stderr (в журнал сервиса у менеджера), затем действует по
+hang_action манифеста.
+
+    heartbeat = Heartbeat.from_environment()
+    heartbeat.beat('capture-0', timeout=10, action='dump')   # из потока, на каждой итерации
+    asyncio.create_task(heartbeat.run())      # из event loop
+"""
+
+import asyncio
+import faulthandler
+import os
+import signal
+import socket
+import time
+from typing import Dict, Optional
+
+HEARTBEAT_FD_VARIABLE = 'SERVICE_HEARTBEAT_FD'
+HEARTBEAT_INTERVAL = float(os.environ.get('SERVICE_HEARTBEAT_INTERVAL', 0.1))
+STACK_DUMP_SIGNAL = signal.SIGUSR1
+
+
+class Heartbeat:
+    """Отправка пульса менеджеру; без канала все методы ничего не делают"""
+
+    def __init__(self, sock: Optional[socket.socket] = None):
+        self.sock = sock
+        self.sent: Dict[str, float] = {}  # Источник -> время последней отправки
+
+    @classmethod
+    def from_environment(cls, unset_environment: bool = True) -> 'Heartbeat':
+        """Пульс, переданный менеджером; заодно дамп стеков по STACK_DUMP_SIGNAL"""
+        value = os.environ.pop(HEARTBEAT_FD_VARIABLE, None) if unset_environment \
+            else os.environ.get(HEARTBEAT_FD_VARIABLE)
+        if not value:
+            return cls()
+        try:
+            sock = socket.socket(fileno=int(value))
+        except (ValueError, OSError):
+            return cls()
+        sock.setblocking(False)
+        sock.set_inheritable(False)
+        faulthandler.register(STACK_DUMP_SIGNAL, all_threads=True)
+        return cls(sock)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sock is not None
+
+    def beat(self, source: str, timeout: Optional[float] = None, action: Optional[str] = None):
+        """Источник жив; timeout - допустимая пауза до следующего пульса, секунд;
+        action='dump' - зависание источника не ведет к перезапуску (нужен timeout)
+        """
+        if self.sock is None:
+            return
+        now = time.monotonic()
+        if now - self.sent.get(source, 0.0) < HEARTBEAT_INTERVAL:
+            return
+        self.sent[source] = now
+        message = source if timeout is None else f"{source} {timeout:g}"
+        if action and timeout is not None:
+            message += f" {action}"
+        self._send(message)
+
+    def leave(self, source: str):
+        """Источник штатно завершился"""
+        if self.sock is None:
+            return
+        self.sent.pop(source, None)
+        self._send('-' + source)
+
+    def _send(self, message: str):
+        try:
+            self.sock.send(message.encode())
+        except OSError:
+            pass  # Очередь переполнена или менеджер закрыл канал
+
+    async def run(self, source: str = 'loop', timeout: Optional[float] = None):
+        """Пульс event loop: пока корутина получает управление, цикл не заблокирован"""
+        if self.sock is None:
+            return
+        try:
+            while True:
+                self.sent[source] = 0.0
+                self.beat(source, timeout)
+                await asyncio.sleep(HEARTBEAT_INTERVAL)
+        finally:
+            self.leave(source)
@@ -0,0 +1,202 @@
+"""
+Кодек JPEG с выбором реализации.
+
+TurboJpegCodec использует libjpeg-turbo через PyTurboJPEG (pip install PyTurboJPEG,
+нужна системная libturbojpeg), если она установлена; иначе OpenCvCodec
+(cv2.imencode/cv2.imdecode). Выбор: CAMERA_JPEG_CODEC=auto|turbojpeg|opencv.
+
+Пресет кодирования (EncoderPreset) задает качество, прореживание цветности,
+оптимизацию Хаффмана и быстрый DCT. OpenCV не умеет быстрый DCT при кодировании,
+этот параметр учитывается только libjpeg-turbo.
+
+Декодирование с уменьшением (decode_scaled) масштабирует в DCT-домене в 2, 4 или 8
+раз (libjpeg scale_denom / cv2.IMREAD_REDUCED_*), а остаток доводится resize, поэтому
+для уменьшенных выходов не нужно декодировать кадр целиком.
+"""
+
+import logging
+import os
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUBSAMPLING = ('444', '422', '420', 'gray')
+SCALE_DENOMS = (8, 4, 2, 1)
+
+
+@dataclass(frozen=True)
+class EncoderPreset:
+    """Параметры кодирования JPEG"""
+    quality: int = 85
+    subsampling: str = '420'
+    optimize: bool = False  # Оптимизация таблиц Хаффмана: кадр меньше на ~5%, кодирование медленнее
+    fast_dct: bool = True  # Быстрый целочисленный DCT (только libjpeg-turbo)
+
+    def with_quality(self, quality: int) -> 'EncoderPreset':
+        return replace(self, quality=quality)
+
+
+def preset_from_config(config: Dict[str, Any], quality: Optional[int] = None) -> EncoderPreset:
+    """Пресет из описания профиля стрима (необязательные ключи subsampling, optimize, fast_dct)"""
+    subsampling = str(config.get('subsampling', '420'))
+    if subsampling not in SUBSAMPLING:
+        raise ValueError(f"Неизвестное прореживание цветности: {subsampling}")
+    return EncoderPreset(
+        quality=int(quality if quality is not None else config.get('quality', 85)),
+        subsampling=subsampling,
+        optimize=bool(config.get('optimize', False)),
+        fast_dct=bool(config.get('fast_dct', True))
+    )
+
+
+def choose_scale_denom(src_width: int, src_height: int, dst_width: int, dst_height: int) -> int:
+    """Наибольший делитель DCT масштабирования, при котором кадр не меньше целевого размера"""
+    for denom in SCALE_DENOMS:
+        if src_width // denom >= dst_width and src_height // denom >= dst_height:
+            return denom
+    return 1
+
+
+class OpenCvCodec:
+    """Кодек на cv2.imencode/cv2.imdecode"""
+
+    name = 'opencv'
+
+    _SAMPLING_FLAGS = {
+        '444': getattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR_444', None),
+        '422': getattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR_422', None),
+        '420': getattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR_420', None),
+    }
+    _REDUCED_FLAGS = {
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+
+    def encode(self, image: np.ndarray, preset: EncoderPreset) -> bytes:
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), preset.quality]
+        if preset.optimize:
+            params += [int(cv2.IMWRITE_JPEG_OPTIMIZE), 1]
+        if preset.subsampling == 'gray':
+            if image.ndim == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            sampling = self._SAMPLING_FLAGS.get(preset.subsampling)
+            if sampling is not None and hasattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR'):
+                params += [int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), int(sampling)]
+        ok, buffer = cv2.imencode('.jpg', image, params)
+        if not ok:
+            raise ValueError("cv2.imencode не смог закодировать кадр")
+        return buffer.tobytes()
+
+    def decode(self, data: bytes, scale_denom: int = 1) -> Optional[np.ndarray]:
+        flag = self._REDUCED_FLAGS.get(scale_denom, cv2.IMREAD_COLOR)
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+
+
+class TurboJpegCodec:
+    """Кодек на libjpeg-turbo (PyTurboJPEG)"""
+
+    name = 'turbojpeg'
+
+    def __init__(self):
+        import turbojpeg
+        self.module = turbojpeg
+        self.jpeg = turbojpeg.TurboJPEG()
+        self.subsampling = {
+            '444': turbojpeg.TJSAMP_444,
+            '422': turbojpeg.TJSAMP_422,
+            '420': turbojpeg.TJSAMP_420,
+            'gray': turbojpeg.TJSAMP_GRAY,
+        }
+        self.fast_dct = getattr(turbojpeg, 'TJFLAG_FASTDCT', 0)
+        self.fast_upsample = getattr(turbojpeg, 'TJFLAG_FASTUPSAMPLE', 0)
+        self.optimize = getattr(turbojpeg, 'TJFLAG_OPTIMIZE', 0)
+
+    def encode(self, image: np.ndarray, preset: EncoderPreset) -> bytes:
+        flags = (self.fast_dct if preset.fast_dct else 0) | (self.optimize if preset.optimize else 0)
+        if image.ndim == 2:
+            return self.jpeg.encode(image, quality=preset.quality, pixel_format=self.module.TJPF_GRAY,
+                                    jpeg_subsample=self.module.TJSAMP_GRAY, flags=flags)
+        return self.jpeg.encode(image, quality=preset.quality, pixel_format=self.module.TJPF_BGR,
+                                jpeg_subsample=self.subsampling[preset.subsampling], flags=flags)
+
+    def decode(self, data: bytes, scale_denom: int = 1) -> Optional[np.ndarray]:
+        scaling = (1, scale_denom) if scale_denom > 1 else None
+        return self.jpeg.decode(data, pixel_format=self.module.TJPF_BGR, scaling_factor=scaling,
+                                flags=self.fast_dct | self.fast_upsample)
+
+
+CODECS = {'opencv': OpenCvCodec, 'turbojpeg': TurboJpegCodec}
+
+_codec = None
+
+
+def create_codec(name: str = 'auto'):
+    """Кодек по имени; auto - libjpeg-turbo, если доступна, иначе OpenCV"""
+    if name == 'auto':
+        try:
+            return TurboJpegCodec()
+        except Exception:
+            return OpenCvCodec()
+    if name not in CODECS:
+        raise ValueError(f"Неизвестный кодек JPEG: {name}")
+    return CODECS[name]()
+
+
+def get_codec():
+    """Кодек процесса (CAMERA_JPEG_CODEC), создается при первом обращении"""
+    global _codec
+    if _codec is None:
+        name = os.environ.get('CAMERA_JPEG_CODEC', 'auto')
+        try:
+            _codec = create_codec(name)
+        except Exception as e:
+            logger.warning(f"Кодек JPEG {name} недоступен ({e}), используется OpenCV")
+            _codec = OpenCvCodec()
+        logger.info(f"Кодек JPEG: {_codec.name}")
+    return _codec
+
+
+def decode_scaled(data: bytes, width: int, height: Optional[int] = None, codec=None) -> Optional[np.ndarray]:
+    """Декодирование JPEG сразу в уменьшенном размере (DCT масштабирование + resize остатка).
+
+    Если height не задан, сохраняются пропорции кадра.
+    """
+    codec = codec or get_codec()
+    src_width, src_height = jpeg_size(data)
+    if src_width:
+        if height is None:
+            height = max(1, round(src_height * width / src_width))
+        image = codec.decode(data, choose_scale_denom(src_width, src_height, width, height))
+    else:
+        image = codec.decode(data)
+        if image is not None and height is None:
+            height = max(1, round(image.shape[0] * width / image.shape[1]))
+    if image is not None and (image.shape[1], image.shape[0]) != (width, height):
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def jpeg_size(data: bytes):
+    """Размер кадра (ширина, высота) из маркера SOF без декодирования; (0, 0) если не найден"""
+    index = 2
+    length = len(data)
+    while index + 9 < length:
+        if data[index] != 0xFF:
+            index += 1
+            continue
+        marker = data[index + 1]
+        if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            height = (data[index + 5] << 8) | data[index + 6]
+            width = (data[index + 7] << 8) | data[index + 8]
+            return width, height
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            index += 2 if marker != 0xFF else 1
+            continue
+        index += 2 + ((data[index + 2] << 8) | data[index + 3])
+    return 0, 0
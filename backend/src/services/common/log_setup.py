@@ -0,0 +1,254 @@
+"""
+Общая настройка логирования сервисов (camera_service.py, camera_worker.py, service_manager.py).
+
+- Ограничение частоты по ключу сообщения: не больше LOG_RATE_LIMIT записей
+  за LOG_RATE_INTERVAL секунд. Ключ - место вызова (файл и строка) или
+  extra={'log_key': ...}; подавленные записи учитываются, и по окончании окна
+  выводится сводка "подавлено N".
+- Выборка: LOG_SAMPLE="DEBUG=0.1,INFO=0.5" или extra={'sample': 0.01}.
+- Формат: LOG_FORMAT=text (как раньше) или json (одна JSON запись на строку).
+- Неблокирующая запись: записи уходят в ограниченную очередь (LOG_QUEUE_SIZE)
+  и форматируются/пишутся отдельным потоком; при переполнении запись
+  отбрасывается и учитывается, поток захвата или запроса не ждет вывода.
+
+Параметры сообщения лучше передавать аргументами (logger.warning("... %s", value)),
+тогда отброшенные записи не форматируются вовсе.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Стандартные поля LogRecord, которые не попадают в JSON как дополнительные
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class RateLimitFilter(logging.Filter):
+    """Ограничение частоты записей по ключу и выборка по уровню"""
+
+    def __init__(self, limit: int, interval: float, sample: Optional[Dict[int, float]] = None):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.sample = sample or {}
+        self.lock = threading.Lock()
+        self.windows: Dict[tuple, list] = {}  # ключ -> [начало окна, записано, подавлено, логгер, уровень]
+        self.suppressed_total = 0
+        self.sampled_out_total = 0
+
+    @staticmethod
+    def key(record: logging.LogRecord) -> tuple:
+        log_key = getattr(record, 'log_key', None)
+        if log_key is not None:
+            return record.name, log_key
+        return record.name, record.pathname, record.lineno
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'rate_summary', False):
+            return True
+        rate = getattr(record, 'sample', None)
+        if rate is None:
+            rate = self.sample.get(record.levelno)
+        if rate is not None and rate < 1.0 and random.random() >= rate:
+            self.sampled_out_total += 1
+            return False
+        if self.limit <= 0:
+            return True
+
+        key = self.key(record)
+        now = record.created
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self.windows[key] = [now, 1, 0, record.name, record.levelno]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.limit:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed_total += 1
+            return False
+
+    def expired_summaries(self, now: float):
+        """Сводки по окнам, которые закончились с подавленными записями"""
+        summaries = []
+        with self.lock:
+            for key, window in list(self.windows.items()):
+                if now - window[0] < self.interval:
+                    continue
+                del self.windows[key]
+                if window[2]:
+                    summaries.append((key, window[3], window[4], window[2]))
+        return summaries
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не блокирует и не форматирует в вызывающем потоке"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование выполняет поток QueueListener (тот же процесс, запись не сериализуется)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON запись на строку"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_FIELDS and not name.startswith('_'):
+                entry[name] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат сервисов с отметкой о подавленных записях"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed and not getattr(record, 'rate_summary', False):
+            text += f" [ранее подавлено похожих: {suppressed}]"
+        return text
+
+
+_state: Dict[str, object] = {}
+
+
+def _parse_level(name: str) -> Optional[int]:
+    """Уровень по имени (WARNING) или числу (30); None - неизвестный уровень"""
+    name = name.strip().upper()
+    if name.isdigit():
+        return int(name)
+    # Для неизвестного имени getLevelName возвращает строку "Level NAME"
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else None
+
+
+def _parse_sample(spec: str) -> Dict[int, float]:
+    sample = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        level, _, rate = item.partition('=')
+        level = _parse_level(level)
+        if level is None:
+            continue
+        try:
+            sample[level] = float(rate)
+        except ValueError:
+            continue
+    return sample
+
+
+def _emit_summaries(rate_filter: RateLimitFilter, handler: DroppingQueueHandler, now: float):
+    for key, name, level, suppressed in rate_filter.expired_summaries(now):
+        where = key[1] if len(key) == 2 else f"{os.path.basename(key[1])}:{key[2]}"
+        record = logging.LogRecord(name, level, __file__, 0,
+                                   "Подавлено %d похожих сообщений (%s) за %.0f с",
+                                   (suppressed, where, rate_filter.interval), None)
+        record.rate_summary = True
+        record.suppressed = suppressed
+        handler.handle(record)
+
+
+def _summary_loop(rate_filter: RateLimitFilter, handler: DroppingQueueHandler, stop: threading.Event):
+    while not stop.wait(rate_filter.interval):
+        _emit_summaries(rate_filter, handler, time.time())
+
+
+def setup_logging(service: str, level: int = logging.INFO) -> None:
+    """Настройка корневого логгера процесса (повторный вызов ничего не меняет)"""
+    if _state:
+        return
+    level_name = os.environ.get('LOG_LEVEL', '')
+    configured = _parse_level(level_name) if level_name else level
+    invalid_level = configured is None
+    if not invalid_level:
+        level = configured
+    rate_filter = RateLimitFilter(
+        limit=int(os.environ.get('LOG_RATE_LIMIT', 5)),
+        interval=float(os.environ.get('LOG_RATE_INTERVAL', 10.0)),
+        sample=_parse_sample(os.environ.get('LOG_SAMPLE', ''))
+    )
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(rate_filter)
+
+    output = logging.StreamHandler()
+    if os.environ.get('LOG_FORMAT', 'text') == 'json':
+        output.setFormatter(JsonFormatter(service))
+    else:
+        output.setFormatter(TextFormatter(TEXT_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    stop = threading.Event()
+    threading.Thread(target=_summary_loop, args=(rate_filter, queue_handler, stop),
+                     name="log-summary", daemon=True).start()
+
+    def shutdown():
+        stop.set()
+        # Незакрытые окна с подавленными записями - сводкой перед выходом
+        _emit_summaries(rate_filter, queue_handler, float('inf'))
+        listener.stop()
+
+    atexit.register(shutdown)
+    _state.update(service=service, filter=rate_filter, handler=queue_handler, listener=listener)
+    if invalid_level:
+        logging.getLogger(__name__).warning("Неизвестный LOG_LEVEL=%s, используется %s",
+                                            level_name, logging.getLevelName(level))
+
+
+def get_logging_stats() -> Dict[str, int]:
+    """Счетчики подавленных, отброшенных выборкой и потерянных при переполнении записей"""
+    if not _state:
+        return {}
+    rate_filter: RateLimitFilter = _state['filter']
+    handler: DroppingQueueHandler = _state['handler']
+    return {
+        "suppressed": rate_filter.suppressed_total,
+        "sampled_out": rate_filter.sampled_out_total,
+        "dropped": handler.dropped,
+        "queued": handler.queue.qsize()
+    }
@@ -0,0 +1,59 @@
+"""
+Кодирование метки времени в пиксели кадра для измерения задержки "от стекла до стекла".
+
+Метка времени (микросекунды Unix time, 64 бита) рисуется в верхней полосе кадра
+как ряд черно-белых ячеек, старший бит слева. Ячейки крупные и контрастные,
+поэтому метка переживает JPEG сжатие даже с низким качеством и масштабирование.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+TIMESTAMP_BITS = 64
+# Маркер из чередующихся ячеек перед меткой для проверки, что полоса на месте
+MARKER_BITS = (1, 0, 1, 0)
+BAND_HEIGHT_RATIO = 0.06
+
+
+def _cells(width: int):
+    total = len(MARKER_BITS) + TIMESTAMP_BITS
+    cell_width = width / total
+    return total, cell_width
+
+
+def encode_timestamp(image: np.ndarray, timestamp: float) -> np.ndarray:
+    """Нанесение метки времени (секунды) на верхнюю полосу BGR кадра (на месте)"""
+    height, width = image.shape[:2]
+    band_height = max(8, int(height * BAND_HEIGHT_RATIO))
+    value = int(round(timestamp * 1_000_000)) & ((1 << TIMESTAMP_BITS) - 1)
+    bits = list(MARKER_BITS) + [(value >> (TIMESTAMP_BITS - 1 - i)) & 1 for i in range(TIMESTAMP_BITS)]
+    total, cell_width = _cells(width)
+    for index, bit in enumerate(bits):
+        x0 = int(index * cell_width)
+        x1 = int((index + 1) * cell_width)
+        image[:band_height, x0:x1] = 255 if bit else 0
+    return image
+
+
+def decode_timestamp(image: np.ndarray) -> Optional[float]:
+    """Чтение метки времени из кадра; None если полоса не распознана"""
+    if image is None or image.ndim < 2:
+        return None
+    height, width = image.shape[:2]
+    band_height = max(8, int(height * BAND_HEIGHT_RATIO))
+    gray = image if image.ndim == 2 else image.mean(axis=2)
+    total, cell_width = _cells(width)
+    # Берем центр каждой ячейки, чтобы не зависеть от размытия границ
+    y0, y1 = band_height // 4, max(band_height // 4 + 1, band_height * 3 // 4)
+    bits = []
+    for index in range(total):
+        x0 = int(index * cell_width + cell_width * 0.25)
+        x1 = max(x0 + 1, int(index * cell_width + cell_width * 0.75))
+        bits.append(1 if gray[y0:y1, x0:x1].mean() >= 128 else 0)
+    if tuple(bits[:len(MARKER_BITS)]) != MARKER_BITS:
+        return None
+    value = 0
+    for bit in bits[len(MARKER_BITS):]:
+        value = (value << 1) | bit
+    return value / 1_000_000
@@ -0,0 +1,452 @@
+"""
+RTP/JPEG (RFC 2435): отправка JPEG кадров в multicast группу и прием.
+
+Отправитель разбирает baseline JPEG (SOF0, 3 компоненты, 4:2:0 или 4:2:2,
+стандартные таблицы Хаффмана) и передает только энтропийные данные скана;
+таблицы квантования идут в первом фрагменте кадра (Q=255), размер кадра - в
+каждом пакете. Фрагменты нумеруются RTP sequence number, последний пакет кадра
+помечен битом M, метка времени - 90 кГц от времени захвата.
+
+Приемник (RtpJpegReceiver) собирает фрагменты, считает потери и восстанавливает
+полный JPEG (заголовки по RFC 2435, приложение B). Поток совместим со
+стандартными плеерами: ffplay/VLC/GStreamer по SDP (make_sdp).
+
+Пример приема:
+    receiver = RtpJpegReceiver('239.255.42.1', 5004)
+    frame = receiver.receive(timeout=1.0)  # frame.jpeg_data - полный JPEG
+"""
+
+import ipaddress
+import os
+import random
+import select
+import socket
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+RTP_VERSION = 2
+PAYLOAD_TYPE_JPEG = 26
+RTP_CLOCK = 90000
+DEFAULT_MTU = 1400  # Полезная нагрузка UDP пакета, байт
+
+_RTP_HEADER = struct.Struct('!BBHII')
+_JPEG_HEADER = struct.Struct('!I4B')  # type-specific + fragment offset, type, Q, width/8, height/8
+_RESTART_HEADER = struct.Struct('!HH')
+_QTABLE_HEADER = struct.Struct('!BBH')
+
+# Стандартные таблицы Хаффмана (ITU T.81, приложение K.3): длины кодов и символы
+LUM_DC_CODELENS = bytes([0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0])
+LUM_DC_SYMBOLS = bytes(range(12))
+LUM_AC_CODELENS = bytes([0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7d])
+LUM_AC_SYMBOLS = bytes([
+    0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12, 0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+    0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xa1, 0x08, 0x23, 0x42, 0xb1, 0xc1, 0x15, 0x52, 0xd1, 0xf0,
+    0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0a, 0x16, 0x17, 0x18, 0x19, 0x1a, 0x25, 0x26, 0x27, 0x28,
+    0x29, 0x2a, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+    0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+    0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+    0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5, 0xa6, 0xa7,
+    0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3, 0xc4, 0xc5,
+    0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda, 0xe1, 0xe2,
+    0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa
+])
+CHM_DC_CODELENS = bytes([0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0])
+CHM_DC_SYMBOLS = bytes(range(12))
+CHM_AC_CODELENS = bytes([0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77])
+CHM_AC_SYMBOLS = bytes([
+    0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21, 0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+    0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91, 0xa1, 0xb1, 0xc1, 0x09, 0x23, 0x33, 0x52, 0xf0,
+    0x15, 0x62, 0x72, 0xd1, 0x0a, 0x16, 0x24, 0x34, 0xe1, 0x25, 0xf1, 0x17, 0x18, 0x19, 0x1a, 0x26,
+    0x27, 0x28, 0x29, 0x2a, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+    0x49, 0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+    0x69, 0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+    0x88, 0x89, 0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5,
+    0xa6, 0xa7, 0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3,
+    0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda,
+    0xe2, 0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa
+])
+_STANDARD_HUFFMAN = {
+    0x00: LUM_DC_CODELENS + LUM_DC_SYMBOLS,
+    0x10: LUM_AC_CODELENS + LUM_AC_SYMBOLS,
+    0x01: CHM_DC_CODELENS + CHM_DC_SYMBOLS,
+    0x11: CHM_AC_CODELENS + CHM_AC_SYMBOLS,
+}
+
+# Таблицы квантования для Q 1..99 (RFC 2435, приложение A), в порядке зигзага
+LUMA_QUANTIZER = bytes([
+    16, 11, 12, 14, 12, 10, 16, 14, 13, 14, 18, 17, 16, 19, 24, 40,
+    26, 24, 22, 22, 24, 49, 35, 37, 29, 40, 58, 51, 61, 60, 57, 51,
+    56, 55, 64, 72, 92, 78, 64, 68, 87, 69, 55, 56, 80, 109, 81, 87,
+    95, 98, 103, 104, 103, 62, 77, 113, 121, 112, 100, 120, 92, 101, 103, 99
+])
+CHROMA_QUANTIZER = bytes([17, 18, 18, 24, 21, 24, 47, 26, 26, 47, 99, 66, 56, 66, 99, 99] + [99] * 48)
+
+
+class UnsupportedJpeg(ValueError):
+    """JPEG нельзя передать по RFC 2435 (progressive, 4:4:4, оттенки серого, размер не кратен 8...)"""
+
+
+@dataclass
+class JpegScan:
+    """Разобранный JPEG: параметры RFC 2435 и энтропийные данные скана"""
+    jpeg_type: int  # 0 - 4:2:2, 1 - 4:2:0; +64 при интервале рестарта
+    width: int
+    height: int
+    qtables: bytes  # Таблицы квантования яркости и цветности (по 64 байта, зигзаг)
+    restart_interval: int
+    scan: bytes
+
+
+def parse_jpeg(data: bytes) -> JpegScan:
+    """Разбор baseline JPEG для передачи по RFC 2435"""
+    if data[:2] != b'\xff\xd8':
+        raise UnsupportedJpeg("нет маркера SOI")
+    tables: Dict[int, bytes] = {}
+    components: List[Tuple[int, int, int]] = []
+    width = height = restart_interval = 0
+    index = 2
+    length = len(data)
+    while index + 4 <= length:
+        if data[index] != 0xFF:
+            raise UnsupportedJpeg(f"ожидался маркер на смещении {index}")
+        marker = data[index + 1]
+        if marker == 0xFF:
+            index += 1
+            continue
+        segment_length = (data[index + 2] << 8) | data[index + 3]
+        segment = data[index + 4:index + 2 + segment_length]
+        if marker == 0xDB:
+            offset = 0
+            while offset < len(segment):
+                precision, table_id = segment[offset] >> 4, segment[offset] & 0x0F
+                if precision:
+                    raise UnsupportedJpeg("16-битные таблицы квантования")
+                tables[table_id] = bytes(segment[offset + 1:offset + 65])
+                offset += 65
+        elif marker == 0xC0:
+            height = (segment[1] << 8) | segment[2]
+            width = (segment[3] << 8) | segment[4]
+            components = [(segment[6 + i * 3], segment[7 + i * 3], segment[8 + i * 3]) for i in range(segment[5])]
+        elif marker in (0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            raise UnsupportedJpeg("поддерживается только baseline JPEG")
+        elif marker == 0xC4:
+            offset = 0
+            while offset + 17 <= len(segment):
+                count = sum(segment[offset + 1:offset + 17])
+                table = _STANDARD_HUFFMAN.get(segment[offset])
+                if table is None or bytes(segment[offset + 1:offset + 17 + count]) != table:
+                    raise UnsupportedJpeg("нестандартные таблицы Хаффмана (кодирование с optimize)")
+                offset += 17 + count
+        elif marker == 0xDD:
+            restart_interval = (segment[0] << 8) | segment[1]
+        elif marker == 0xDA:
+            scan_start = index + 2 + segment_length
+            scan_end = length - 2 if data[-2:] == b'\xff\xd9' else length
+            break
+        index += 2 + segment_length
+    else:
+        raise UnsupportedJpeg("нет маркера SOS")
+
+    if len(components) != 3:
+        raise UnsupportedJpeg("нужны 3 компоненты цвета")
+    sampling = components[0][1]
+    if sampling == 0x21:
+        jpeg_type = 0
+    elif sampling == 0x22:
+        jpeg_type = 1
+    else:
+        raise UnsupportedJpeg(f"прореживание цветности {sampling:#x} не поддерживается RFC 2435")
+    if components[1][1] != 0x11 or components[2][1] != 0x11:
+        raise UnsupportedJpeg("компоненты цветности должны быть без прореживания 1x1")
+    if width % 8 or height % 8 or width > 2040 or height > 2040:
+        raise UnsupportedJpeg(f"размер {width}x{height} должен быть кратен 8 и не больше 2040")
+    luma, chroma = tables.get(components[0][2]), tables.get(components[1][2])
+    if luma is None or chroma is None:
+        raise UnsupportedJpeg("нет таблиц квантования")
+    if restart_interval:
+        jpeg_type += 64
+    return JpegScan(jpeg_type, width, height, luma + chroma, restart_interval, data[scan_start:scan_end])
+
+
+def packetize(jpeg_data: bytes, seq: int, timestamp: int, ssrc: int, mtu: int = DEFAULT_MTU) -> List[bytes]:
+    """RTP пакеты кадра начиная с номера seq (номера идут подряд по модулю 2^16)"""
+    scan = parse_jpeg(jpeg_data)
+    restart = b''
+    if scan.restart_interval:
+        restart = _RESTART_HEADER.pack(scan.restart_interval, 0xFFFF)  # F=1, L=1, count=0x3FFF
+    qtable = _QTABLE_HEADER.pack(0, 0, len(scan.qtables)) + scan.qtables
+    packets = []
+    offset = 0
+    total = len(scan.scan)
+    while offset < total or not packets:
+        extra = restart + (qtable if offset == 0 else b'')
+        chunk = mtu - _RTP_HEADER.size - _JPEG_HEADER.size - len(extra)
+        if chunk <= 0:
+            raise ValueError(f"MTU {mtu} слишком мал для заголовков RTP/JPEG")
+        payload = scan.scan[offset:offset + chunk]
+        last = offset + len(payload) >= total
+        header = _RTP_HEADER.pack(RTP_VERSION << 6, (0x80 if last else 0) | PAYLOAD_TYPE_JPEG,
+                                  (seq + len(packets)) & 0xFFFF, timestamp & 0xFFFFFFFF, ssrc)
+        jpeg_header = _JPEG_HEADER.pack(offset & 0xFFFFFF, scan.jpeg_type, 255, scan.width // 8, scan.height // 8)
+        packets.append(header + jpeg_header + extra + payload)
+        offset += len(payload)
+    return packets
+
+
+def _quant_tables(q: int) -> bytes:
+    """Таблицы квантования для Q 1..99 (RFC 2435, приложение A)"""
+    q = min(max(q, 1), 99)
+    factor = 5000 // q if q < 50 else 200 - q * 2
+    return bytes(min(max((value * factor + 50) // 100, 1), 255)
+                 for value in LUMA_QUANTIZER + CHROMA_QUANTIZER)
+
+
+def _marker(code: int, body: bytes) -> bytes:
+    return bytes([0xFF, code]) + struct.pack('!H', len(body) + 2) + body
+
+
+def make_headers(jpeg_type: int, width: int, height: int, qtables: bytes, restart_interval: int = 0) -> bytes:
+    """Заголовки JPEG от SOI до SOS для данных скана RFC 2435 (приложение B)"""
+    headers = [b'\xff\xd8']
+    headers.append(_marker(0xDB, b'\x00' + qtables[:64] + b'\x01' + qtables[64:128]))
+    if restart_interval:
+        headers.append(_marker(0xDD, struct.pack('!H', restart_interval)))
+    luma_sampling = 0x21 if jpeg_type & 0x3F == 0 else 0x22
+    headers.append(_marker(0xC0, struct.pack('!BHHB', 8, height, width, 3)
+                           + bytes([0, luma_sampling, 0, 1, 0x11, 1, 2, 0x11, 1])))
+    for table_class, table_id, codelens, symbols in (
+            (0, 0, LUM_DC_CODELENS, LUM_DC_SYMBOLS), (1, 0, LUM_AC_CODELENS, LUM_AC_SYMBOLS),
+            (0, 1, CHM_DC_CODELENS, CHM_DC_SYMBOLS), (1, 1, CHM_AC_CODELENS, CHM_AC_SYMBOLS)):
+        headers.append(_marker(0xC4, bytes([(table_class << 4) | table_id]) + codelens + symbols))
+    headers.append(_marker(0xDA, bytes([3, 0, 0x00, 1, 0x11, 2, 0x11, 0, 63, 0])))
+    return b''.join(headers)
+
+
+@dataclass
+class JpegFrame:
+    """Кадр, собранный из RTP пакетов"""
+    jpeg_data: bytes
+    timestamp: int  # RTP метка времени, 90 кГц
+    ssrc: int
+    width: int
+    height: int
+    packets: int
+    received_at: float
+
+
+class JpegDepacketizer:
+    """Сборка кадров из RTP/JPEG пакетов одного источника с подсчетом потерь"""
+
+    def __init__(self):
+        self.timestamp: Optional[int] = None
+        self.fragments: Dict[int, bytes] = {}
+        self.damaged = False  # В текущем кадре потерян пакет
+        self.qtables: Optional[bytes] = None
+        self.expected_seq: Optional[int] = None
+        self.stats = {"packets": 0, "lost_packets": 0, "frames": 0, "dropped_frames": 0, "bad_packets": 0}
+
+    def _drop_partial(self):
+        if self.fragments or self.damaged:
+            self.stats["dropped_frames"] += 1
+        self.fragments = {}
+        self.damaged = False
+
+    def push(self, packet: bytes) -> Optional[JpegFrame]:
+        """Добавление пакета; возвращает кадр, когда пришел его последний фрагмент"""
+        if len(packet) < _RTP_HEADER.size + _JPEG_HEADER.size or packet[0] >> 6 != RTP_VERSION:
+            self.stats["bad_packets"] += 1
+            return None
+        first, second, seq, timestamp, ssrc = _RTP_HEADER.unpack_from(packet)
+        if second & 0x7F != PAYLOAD_TYPE_JPEG:
+            self.stats["bad_packets"] += 1
+            return None
+        self.stats["packets"] += 1
+        lost = 0
+        if self.expected_seq is not None and seq != self.expected_seq:
+            lost = (seq - self.expected_seq) & 0xFFFF
+            if lost >= 0x8000:
+                return None  # Опоздавший или повторный пакет
+            self.stats["lost_packets"] += lost
+        self.expected_seq = (seq + 1) & 0xFFFF
+
+        index = _RTP_HEADER.size + 4 * (first & 0x0F)
+        if first & 0x10:
+            index += 4 + 4 * struct.unpack_from('!H', packet, index + 2)[0]
+        end = len(packet) - (packet[-1] if first & 0x20 else 0)
+        type_offset, jpeg_type, q, width, height = _JPEG_HEADER.unpack_from(packet, index)
+        offset = type_offset & 0xFFFFFF
+        index += _JPEG_HEADER.size
+        restart_interval = 0
+        if jpeg_type >= 64:
+            restart_interval = _RESTART_HEADER.unpack_from(packet, index)[0]
+            index += _RESTART_HEADER.size
+        if q >= 128 and offset == 0:
+            _, _, table_length = _QTABLE_HEADER.unpack_from(packet, index)
+            index += _QTABLE_HEADER.size
+            if table_length:
+                self.qtables = bytes(packet[index:index + table_length])
+            index += table_length
+
+        if timestamp != self.timestamp:
+            self._drop_partial()
+            self.timestamp = timestamp
+        if lost and (offset or self.fragments):
+            # Потерянные пакеты относились к этому кадру
+            self.damaged = True
+        self.fragments[offset] = bytes(packet[index:end])
+        if not second & 0x80:
+            return None
+        if self.damaged:
+            self._drop_partial()
+            return None
+
+        fragments, self.fragments = self.fragments, {}
+        scan = b''
+        for fragment_offset in sorted(fragments):
+            if fragment_offset != len(scan):
+                self.stats["dropped_frames"] += 1
+                return None
+            scan += fragments[fragment_offset]
+        qtables = self.qtables if q >= 128 else _quant_tables(q)
+        if qtables is None or len(qtables) < 128:
+            self.stats["dropped_frames"] += 1
+            return None
+        self.stats["frames"] += 1
+        return JpegFrame(
+            jpeg_data=make_headers(jpeg_type, width * 8, height * 8, qtables, restart_interval) + scan + b'\xff\xd9',
+            timestamp=timestamp,
+            ssrc=ssrc,
+            width=width * 8,
+            height=height * 8,
+            packets=len(fragments),
+            received_at=time.time()
+        )
+
+
+def is_multicast(address: str) -> bool:
+    try:
+        return ipaddress.ip_address(address).is_multicast
+    except ValueError:
+        return False
+
+
+class RtpJpegSender:
+    """Отправка JPEG кадров в multicast группу (или на unicast адрес) по RFC 2435"""
+
+    def __init__(self, group: str, port: int, ttl: int = 1, mtu: int = DEFAULT_MTU,
+                 interface: str = '', loop: bool = True):
+        self.address = (group, port)
+        self.mtu = mtu
+        self.ssrc = random.getrandbits(32)
+        self.seq = random.getrandbits(16)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        if is_multicast(group):
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if loop else 0)
+            if interface:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        self.stats = {"frames": 0, "packets": 0, "bytes": 0, "send_errors": 0}
+
+    def send(self, jpeg_data: bytes, capture_ts: Optional[float] = None) -> int:
+        """Отправка кадра; число пакетов. UnsupportedJpeg - кадр нельзя передать по RFC 2435"""
+        timestamp = int((capture_ts if capture_ts else time.time()) * RTP_CLOCK)
+        packets = packetize(jpeg_data, self.seq, timestamp, self.ssrc, self.mtu)
+        self.seq = (self.seq + len(packets)) & 0xFFFF
+        for packet in packets:
+            try:
+                self.sock.sendto(packet, self.address)
+                self.stats["bytes"] += len(packet)
+            except OSError:
+                self.stats["send_errors"] += 1
+        self.stats["frames"] += 1
+        self.stats["packets"] += len(packets)
+        return len(packets)
+
+    def close(self):
+        self.sock.close()
+
+
+class RtpJpegReceiver:
+    """Прием RTP/JPEG из multicast группы (или на unicast порт) с восстановлением полных JPEG"""
+
+    def __init__(self, group: str, port: int, interface: str = '0.0.0.0'):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        # Несколько приемников на одном хосте (например, несколько окон просмотра)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.membership = None
+        if is_multicast(group):
+            # Привязка к адресу группы: сокет не получает чужие потоки на этот же порт
+            self.sock.bind((group if os.name != 'nt' else '', port))
+            self.membership = socket.inet_aton(group) + socket.inet_aton(interface)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self.membership)
+        else:
+            self.sock.bind((group, port))
+        self.depacketizers: Dict[int, JpegDepacketizer] = {}  # SSRC -> сборщик
+
+    def receive(self, timeout: Optional[float] = None) -> Optional[JpegFrame]:
+        """Следующий полностью принятый кадр; None по таймауту"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            readable, _, _ = select.select([self.sock], [], [], remaining)
+            if not readable:
+                return None
+            packet = self.sock.recv(65536)
+            if len(packet) < _RTP_HEADER.size:
+                continue
+            ssrc = _RTP_HEADER.unpack_from(packet)[4]
+            depacketizer = self.depacketizers.get(ssrc)
+            if depacketizer is None:
+                depacketizer = self.depacketizers[ssrc] = JpegDepacketizer()
+            frame = depacketizer.push(packet)
+            if frame is not None:
+                return frame
+
+    def frames(self, timeout: Optional[float] = None):
+        """Генератор кадров; завершается, если за timeout не пришло ни одного"""
+        while True:
+            frame = self.receive(timeout)
+            if frame is None:
+                return
+            yield frame
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        totals = {"packets": 0, "lost_packets": 0, "frames": 0, "dropped_frames": 0, "bad_packets": 0}
+        for depacketizer in self.depacketizers.values():
+            for name, value in depacketizer.stats.items():
+                totals[name] += value
+        return totals
+
+    def close(self):
+        if self.membership is not None:
+            try:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, self.membership)
+            except OSError:
+                pass
+        self.sock.close()
+
+
+def make_sdp(group: str, port: int, name: str = 'camera', ttl: int = 1, source: str = '0.0.0.0') -> str:
+    """SDP описание потока для ffplay/VLC (ffplay -protocol_whitelist file,udp,rtp stream.sdp)"""
+    connection = f"IN IP4 {group}/{ttl}" if is_multicast(group) else f"IN IP4 {group}"
+    return (
+        "v=0\r\n"
+        f"o=- {int(time.time())} 1 IN IP4 {source}\r\n"
+        f"s={name}\r\n"
+        f"c={connection}\r\n"
+        "t=0 0\r\n"
+        f"m=video {port} RTP/AVP {PAYLOAD_TYPE_JPEG}\r\n"
+        f"a=rtpmap:{PAYLOAD_TYPE_JPEG} JPEG/{RTP_CLOCK}\r\n"
+        "a=recvonly\r\n"
+    )
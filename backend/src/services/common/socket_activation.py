@@ -0,0 +1,82 @@
+"""
+Передача слушающих сокетов от сервис-менеджера сервисам (соглашение LISTEN_FDS).
+
+Менеджер один раз открывает объявленные в манифесте сокеты ("listen") и держит
+их открытыми между перезапусками сервиса. Дочерний процесс получает их
+начиная с дескриптора 3: LISTEN_FDS - число сокетов, LISTEN_PID - PID
+процесса, которому они предназначены, LISTEN_FDNAMES - имена через ':'.
+Пока сервис перезапускается, новые соединения ждут в очереди ядра (backlog)
+вместо отказа в соединении.
+
+Сторона сервиса:
+    sockets = listen_sockets()
+    if sockets:
+        uvicorn.Server(uvicorn.Config(app)).run(sockets=sockets)
+
+Сторона менеджера - запуск через этот модуль как обертку, которая ставит
+сокеты на места 3, 4, ... и задает LISTEN_PID перед exec:
+    python socket_activation.py 7,8 -- python camera_service.py
+"""
+
+import fcntl
+import os
+import socket
+import sys
+from typing import List
+
+LISTEN_FDS_START = 3
+
+
+def listen_sockets(unset_environment: bool = True) -> List[socket.socket]:
+    """Унаследованные слушающие сокеты процесса (пустой список - сокеты не переданы)
+
+    Переменные окружения по умолчанию удаляются, чтобы их не унаследовали
+    дочерние процессы сервиса (ffmpeg, воркеры).
+    """
+    try:
+        count = int(os.environ.get('LISTEN_FDS', 0))
+        pid = int(os.environ.get('LISTEN_PID', os.getpid()))
+    except ValueError:
+        count, pid = 0, 0
+    if unset_environment:
+        for name in ('LISTEN_FDS', 'LISTEN_PID', 'LISTEN_FDNAMES'):
+            os.environ.pop(name, None)
+    if pid != os.getpid():
+        return []
+    sockets = []
+    for fd in range(LISTEN_FDS_START, LISTEN_FDS_START + count):
+        sock = socket.socket(fileno=fd)
+        sock.set_inheritable(False)
+        sockets.append(sock)
+    return sockets
+
+
+def wrapper_command(fds: List[int], command: List[str], names: List[str] = None) -> List[str]:
+    """Команда запуска command с сокетами fds через обертку (для менеджера)"""
+    argv = [sys.executable, os.path.abspath(__file__), ','.join(str(fd) for fd in fds)]
+    if names:
+        argv.append('--names=' + ':'.join(names))
+    return argv + ['--'] + list(command)
+
+
+def _exec_with_sockets(argv: List[str]):
+    """Обертка: дескрипторы на места 3, 4, ..., LISTEN_* в окружение, exec команды"""
+    fds = [int(fd) for fd in argv[0].split(',') if fd]
+    names = argv[1][len('--names='):] if argv[1].startswith('--names=') else None
+    command = argv[argv.index('--') + 1:]
+    # Сначала копии выше целевого диапазона: исходный номер может совпасть с целевым
+    copies = [fcntl.fcntl(fd, fcntl.F_DUPFD, LISTEN_FDS_START + len(fds)) for fd in fds]
+    for fd in fds:
+        os.close(fd)
+    for index, copy in enumerate(copies):
+        os.dup2(copy, LISTEN_FDS_START + index, inheritable=True)
+        os.close(copy)
+    os.environ['LISTEN_FDS'] = str(len(fds))
+    os.environ['LISTEN_PID'] = str(os.getpid())
+    if names:
+        os.environ['LISTEN_FDNAMES'] = names
+    os.execvp(command[0], command)
+
+
+if __name__ == '__main__':
+    _exec_with_sockets(sys.argv[1:])
@@ -0,0 +1,487 @@
+"""
+Лимиты раздачи стримов: допуск (число одновременных стримов, приоритет оператора)
+и распределение бюджета исходящего трафика между зрителями.
+
+Используются сервисом камер и раздающими воркерами (camera_worker.py) с одними и
+теми же переменными окружения. Воркеры - отдельные процессы, поэтому их счетчики
+стримов сводятся в общей таблице (WorkerStreamTable, файл в /dev/shm): лимиты
+действуют на весь пул воркеров, а бюджет трафика делится между процессами
+пропорционально числу их зрителей.
+"""
+
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Общий бюджет исходящего трафика всех зрителей (байт/с, 0 - без ограничения)
+EGRESS_BUDGET_BPS = int(os.environ.get('CAMERA_EGRESS_BUDGET', 0))
+EGRESS_REBALANCE_INTERVAL = 1.0
+EGRESS_MIN_FPS = 2
+EGRESS_MIN_QUALITY = 10
+EGRESS_QUALITY_STEP = 10
+EGRESS_PRIORITIES = ("operator", "observer")  # Классы в порядке приоритета
+
+# Допуск стримов: лимиты одновременных стримов (0 - без ограничения), токены оператора
+ADMISSION_MAX_STREAMS = int(os.environ.get('CAMERA_MAX_STREAMS', 0))
+ADMISSION_MAX_STREAMS_PER_CAMERA = int(os.environ.get('CAMERA_MAX_STREAMS_PER_CAMERA', 0))
+# Токены оператора через запятую; priority=operator требует token/X-Operator-Token,
+# без настроенных токенов оператора нет - такие запросы допускаются как наблюдатели,
+# а служебные эндпоинты (профилирование, multicast) закрыты
+OPERATOR_TOKENS = {token.strip() for token in os.environ.get('CAMERA_OPERATOR_TOKENS', '').split(',') if token.strip()}
+# Что делать с лишними зрителями: reject - 503 с Retry-After, degrade - профиль низкого качества
+ADMISSION_OVERFLOW = os.environ.get('CAMERA_ADMISSION_OVERFLOW', 'reject')
+ADMISSION_MAX_DEGRADED = int(os.environ.get('CAMERA_MAX_DEGRADED_STREAMS', 20))
+ADMISSION_RETRY_AFTER = int(os.environ.get('CAMERA_RETRY_AFTER', 5))
+
+# Относительный размер JPEG кадра в зависимости от качества (грубая модель, уточняется замерами)
+JPEG_SIZE_MODEL = [(5, 0.12), (10, 0.18), (20, 0.27), (30, 0.34), (40, 0.40), (50, 0.45),
+                   (60, 0.52), (70, 0.62), (80, 0.78), (85, 0.90), (90, 1.0), (95, 1.35), (100, 2.2)]
+
+# Таблица стримов воркеров: строка на процесс - pid, стримы и деградированные стримы по камерам
+WORKER_TABLE_ROWS = 64
+WORKER_TABLE_CAMERAS = 64
+
+logger = logging.getLogger(__name__)
+
+
+def jpeg_size_factor(quality: int) -> float:
+    """Относительный размер JPEG для качества (линейная интерполяция модели)"""
+    points = JPEG_SIZE_MODEL
+    if quality <= points[0][0]:
+        return points[0][1]
+    for (q0, f0), (q1, f1) in zip(points, points[1:]):
+        if quality <= q1:
+            return f0 + (f1 - f0) * (quality - q0) / (q1 - q0)
+    return points[-1][1]
+
+
+class EgressClient:
+    """Зритель в планировщике исходящего трафика"""
+
+    def __init__(self, client_id: int, camera_id: int, priority: str, fps: int, quality: int):
+        self.id = client_id
+        self.camera_id = camera_id
+        self.priority = priority
+        self.requested_fps = fps
+        self.requested_quality = quality
+        self.allowed_fps = float(fps)
+        self.allowed_quality = quality
+        self.rate_bps: Optional[float] = None  # None - без ограничения
+        self.frame_size = 0.0  # EWMA размера кадра в байтах
+        self.frame_size_quality = quality  # Качество, при котором замерен frame_size
+        self.tokens = 0.0
+        self.last_refill = time.monotonic()
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.throttled_seconds = 0.0
+        self.connected_at = time.time()
+
+    def estimate_size(self, quality: int) -> float:
+        """Оценка размера кадра при заданном качестве по замеренному размеру"""
+        if self.frame_size <= 0:
+            return 0.0
+        return self.frame_size * jpeg_size_factor(quality) / jpeg_size_factor(self.frame_size_quality)
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(1e-3, time.time() - self.connected_at)
+        return {
+            "id": self.id,
+            "camera_id": self.camera_id,
+            "priority": self.priority,
+            "requested": {"fps": self.requested_fps, "quality": self.requested_quality},
+            "allowed": {"fps": round(self.allowed_fps, 2), "quality": self.allowed_quality},
+            "rate_bps": None if self.rate_bps is None else int(self.rate_bps),
+            "mean_frame_bytes": int(self.frame_size),
+            "bytes_sent": self.bytes_sent,
+            "frames_sent": self.frames_sent,
+            "avg_bps": int(self.bytes_sent / elapsed),
+            "throttled_seconds": round(self.throttled_seconds, 3)
+        }
+
+
+class EgressScheduler:
+    """Распределение общего бюджета исходящего трафика между зрителями.
+
+    Классы приоритета обслуживаются строго по порядку (оператор, затем наблюдатели),
+    внутри класса бюджет делится по max-min справедливости. Доля зрителя переводится
+    в FPS, а если FPS падает ниже минимума - в снижение качества JPEG.
+    """
+
+    def __init__(self, budget_bps: int = 0):
+        self.budget_bps = budget_bps
+        self.clients: Dict[int, EgressClient] = {}
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.last_rebalance = 0.0
+        self.last_decision: Dict[str, Any] = {}
+
+    def register(self, camera_id: int, priority: str, fps: int, quality: int) -> EgressClient:
+        if priority not in EGRESS_PRIORITIES:
+            priority = "observer"
+        with self.lock:
+            client = EgressClient(self.next_id, camera_id, priority, fps, quality)
+            self.next_id += 1
+            self.clients[client.id] = client
+            self._rebalance()
+        return client
+
+    def unregister(self, client: EgressClient):
+        with self.lock:
+            if self.clients.pop(client.id, None) is not None:
+                self._rebalance()
+
+    def set_budget(self, budget_bps: int):
+        with self.lock:
+            self.budget_bps = max(0, budget_bps)
+            self._rebalance()
+
+    def record_frame(self, client: EgressClient, nbytes: int, quality: int):
+        """Учет отправленного кадра: обновление замера размера кадра"""
+        with self.lock:
+            if client.frame_size <= 0 or quality != client.frame_size_quality:
+                client.frame_size = float(nbytes)
+                client.frame_size_quality = quality
+            else:
+                client.frame_size = 0.8 * client.frame_size + 0.2 * nbytes
+            client.bytes_sent += nbytes
+            client.frames_sent += 1
+            if time.monotonic() - self.last_rebalance >= EGRESS_REBALANCE_INTERVAL:
+                self._rebalance()
+
+    async def throttle(self, client: EgressClient, nbytes: int):
+        """Ограничение скорости отправки зрителя (token bucket с его долей бюджета)"""
+        rate = client.rate_bps
+        if rate is None:
+            return
+        rate = max(rate, 1.0)
+        now = time.monotonic()
+        # Ведро вмещает не более одной секунды трафика
+        client.tokens = min(rate, client.tokens + (now - client.last_refill) * rate)
+        client.last_refill = now
+        if client.tokens < nbytes:
+            # Ограничиваем паузу, чтобы быстрее подхватить новое распределение
+            delay = min(EGRESS_REBALANCE_INTERVAL * 2, (nbytes - client.tokens) / rate)
+            client.throttled_seconds += delay
+            await asyncio.sleep(delay)
+            client.last_refill = time.monotonic()
+            client.tokens = 0.0
+        else:
+            client.tokens -= nbytes
+
+    def _fit(self, client: EgressClient, share: float):
+        """Перевод доли бюджета в FPS и качество"""
+        client.rate_bps = share
+        quality = client.requested_quality
+        size = client.estimate_size(quality)
+        if size <= 0:
+            # Размер еще не замерен - отдаем запрошенное, ограничение скорости сработает на отправке
+            client.allowed_fps = float(client.requested_fps)
+            client.allowed_quality = quality
+            return
+        fps = min(client.requested_fps, share / size)
+        while fps < EGRESS_MIN_FPS and quality > EGRESS_MIN_QUALITY:
+            quality = max(EGRESS_MIN_QUALITY, quality - EGRESS_QUALITY_STEP)
+            fps = min(client.requested_fps, share / max(1.0, client.estimate_size(quality)))
+        client.allowed_fps = max(min(EGRESS_MIN_FPS, client.requested_fps), fps)
+        client.allowed_quality = quality
+
+    def _rebalance(self):
+        """Пересчет распределения (вызывается под self.lock)"""
+        self.last_rebalance = time.monotonic()
+        clients = list(self.clients.values())
+        if self.budget_bps <= 0:
+            for client in clients:
+                client.rate_bps = None
+                client.allowed_fps = float(client.requested_fps)
+                client.allowed_quality = client.requested_quality
+            self.last_decision = {"budget_bps": 0, "allocated_bps": None}
+            return
+
+        # Гарантированный минимум каждому зрителю (минимальные FPS и качество),
+        # чтобы наблюдатели не останавливались полностью при перегрузке
+        floors = {}
+        for client in clients:
+            size = client.estimate_size(EGRESS_MIN_QUALITY)
+            if size > 0:
+                floors[client.id] = min(client.requested_fps, EGRESS_MIN_FPS) * size
+            else:
+                floors[client.id] = self.budget_bps / (4.0 * len(clients))
+        total_floor = sum(floors.values())
+        if total_floor > self.budget_bps:
+            scale = self.budget_bps / total_floor
+            floors = {client_id: floor * scale for client_id, floor in floors.items()}
+            total_floor = float(self.budget_bps)
+
+        remaining = self.budget_bps - total_floor
+        allocated = dict(floors)
+        for priority in EGRESS_PRIORITIES:
+            group = [c for c in clients if c.priority == priority]
+            if not group:
+                continue
+            # Потребность сверх минимума при запрошенных FPS и качестве (незамеренным - равная доля)
+            demands = {}
+            for client in group:
+                size = client.estimate_size(client.requested_quality)
+                demand = client.requested_fps * size if size > 0 else remaining / len(group)
+                demands[client.id] = max(0.0, demand - floors[client.id])
+            # Max-min справедливое распределение (water-filling)
+            pending = sorted(group, key=lambda c: demands[c.id])
+            group_budget = remaining
+            while pending:
+                fair = group_budget / len(pending)
+                client = pending.pop(0)
+                share = min(demands[client.id], fair)
+                allocated[client.id] += share
+                group_budget -= share
+            remaining = max(0.0, group_budget)
+
+        # Неизрасходованный остаток делим между всеми, чтобы не простаивал
+        bonus = remaining / len(clients) if clients else 0.0
+        for client in clients:
+            self._fit(client, allocated[client.id] + bonus)
+        self.last_decision = {
+            "budget_bps": self.budget_bps,
+            "allocated_bps": int(sum(allocated.values())),
+            "unallocated_bps": int(remaining),
+            "timestamp": time.time()
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "budget_bps": self.budget_bps,
+                "priorities": list(EGRESS_PRIORITIES),
+                "decision": dict(self.last_decision),
+                "clients": [client.snapshot() for client in self.clients.values()]
+            }
+
+
+class AdmissionTicket:
+    """Разрешение на стрим; освобождается явно или при сборке мусора генератора стрима"""
+
+    def __init__(self, controller: 'AdmissionController', camera_id: int, priority: str, degraded: bool):
+        self.controller = controller
+        self.camera_id = camera_id
+        self.priority = priority
+        self.degraded = degraded
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+    def __del__(self):
+        self.release()
+
+
+class AdmissionController:
+    """Лимиты одновременных стримов (общий и на камеру).
+
+    Оператор допускается всегда, но занимает место в лимитах. Наблюдатель сверх
+    лимита получает отказ или, в режиме degrade, стрим профиля низкого качества
+    (отдельный лимит деградированных стримов).
+    """
+
+    def __init__(self, max_streams: int, max_per_camera: int, overflow: str, max_degraded: int):
+        self.max_streams = max_streams
+        self.max_per_camera = max_per_camera
+        self.overflow = overflow
+        self.max_degraded = max_degraded
+        self.lock = threading.Lock()
+        self.active: Dict[int, int] = {}  # камера -> полноценные стримы
+        self.degraded: Dict[int, int] = {}  # камера -> деградированные стримы
+        self.counters = {"admitted": 0, "degraded": 0, "rejected": 0, "operator": 0}
+        self.rejected_by_camera: Dict[int, int] = {}
+
+    def _streams(self, counts: Dict[int, int], camera_id: Optional[int] = None) -> int:
+        """Занятые места: на камере или всего (camera_id=None)"""
+        return sum(counts.values()) if camera_id is None else counts.get(camera_id, 0)
+
+    def _has_capacity(self, camera_id: int) -> bool:
+        if self.max_streams and self._streams(self.active) >= self.max_streams:
+            return False
+        if self.max_per_camera and self._streams(self.active, camera_id) >= self.max_per_camera:
+            return False
+        return True
+
+    def admit(self, camera_id: int, priority: str) -> Optional[AdmissionTicket]:
+        """Допуск стрима; None - отказ"""
+        with self.lock:
+            if priority == "operator" or self._has_capacity(camera_id):
+                self.active[camera_id] = self.active.get(camera_id, 0) + 1
+                self.counters["admitted"] += 1
+                if priority == "operator":
+                    self.counters["operator"] += 1
+                return AdmissionTicket(self, camera_id, priority, degraded=False)
+            if self.overflow == "degrade" and self._streams(self.degraded) < self.max_degraded:
+                self.degraded[camera_id] = self.degraded.get(camera_id, 0) + 1
+                self.counters["degraded"] += 1
+                return AdmissionTicket(self, camera_id, priority, degraded=True)
+            self.counters["rejected"] += 1
+            self.rejected_by_camera[camera_id] = self.rejected_by_camera.get(camera_id, 0) + 1
+            return None
+
+    def _release(self, ticket: AdmissionTicket):
+        counts = self.degraded if ticket.degraded else self.active
+        with self.lock:
+            counts[ticket.camera_id] = max(0, counts.get(ticket.camera_id, 0) - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "max_streams": self.max_streams,
+                "max_streams_per_camera": self.max_per_camera,
+                "overflow": self.overflow,
+                "max_degraded": self.max_degraded,
+                "active": {str(camera_id): count for camera_id, count in self.active.items() if count},
+                "active_degraded": {str(camera_id): count for camera_id, count in self.degraded.items() if count},
+                "rejected_by_camera": {str(camera_id): count for camera_id, count in self.rejected_by_camera.items()},
+                **self.counters
+            }
+
+
+def resolve_priority(priority: str, token: Optional[str]) -> str:
+    """Приоритет оператора только с действительным токеном; без настроенных токенов - наблюдатель
+
+    Оператор допускается сверх лимитов стримов, поэтому без токенов priority=operator
+    не должен обходить лимиты.
+    """
+    if priority == "operator" and token not in OPERATOR_TOKENS:
+        logger.warning("Запрос приоритета оператора без действительного токена, стрим будет наблюдательским",
+                       extra={"log_key": "operator_token"})
+        return "observer"
+    return priority if priority in EGRESS_PRIORITIES else "observer"
+
+
+class WorkerStreamTable:
+    """Счетчики стримов процессов-воркеров в общем файле (обычно в /dev/shm)
+
+    Каждый процесс пишет только свою строку; суммы читаются под flock. Строки
+    завершившихся процессов не учитываются, поэтому стримы упавшего воркера
+    не занимают лимиты.
+    """
+
+    COLUMNS = 1 + 2 * WORKER_TABLE_CAMERAS
+
+    def __init__(self, path: str, pid: Optional[int] = None):
+        self.path = path
+        self.pid = pid or os.getpid()
+        self.fd = os.open(path, os.O_RDWR)
+        self.map = mmap.mmap(self.fd, self.size())
+        self.rows = np.frombuffer(self.map, dtype=np.int64).reshape(WORKER_TABLE_ROWS, self.COLUMNS)
+        self.row = self._claim()
+
+    @classmethod
+    def size(cls) -> int:
+        return WORKER_TABLE_ROWS * cls.COLUMNS * 8
+
+    @classmethod
+    def create(cls, path: str):
+        """Пустая таблица (создает родительский процесс пула до запуска воркеров)"""
+        with open(path, 'wb') as f:
+            f.truncate(cls.size())
+
+    @contextmanager
+    def locked(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _alive(self, pid: int) -> bool:
+        if pid == self.pid:
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _claim(self) -> int:
+        with self.locked():
+            for index, row in enumerate(self.rows):
+                pid = int(row[0])
+                if pid == 0 or pid == self.pid or not self._alive(pid):
+                    row[:] = 0
+                    row[0] = self.pid
+                    return index
+        raise RuntimeError(f"{self.path}: нет свободной строки для воркера (предел {WORKER_TABLE_ROWS})")
+
+    def others(self) -> np.ndarray:
+        """Суммы стримов других живых воркеров: [стримы по камерам..., деградированные по камерам...]"""
+        rows = [row[1:] for index, row in enumerate(self.rows)
+                if index != self.row and row[0] and self._alive(int(row[0]))]
+        return np.sum(rows, axis=0) if rows else np.zeros(self.COLUMNS - 1, dtype=np.int64)
+
+    def publish(self, active: Dict[int, int], degraded: Dict[int, int]):
+        """Запись своих счетчиков (под locked())"""
+        row = self.rows[self.row]
+        row[1:] = 0
+        for camera_id, count in active.items():
+            row[1 + camera_id] = count
+        for camera_id, count in degraded.items():
+            row[1 + WORKER_TABLE_CAMERAS + camera_id] = count
+
+    def client_share(self) -> Tuple[int, int]:
+        """(стримы этого процесса, стримы всего пула) - для доли бюджета трафика"""
+        with self.locked():
+            own = int(self.rows[self.row][1:].sum())
+            return own, own + int(self.others().sum())
+
+    def close(self):
+        with self.locked():
+            self.rows[self.row] = 0
+        del self.rows
+        self.map.close()
+        os.close(self.fd)
+
+
+class SharedAdmissionController(AdmissionController):
+    """Лимиты стримов на весь пул воркеров: к своим счетчикам добавляются счетчики других процессов"""
+
+    def __init__(self, table: WorkerStreamTable, max_streams: int, max_per_camera: int, overflow: str,
+                 max_degraded: int):
+        super().__init__(max_streams, max_per_camera, overflow, max_degraded)
+        self.table = table
+        self.others = np.zeros(WorkerStreamTable.COLUMNS - 1, dtype=np.int64)
+
+    def _streams(self, counts: Dict[int, int], camera_id: Optional[int] = None) -> int:
+        offset = WORKER_TABLE_CAMERAS if counts is self.degraded else 0
+        if camera_id is None:
+            shared = self.others[offset:offset + WORKER_TABLE_CAMERAS].sum()
+        else:
+            shared = self.others[offset + camera_id]
+        return super()._streams(counts, camera_id) + int(shared)
+
+    def admit(self, camera_id: int, priority: str) -> Optional[AdmissionTicket]:
+        if not 0 <= camera_id < WORKER_TABLE_CAMERAS:
+            raise ValueError(f"camera_id должен быть в диапазоне 0..{WORKER_TABLE_CAMERAS - 1}")
+        with self.table.locked():
+            self.others = self.table.others()
+            ticket = super().admit(camera_id, priority)
+            self.table.publish(self.active, self.degraded)
+        return ticket
+
+    def _release(self, ticket: AdmissionTicket):
+        with self.table.locked():
+            super()._release(ticket)
+            self.table.publish(self.active, self.degraded)
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = super().snapshot()
+        own, total = self.table.client_share()
+        snapshot["pool_streams"] = total
+        snapshot["own_streams"] = own
+        return snapshot
@@ -0,0 +1,14 @@
+"""
+Юнит-тесты backend: service_manager.py и модули src/services импортируются напрямую.
+
+Запуск из директории backend:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, 'src', 'services')]
+# Сводки подавленных записей пишутся при выходе, когда вывод pytest уже закрыт
+os.environ.setdefault('LOG_RATE_LIMIT', '0')
@@ -0,0 +1,148 @@
+"""Бюджет падений в скользящем окне и задержка перезапуска (ServiceManager._on_child_exit)"""
+
+import time
+
+import pytest
+
+import service_manager
+from service_manager import (SERVICE_BACKOFF_BASE, SERVICE_BACKOFF_JITTER, SERVICE_BACKOFF_MAX,
+                             SERVICE_RESTART_WINDOW, SERVICE_STABLE_AFTER, ServiceInfo, ServiceManager,
+                             load_manifest)
+
+
+class FakeProcess:
+    def __init__(self, pid: int):
+        self.pid = pid
+
+
+class FakeHeartbeats:
+    def forget(self, process):
+        pass
+
+
+class FakeLoop:
+    """Отложенные вызовы записываются, а не выполняются"""
+
+    def __init__(self):
+        self.delays = []
+
+    def call_later(self, delay, callback, *args):
+        self.delays.append(delay)
+        return object()
+
+
+@pytest.fixture
+def manager():
+    # Без __init__: потоки надзора, сокет пульса и API менеджера тестам не нужны
+    manager = ServiceManager.__new__(ServiceManager)
+    manager.services = {}
+    manager.logs = {}
+    manager.is_running = True
+    manager.heartbeats = FakeHeartbeats()
+    manager.loop = FakeLoop()
+    return manager
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(service_manager.random, 'uniform', lambda low, high: low)
+
+
+def crash(manager: ServiceManager, service: ServiceInfo, uptime: float = 1.0, returncode: int = 1) -> float:
+    """Запуск и падение сервиса через uptime секунд; возвращает назначенную задержку перезапуска"""
+    process = FakeProcess(1000 + len(manager.loop.delays))
+    service.process = process
+    service.pid = process.pid
+    service.is_running = True
+    service.state = 'ready'
+    service.restart_handle = None
+    service.started_monotonic = time.monotonic() - uptime
+    before = len(manager.loop.delays)
+    manager._on_child_exit(process, returncode, time.time())
+    return manager.loop.delays[-1] if len(manager.loop.delays) > before else None
+
+
+def add_service(manager: ServiceManager, max_restarts: int = 5) -> ServiceInfo:
+    service = ServiceInfo(name='camera_service', file_path='camera_service.py', max_restarts=max_restarts)
+    manager.services[service.name] = service
+    return service
+
+
+def test_first_crash_restarts_immediately(manager):
+    service = add_service(manager)
+    assert crash(manager, service) == 0.0
+    assert service.state == 'exited'
+    assert service.crash_streak == 1
+    assert not service.is_running and service.process is None
+
+
+def test_streak_backs_off_exponentially(manager, no_jitter):
+    service = add_service(manager, max_restarts=100)
+    delays = [crash(manager, service) for _ in range(5)]
+    assert delays == [0.0] + [SERVICE_BACKOFF_BASE * 2 ** n for n in range(4)]
+    assert service.state == 'backoff'
+
+
+def test_stable_run_resets_streak(manager, no_jitter):
+    service = add_service(manager, max_restarts=100)
+    for _ in range(3):
+        crash(manager, service)
+    assert crash(manager, service, uptime=SERVICE_STABLE_AFTER) == 0.0
+    assert service.crash_streak == 1
+
+
+def test_budget_waits_for_oldest_failure(manager, no_jitter):
+    service = add_service(manager, max_restarts=2)
+    for _ in range(2):
+        crash(manager, service)
+    delay = crash(manager, service)
+    # Третье падение за окно: ждем, пока первое выйдет из окна
+    assert delay == pytest.approx(SERVICE_RESTART_WINDOW, abs=1.0)
+    assert len(service.failures) == 3
+
+
+def test_old_failures_leave_window(manager, no_jitter):
+    service = add_service(manager, max_restarts=2)
+    service.failures.extend([time.monotonic() - SERVICE_RESTART_WINDOW - 10] * 2)
+    assert crash(manager, service) == 0.0
+    assert len(service.failures) == 1
+
+
+def test_manifest_window(manager, tmp_path, no_jitter):
+    manifest_path = tmp_path / 'camera_service.service.json'
+    manifest_path.write_text('{"command": "{python} camera_service.py", "restart_window": 30}')
+    service = add_service(manager, max_restarts=1)
+    service.manifest = load_manifest('camera_service', None, manifest_path, 'python')
+    crash(manager, service)
+    assert crash(manager, service) == pytest.approx(30.0, abs=1.0)
+
+
+@pytest.mark.parametrize("restart, returncode, restarted", [
+    ('never', 1, False),
+    ('on-failure', 0, False),
+    ('on-failure', 1, True),
+    ('always', 0, True),
+])
+def test_restart_policy(manager, tmp_path, restart, returncode, restarted):
+    manifest_path = tmp_path / 'camera_service.service.json'
+    manifest_path.write_text(f'{{"command": "{{python}} camera_service.py", "restart": "{restart}"}}')
+    service = add_service(manager)
+    service.manifest = load_manifest('camera_service', None, manifest_path, 'python')
+    assert (crash(manager, service, returncode=returncode) is not None) == restarted
+
+
+def test_stopped_service_is_not_restarted(manager):
+    service = add_service(manager)
+    process = FakeProcess(42)
+    service.process = process
+    service.is_running = False
+    manager._on_child_exit(process, 0, time.time())
+    assert manager.loop.delays == []
+
+
+def test_backoff_delay_jitter_and_cap(monkeypatch):
+    assert ServiceManager._backoff_delay(1) == 0.0
+    monkeypatch.setattr(service_manager.random, 'uniform', lambda low, high: high)
+    assert ServiceManager._backoff_delay(2) == pytest.approx(SERVICE_BACKOFF_BASE * (1 + SERVICE_BACKOFF_JITTER))
+    # Предел применяется после разброса
+    assert ServiceManager._backoff_delay(40) == SERVICE_BACKOFF_MAX
@@ -0,0 +1,79 @@
+"""Распределение бюджета исходящего трафика (EgressScheduler, common/stream_limits.py)"""
+
+import pytest
+
+from common.stream_limits import EGRESS_MIN_FPS, EGRESS_MIN_QUALITY, EgressScheduler, jpeg_size_factor
+
+FRAME_BYTES = 10_000
+
+
+def add_client(scheduler: EgressScheduler, priority: str, fps: int = 30, quality: int = 80,
+               frame_bytes: float = FRAME_BYTES):
+    client = scheduler.register(0, priority, fps, quality)
+    # Замеренный размер кадра при запрошенном качестве
+    client.frame_size = frame_bytes
+    client.frame_size_quality = quality
+    return client
+
+
+def test_no_budget_means_no_limits():
+    scheduler = EgressScheduler(0)
+    client = add_client(scheduler, "observer")
+    scheduler.set_budget(0)
+    assert client.rate_bps is None
+    assert client.allowed_fps == 30
+    assert client.allowed_quality == 80
+
+
+def test_unknown_priority_is_observer():
+    scheduler = EgressScheduler(0)
+    assert scheduler.register(0, "vip", 30, 80).priority == "observer"
+
+
+def test_operator_served_before_observers():
+    scheduler = EgressScheduler()
+    operator = add_client(scheduler, "operator")
+    observers = [add_client(scheduler, "observer") for _ in range(2)]
+    # Хватает на оператора целиком и немного на наблюдателей
+    scheduler.set_budget(400_000)
+    assert operator.allowed_fps == pytest.approx(30)
+    assert operator.allowed_quality == 80
+    assert all(observer.allowed_fps < 30 for observer in observers)
+    assert observers[0].rate_bps == pytest.approx(observers[1].rate_bps)
+
+
+def test_water_filling_gives_small_demand_in_full():
+    scheduler = EgressScheduler()
+    small = add_client(scheduler, "observer", fps=5)
+    large = [add_client(scheduler, "observer") for _ in range(2)]
+    scheduler.set_budget(300_000)
+    # Малая потребность удовлетворяется полностью, остаток делится поровну
+    assert small.allowed_fps == pytest.approx(5)
+    assert large[0].rate_bps == pytest.approx(large[1].rate_bps)
+    assert large[0].rate_bps > small.rate_bps
+
+
+def test_budget_is_fully_allocated():
+    scheduler = EgressScheduler()
+    clients = [add_client(scheduler, "observer") for _ in range(3)] + [add_client(scheduler, "operator")]
+    scheduler.set_budget(500_000)
+    assert sum(client.rate_bps for client in clients) == pytest.approx(500_000)
+    assert scheduler.last_decision["budget_bps"] == 500_000
+
+
+def test_overload_lowers_quality_before_stopping():
+    scheduler = EgressScheduler()
+    clients = [add_client(scheduler, "observer") for _ in range(4)]
+    # Меньше, чем нужно на минимальные FPS при запрошенном качестве
+    scheduler.set_budget(4 * EGRESS_MIN_FPS * FRAME_BYTES // 2)
+    for client in clients:
+        assert EGRESS_MIN_QUALITY <= client.allowed_quality < 80
+        assert client.allowed_fps >= EGRESS_MIN_FPS
+
+
+def test_estimate_size_scales_with_quality():
+    scheduler = EgressScheduler()
+    client = add_client(scheduler, "observer", quality=80)
+    expected = FRAME_BYTES * jpeg_size_factor(40) / jpeg_size_factor(80)
+    assert client.estimate_size(40) == pytest.approx(expected)
+    assert client.estimate_size(40) < FRAME_BYTES
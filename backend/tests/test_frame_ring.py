@@ -0,0 +1,122 @@
+"""Кольцо кадров в разделяемой памяти (common/frame_ring.py)"""
+
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from common import frame_ring
+from common.frame_ring import FrameRingReader, FrameRingWriter, ring_name
+
+
+@pytest.fixture(autouse=True)
+def same_process_tracking(monkeypatch):
+    """Читатель и писатель в одном процессе: сегмент учитывает resource_tracker писателя"""
+    monkeypatch.setattr(frame_ring, '_untrack', lambda shm: None)
+
+
+@pytest.fixture
+def name():
+    return f"test_ring_{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def writer(name):
+    writer = FrameRingWriter(name, slot_size=4096, slot_count=3)
+    yield writer
+    if writer.buf is not None:
+        writer.close()
+
+
+def test_ring_name():
+    assert ring_name(2) == "control_robot_cam2_raw"
+    assert ring_name(0, 'jpeg') == "control_robot_cam0_jpeg"
+
+
+def test_empty_ring(writer, name):
+    reader = FrameRingReader(name)
+    assert reader.latest() is None
+    assert reader.wait(timeout=0.01) is None
+    reader.close()
+
+
+def test_array_roundtrip(writer, name):
+    image = np.arange(16 * 8 * 3, dtype=np.uint8).reshape(16, 8, 3)
+    seq = writer.write(image, 123.5)
+    reader = FrameRingReader(name)
+    frame = reader.latest()
+    assert frame.seq == seq == 1
+    assert frame.timestamp == 123.5
+    assert frame.array.shape == (16, 8, 3)
+    assert np.array_equal(frame.array, image)
+    assert frame.valid()
+    del frame
+    reader.close()
+
+
+def test_bytes_and_dtype(writer, name):
+    writer.write(b'\xff\xd8jpeg', 1.0)
+    writer.write(np.array([1.5, 2.5], dtype=np.float32), 2.0)
+    reader = FrameRingReader(name)
+    frame = reader.latest()
+    assert frame.array.dtype == np.float32
+    assert frame.array.tolist() == [1.5, 2.5]
+    del frame
+    reader.close()
+
+
+def test_explicit_seq_only_increases(writer):
+    assert writer.write(b'a', 0.0, seq=10) == 10
+    # Номер не больше текущего - следующий по порядку
+    assert writer.write(b'b', 0.0, seq=5) == 11
+
+
+def test_overwritten_slot_is_invalid(writer, name):
+    writer.write(b'first', 1.0)
+    reader = FrameRingReader(name)
+    frame = reader.latest()
+    for index in range(writer.slot_count):
+        writer.write(bytes([index]) * 5, 2.0 + index)
+    assert not frame.valid()
+    assert frame.copy() is None
+    del frame
+    reader.close()
+
+
+def test_frame_too_large(writer):
+    with pytest.raises(ValueError):
+        writer.write(np.zeros(writer.slot_size + 1, np.uint8), 0.0)
+    with pytest.raises(ValueError):
+        writer.write(np.zeros((1, 1, 1, 1, 1), np.uint8), 0.0)
+
+
+def test_reader_reopens_recreated_ring(writer, name):
+    writer.write(b'old', 1.0)
+    reader = FrameRingReader(name)
+    assert reader.latest().array.tobytes() == b'old'
+    writer.close()
+    replacement = FrameRingWriter(name, slot_size=4096, slot_count=3)
+    try:
+        replacement.write(b'new', 2.0)
+        frame = reader.latest()
+        assert frame.array.tobytes() == b'new'
+        del frame
+    finally:
+        reader.close()
+        replacement.close()
+
+
+def test_unknown_format(name):
+    shm = shared_memory.SharedMemory(name=name, create=True, size=128)
+    try:
+        with pytest.raises(ValueError):
+            FrameRingReader(name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_missing_ring():
+    with pytest.raises(FileNotFoundError):
+        FrameRingReader(f"test_ring_missing_{uuid.uuid4().hex[:8]}")
@@ -0,0 +1,41 @@
+"""Сторож зависаний: источники пульса и действие при зависании (HeartbeatMonitor в service_manager.py)"""
+
+import asyncio
+
+from common.heartbeat import Heartbeat
+from service_manager import HeartbeatMonitor
+
+
+class FakeProcess:
+    pid = 4242
+
+
+async def watch_hangs(*beats, leave=(), wait: float = 0.4):
+    """Пульс источников через настоящий канал; возвращает вызовы on_hang (источник, только дамп)"""
+    hangs = []
+    monitor = HeartbeatMonitor(asyncio.get_running_loop(),
+                               lambda process, source, age, dump_only: hangs.append((source, dump_only)))
+    ours, theirs = HeartbeatMonitor.pair()
+    monitor.watch(FakeProcess(), ours, 0.1)
+    heartbeat = Heartbeat(theirs)
+    for args in beats:
+        heartbeat.beat(*args)
+    for source in leave:
+        heartbeat.leave(source)
+    await asyncio.sleep(wait)
+    monitor.close()
+    theirs.close()
+    return sorted(hangs)
+
+
+def test_capture_source_is_dump_only():
+    hangs = asyncio.run(watch_hangs(('loop',), ('capture-0', 0.1, 'dump')))
+    assert hangs == [('capture-0', True), ('loop', False)]
+
+
+def test_declared_pause_is_respected():
+    assert asyncio.run(watch_hangs(('capture-0', 10, 'dump'), ('loop', 10))) == []
+
+
+def test_left_source_is_not_hung():
+    assert asyncio.run(watch_hangs(('capture-0', 0.1, 'dump'), leave=['capture-0'])) == []
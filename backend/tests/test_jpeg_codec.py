@@ -0,0 +1,71 @@
+"""Размер кадра из заголовка JPEG и масштабирование в DCT-домене (common/jpeg_codec.py)"""
+
+import cv2
+import numpy as np
+import pytest
+
+from common.jpeg_codec import (EncoderPreset, OpenCvCodec, choose_scale_denom, decode_scaled, jpeg_size,
+                               preset_from_config)
+
+
+def encode(width: int, height: int, quality: int = 80) -> bytes:
+    image = np.zeros((height, width, 3), np.uint8)
+    image[:, :width // 2] = (0, 128, 255)
+    ok, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    assert ok
+    return buffer.tobytes()
+
+
+@pytest.mark.parametrize("width, height", [(640, 480), (1920, 1080), (17, 9)])
+def test_jpeg_size(width, height):
+    assert jpeg_size(encode(width, height)) == (width, height)
+
+
+def test_jpeg_size_progressive():
+    image = np.full((48, 64, 3), 200, np.uint8)
+    ok, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_PROGRESSIVE), 1])
+    assert ok
+    assert jpeg_size(buffer.tobytes()) == (64, 48)
+
+
+@pytest.mark.parametrize("data", [b'', b'\xff\xd8', b'\xff\xd8' + b'\x00' * 32, b'not a jpeg at all'])
+def test_jpeg_size_without_sof(data):
+    assert jpeg_size(data) == (0, 0)
+
+
+def test_jpeg_size_truncated_after_header():
+    data = encode(320, 240)
+    sof = data.index(b'\xff\xc0')
+    assert jpeg_size(data[:sof + 9]) == (0, 0)
+    assert jpeg_size(data[:sof + 10]) == (320, 240)
+
+
+@pytest.mark.parametrize("src, dst, denom", [
+    ((1920, 1080), (240, 135), 8),
+    ((1920, 1080), (241, 135), 4),
+    ((1280, 720), (640, 360), 2),
+    ((640, 480), (640, 480), 1),
+    ((640, 480), (800, 600), 1),
+    # Делитель выбирается по обеим сторонам
+    ((1280, 720), (320, 400), 1),
+])
+def test_choose_scale_denom(src, dst, denom):
+    assert choose_scale_denom(*src, *dst) == denom
+
+
+def test_decode_scaled_keeps_aspect_ratio():
+    image = decode_scaled(encode(1280, 720), 320, codec=OpenCvCodec())
+    assert image.shape == (180, 320, 3)
+
+
+def test_decode_scaled_exact_size():
+    image = decode_scaled(encode(640, 480), 100, 60, codec=OpenCvCodec())
+    assert image.shape == (60, 100, 3)
+
+
+def test_preset_from_config():
+    preset = preset_from_config({'quality': 60, 'subsampling': '444', 'optimize': True})
+    assert preset == EncoderPreset(quality=60, subsampling='444', optimize=True)
+    assert preset_from_config({'quality': 60}, quality=30).quality == 30
+    with pytest.raises(ValueError):
+        preset_from_config({'subsampling': '411'})
@@ -0,0 +1,93 @@
+"""Ограничение частоты и выборка записей журнала (common/log_setup.py)"""
+
+import json
+import logging
+
+from common.log_setup import JsonFormatter, RateLimitFilter, _parse_level, _parse_sample
+
+
+def make_record(message: str = "сообщение", created: float = 1000.0, level: int = logging.WARNING,
+                lineno: int = 10, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, "/src/module.py", lineno, message, (), None)
+    record.created = created
+    for name, value in extra.items():
+        setattr(record, name, value)
+    return record
+
+
+def test_limit_per_key_and_window():
+    rate_filter = RateLimitFilter(limit=2, interval=10.0)
+    passed = [rate_filter.filter(make_record(created=1000.0 + index)) for index in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert rate_filter.suppressed_total == 3
+
+
+def test_new_window_reports_suppressed():
+    rate_filter = RateLimitFilter(limit=1, interval=10.0)
+    rate_filter.filter(make_record(created=1000.0))
+    rate_filter.filter(make_record(created=1001.0))
+    record = make_record(created=1011.0)
+    assert rate_filter.filter(record)
+    assert record.suppressed == 1
+
+
+def test_keys_are_independent():
+    rate_filter = RateLimitFilter(limit=1, interval=10.0)
+    assert rate_filter.filter(make_record(lineno=10))
+    assert rate_filter.filter(make_record(lineno=20))
+    assert rate_filter.filter(make_record(lineno=10, log_key="camera:0"))
+    assert rate_filter.filter(make_record(lineno=30, log_key="camera:1"))
+    # Явный ключ объединяет записи из разных мест вызова
+    assert not rate_filter.filter(make_record(lineno=40, log_key="camera:0"))
+
+
+def test_expired_summaries():
+    rate_filter = RateLimitFilter(limit=1, interval=10.0)
+    for index in range(4):
+        rate_filter.filter(make_record(created=1000.0 + index))
+    rate_filter.filter(make_record(created=1000.0, lineno=20))
+    assert rate_filter.expired_summaries(1005.0) == []
+    summaries = rate_filter.expired_summaries(1010.0)
+    assert summaries == [(("test", "/src/module.py", 10), "test", logging.WARNING, 3)]
+    assert rate_filter.windows == {}
+
+
+def test_no_limit():
+    rate_filter = RateLimitFilter(limit=0, interval=10.0)
+    assert all(rate_filter.filter(make_record()) for _ in range(100))
+
+
+def test_summary_records_pass():
+    rate_filter = RateLimitFilter(limit=1, interval=10.0)
+    rate_filter.filter(make_record())
+    assert rate_filter.filter(make_record(rate_summary=True))
+
+
+def test_sampling_by_level_and_extra():
+    rate_filter = RateLimitFilter(limit=0, interval=10.0, sample={logging.DEBUG: 0.0})
+    assert not rate_filter.filter(make_record(level=logging.DEBUG))
+    assert rate_filter.filter(make_record(level=logging.INFO))
+    assert not rate_filter.filter(make_record(level=logging.INFO, sample=0.0))
+    assert rate_filter.sampled_out_total == 2
+
+
+def test_parse_level():
+    assert _parse_level("warning") == logging.WARNING
+    assert _parse_level(" DEBUG ") == logging.DEBUG
+    assert _parse_level("25") == 25
+    assert _parse_level("verbose") is None
+
+
+def test_parse_sample():
+    assert _parse_sample("DEBUG=0.1, info=0.5,bogus=1,WARNING=x") == {logging.DEBUG: 0.1, logging.INFO: 0.5}
+    assert _parse_sample("") == {}
+
+
+def test_json_formatter_extra_fields():
+    record = make_record("кадр %s", camera_id=3)
+    record.args = (7,)
+    entry = json.loads(JsonFormatter("camera_service").format(record))
+    assert entry["message"] == "кадр 7"
+    assert entry["service"] == "camera_service"
+    assert entry["level"] == "WARNING"
+    assert entry["camera_id"] == 3
@@ -0,0 +1,39 @@
+"""Доступ к POST API менеджера (ManagerRequestHandler._authorized в service_manager.py)"""
+
+from email.message import Message
+
+import pytest
+
+import service_manager
+from service_manager import ManagerRequestHandler
+
+
+def handler(client: str, **headers) -> ManagerRequestHandler:
+    # Без сокета: проверке нужны только адрес клиента и заголовки
+    request = ManagerRequestHandler.__new__(ManagerRequestHandler)
+    request.client_address = (client, 40000)
+    request.headers = Message()
+    for name, value in headers.items():
+        request.headers[name.replace('_', '-')] = value
+    return request
+
+
+@pytest.mark.parametrize("client, headers, allowed", [
+    ('127.0.0.1', {}, True),
+    ('192.168.1.20', {}, False),
+    # Браузер на самом роботе: страница с другого сайта не должна перезапускать сервисы
+    ('127.0.0.1', {'Origin': 'http://example.com'}, False),
+])
+def test_without_token_only_local_clients(monkeypatch, client, headers, allowed):
+    monkeypatch.setattr(service_manager, 'MANAGER_TOKEN', '')
+    assert handler(client, **headers)._authorized() == allowed
+
+
+@pytest.mark.parametrize("client, headers, allowed", [
+    ('192.168.1.20', {'X_Manager_Token': 'secret'}, True),
+    ('192.168.1.20', {'X_Manager_Token': 'wrong'}, False),
+    ('127.0.0.1', {}, False),
+])
+def test_token_is_required_when_configured(monkeypatch, client, headers, allowed):
+    monkeypatch.setattr(service_manager, 'MANAGER_TOKEN', 'secret')
+    assert handler(client, **headers)._authorized() == allowed
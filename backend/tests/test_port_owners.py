@@ -0,0 +1,89 @@
+"""Владельцы слушающих портов по /proc/net (PortOwners в service_manager.py)"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from service_manager import PortOwners
+
+HEADER = ("  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt"
+          "   uid  timeout inode\n")
+
+
+def entry(local: str, state: str, uid: int, inode: int) -> str:
+    return (f"   0: {local} 00000000:0000 {state} 00000000:00000000 00:00000000 00000000"
+            f"  {uid:>5}        0 {inode} 1 0000000000000000 100 0 0 10 0\n")
+
+
+@pytest.fixture
+def tables(tmp_path):
+    tcp = tmp_path / 'tcp'
+    tcp6 = tmp_path / 'tcp6'
+    tcp.write_text(HEADER
+                   + entry('0100007F:138A', '0A', 1000, 111)   # 127.0.0.1:5002, LISTEN
+                   + entry('00000000:138B', '0A', 0, 222)      # 0.0.0.0:5003
+                   + entry('0100007F:138A', '01', 1000, 333))  # установленное соединение
+    tcp6.write_text(HEADER + entry('00000000000000000000000000000000:138A', '0A', 1000, 444))
+    return [str(tcp), str(tcp6), str(tmp_path / 'missing')]
+
+
+def test_parse_listeners(tables):
+    owners = PortOwners()
+    owners.TABLES = tables
+    assert owners.listening(5002) == [(111, 1000), (444, 1000)]
+    assert owners.listening(5003) == [(222, 0)]
+    assert owners.listening(5004) == []
+
+
+def test_tables_are_cached(tables, tmp_path):
+    owners = PortOwners(ttl=60.0)
+    owners.TABLES = tables
+    owners.listening(5002)
+    (tmp_path / 'tcp').write_text(HEADER)
+    assert owners.listening(5003) == [(222, 0)]
+    assert owners.listening(5003, fresh=True) == []
+
+
+def test_unresolved_socket(tables):
+    owners = PortOwners()
+    owners.TABLES = tables
+    # Inode из поддельной таблицы не принадлежит ни одному процессу
+    assert owners.find_owners(5003) == ([], True)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/net/tcp'), reason="нужен /proc/net/tcp")
+def test_manager_own_socket_is_not_an_owner():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        assert PortOwners().find_owners(port) == ([], False)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/net/tcp'), reason="нужен /proc/net/tcp")
+def test_child_listener_is_found():
+    code = ("import socket, sys, time\n"
+            "s = socket.socket(); s.bind(('127.0.0.1', 0)); s.listen()\n"
+            "print(s.getsockname()[1], flush=True); time.sleep(30)\n")
+    child = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(child.stdout.readline())
+        owners = PortOwners()
+        assert owners.find_owners(port) == ([child.pid], False)
+        # Повторный поиск начинается с запомненного владельца
+        inode = owners.listening(port)[0][0]
+        assert owners.owners[inode] == child.pid
+        child.kill()
+        child.wait()
+        deadline = time.monotonic() + 2
+        while PortOwners().listening(port) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert PortOwners().find_owners(port) == ([], False)
+    finally:
+        child.kill()
+        child.stdout.close()
+        child.wait()
@@ -0,0 +1,27 @@
+"""Пробы готовности tcp/http укладываются в оставшееся время пробы (service_manager.py)"""
+
+import asyncio
+import socket
+import time
+
+from service_manager import check_http, check_tcp
+
+
+def test_tcp_listener_is_ready():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        assert asyncio.run(check_tcp(f"127.0.0.1:{port}", 1.0))
+    assert not asyncio.run(check_tcp(f"127.0.0.1:{port}", 1.0))
+
+
+def test_silent_http_is_bounded_by_timeout():
+    # Сокет принимает соединения (backlog), но никогда не отвечает
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        started = time.monotonic()
+        assert not asyncio.run(check_http(f"http://127.0.0.1:{port}/health", 0.2))
+        assert time.monotonic() - started < 1.0
@@ -0,0 +1,129 @@
+"""Замеры ресурсов сервиса и пороговые предупреждения (ResourceHistory в service_manager.py)"""
+
+import time
+
+import pytest
+
+from service_manager import MB, RESOURCE_ALERT_DEFAULTS, RESOURCE_WARMUP, ResourceHistory, ResourceSample
+
+LIMITS = {**RESOURCE_ALERT_DEFAULTS, 'rss_growth_mb_per_hour': 50.0, 'rss_window': 600.0,
+          'rss_mb': 0.0, 'cpu_percent': 0.0}
+
+
+def fill(history: ResourceHistory, count: int, step: float, rss=lambda index: 100 * MB,
+         cpu=lambda index: 10.0, pid: int = 100, start: float = None) -> ResourceSample:
+    """Замеры каждые step секунд, последний - сейчас; процесс запущен до прогрева"""
+    now = time.time()
+    if start is None:
+        start = now - (count - 1) * step
+    history.series_start = start - RESOURCE_WARMUP
+    sample = None
+    for index in range(count):
+        sample = ResourceSample(start + index * step, pid, cpu(index), int(rss(index)), 8, 20, None, None)
+        history.samples.append(sample)
+    return sample
+
+
+def test_rss_growth_slope():
+    history = ResourceHistory('camera_service')
+    # 1 МБ каждые 10 с = 360 МБ/час
+    fill(history, 61, 10.0, rss=lambda index: 100 * MB + index * MB)
+    assert history.rss_growth(600) == pytest.approx(360.0)
+
+
+def test_flat_rss_has_no_growth():
+    history = ResourceHistory('camera_service')
+    fill(history, 61, 10.0)
+    assert history.rss_growth(600) == pytest.approx(0.0)
+
+
+def test_growth_needs_half_window():
+    history = ResourceHistory('camera_service')
+    fill(history, 20, 10.0, rss=lambda index: index * MB)
+    assert history.rss_growth(600) is None
+    assert ResourceHistory('empty').rss_growth(600) is None
+
+
+def test_warmup_is_excluded():
+    history = ResourceHistory('camera_service')
+    fill(history, 61, 10.0, rss=lambda index: (index if index < 30 else 30) * MB)
+    # Рост только в первые 300 с процесса: после прогрева RSS стабилен
+    history.series_start = history.samples[0].ts - RESOURCE_WARMUP + 300
+    assert history.rss_growth(600) == pytest.approx(0.0)
+
+
+def test_previous_process_is_ignored():
+    history = ResourceHistory('camera_service')
+    now = time.time()
+    fill(history, 31, 10.0, rss=lambda index: index * 10 * MB, pid=100, start=now - 600)
+    fill(history, 31, 10.0, pid=200, start=now - 300)
+    history.series_start = now - 300 - RESOURCE_WARMUP
+    assert history.rss_growth(600) == pytest.approx(0.0)
+
+
+def test_add_computes_cpu_percent():
+    history = ResourceHistory('camera_service')
+    first = history.add(100, 1.0, MB, 4, 10, 0, 0)
+    assert first.cpu_percent is None
+    second = history.add(100, 1.0, MB, 4, 10, 0, 0)
+    assert second.cpu_percent == 0.0
+    # Новый процесс - новая серия
+    assert history.add(200, 5.0, MB, 4, 10, 0, 0).cpu_percent is None
+    assert history.series_start >= first.ts
+
+
+def test_rss_growth_alert_raised_and_cleared():
+    history = ResourceHistory('camera_service')
+    sample = fill(history, 61, 10.0, rss=lambda index: 100 * MB + index * MB)
+    raised, cleared = history.check(sample, LIMITS)
+    assert raised == ['rss_growth'] and cleared == []
+    assert "360" in history.alerts['rss_growth']
+    # Повторная проверка не поднимает предупреждение заново
+    assert history.check(sample, LIMITS) == ([], [])
+    history.samples.clear()
+    sample = fill(history, 61, 10.0)
+    assert history.check(sample, LIMITS) == ([], ['rss_growth'])
+    assert history.alerts == {}
+
+
+def test_rss_limit_alert():
+    history = ResourceHistory('camera_service')
+    sample = fill(history, 3, 1.0, rss=lambda index: 600 * MB)
+    raised, _ = history.check(sample, {**LIMITS, 'rss_mb': 512.0})
+    assert raised == ['rss_limit']
+
+
+def test_cpu_alert_uses_average():
+    history = ResourceHistory('camera_service')
+    limits = {**LIMITS, 'cpu_percent': 90.0, 'cpu_for': 60.0}
+    # Один провал на фоне постоянной загрузки не снимает предупреждение
+    sample = fill(history, 61, 1.0, cpu=lambda index: 20.0 if index == 30 else 100.0)
+    assert history.check(sample, limits)[0] == ['cpu_saturation']
+    history.samples.clear()
+    # Короткий всплеск не поднимает
+    sample = fill(history, 61, 1.0, cpu=lambda index: 100.0 if index > 55 else 10.0)
+    assert history.check(sample, limits) == ([], ['cpu_saturation'])
+
+
+def test_cpu_alert_waits_for_full_period():
+    history = ResourceHistory('camera_service')
+    sample = fill(history, 10, 1.0, cpu=lambda index: 100.0)
+    history.series_start = sample.ts - 10
+    assert history.check(sample, {**LIMITS, 'cpu_percent': 90.0, 'cpu_for': 60.0}) == ([], [])
+
+
+def test_summary():
+    history = ResourceHistory('camera_service')
+    fill(history, 5, 1.0, rss=lambda index: (100 + index) * MB, cpu=lambda index: index * 10.0)
+    summary = history.summary()
+    assert summary['samples'] == 5
+    assert summary['cpu_percent'] == {'avg': 20.0, 'max': 40.0}
+    assert summary['rss_mb'] == {'last': 104.0, 'min': 100.0, 'max': 104.0}
+    assert ResourceHistory('empty').summary() == {"samples": 0}
+
+
+def test_history_is_bounded():
+    history = ResourceHistory('camera_service', size=10)
+    fill(history, 25, 1.0)
+    assert len(history.query()) == 10
+    assert len(history.query(4.5)) == 5
@@ -0,0 +1,105 @@
+"""Разбор ROI и геометрия общих выходов области интереса (parse_roi, RoiSpec)"""
+
+import pytest
+
+camera_service = pytest.importorskip("camera_service")
+
+import numpy as np  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+from camera_service import CAPTURE_BASE_RESOLUTION, FULL_FRAME_ROI, RoiSpec, parse_roi  # noqa: E402
+
+BASE_W, BASE_H = CAPTURE_BASE_RESOLUTION
+
+
+def test_no_roi_parameters():
+    assert parse_roi(None) is None
+    assert parse_roi("") is None
+
+
+def test_zoom_without_roi_is_full_frame():
+    assert parse_roi(None, zoom=2.0) == RoiSpec(0.0, 0.0, 1.0, 1.0, True, 2.0)
+
+
+def test_normalized_roi_is_rounded_for_sharing():
+    spec = parse_roi("0.12345,0.2,0.5,0.5")
+    assert spec.normalized
+    assert spec.x == 0.123
+    assert parse_roi("0.1234,0.2,0.5,0.5") == spec
+
+
+def test_pixel_roi():
+    spec = parse_roi("10.7,20,100,50")
+    assert not spec.normalized
+    assert (spec.x, spec.y, spec.w, spec.h) == (10.0, 20.0, 100.0, 50.0)
+
+
+def test_pixel_roi_is_clamped_to_frame():
+    spec = parse_roi("0,0,100000,100000")
+    assert (spec.w, spec.h) == (BASE_W, BASE_H)
+    assert spec.output_size(BASE_W, BASE_H) == (BASE_W, BASE_H)
+    assert parse_roi(f"{BASE_W - 20},0,500,40").w == 20
+
+
+@pytest.mark.parametrize("roi, zoom, out_w", [
+    ("1,2,3", 1.0, None),
+    ("a,b,c,d", 1.0, None),
+    ("0,0,0,0.5", 1.0, None),
+    ("-0.1,0,0.5,0.5", 1.0, None),
+    ("0,0,0.5,0.5", 0.5, None),
+    ("0,0,0.5,0.5", 32.0, None),
+    ("0,0,0.5,0.5", 1.0, 8),
+    # Вне кадра базового разрешения
+    (f"{BASE_W},0,10,10", 1.0, None),
+    # Выход по умолчанию меньше 16 пикселей
+    ("0,0,8,8", 1.0, None),
+    # Узкая полоса с заданной шириной выхода дает слишком высокий кадр
+    ("0,0,0.01,1", 1.0, 3840),
+])
+def test_invalid_roi(roi, zoom, out_w):
+    with pytest.raises(HTTPException) as error:
+        parse_roi(roi, zoom, out_w)
+    assert error.value.status_code == 400
+
+
+def test_crop_rect_normalized():
+    spec = RoiSpec(0.25, 0.25, 0.5, 0.5)
+    assert spec.crop_rect(640, 480) == (160, 120, 480, 360)
+    # Та же область при другом разрешении захвата
+    assert spec.crop_rect(1280, 960) == (320, 240, 960, 720)
+
+
+def test_zoom_shrinks_around_center():
+    spec = RoiSpec(0.0, 0.0, 1.0, 1.0, zoom=2.0)
+    assert spec.crop_rect(640, 480) == (160, 120, 480, 360)
+
+
+def test_pixel_rect_scales_with_capture_size():
+    spec = RoiSpec(0.0, 0.0, BASE_W / 2, BASE_H / 2, normalized=False)
+    assert spec.crop_rect(BASE_W * 2, BASE_H * 2) == (0, 0, BASE_W, BASE_H)
+
+
+def test_crop_rect_stays_inside_frame():
+    spec = RoiSpec(0.9, 0.9, 0.5, 0.5)
+    x0, y0, x1, y1 = spec.crop_rect(640, 480)
+    assert 0 <= x0 < x1 <= 640
+    assert 0 <= y0 < y1 <= 480
+
+
+def test_output_size_defaults_to_region_in_base_resolution():
+    spec = RoiSpec(0.0, 0.0, 0.5, 0.5)
+    assert spec.output_size(BASE_W * 2, BASE_H * 2) == (BASE_W // 2, BASE_H // 2)
+    assert RoiSpec(0.0, 0.0, 0.5, 0.5, out_w=320).output_size(BASE_W, BASE_H) == (320, 320 * BASE_H // BASE_W)
+
+
+def test_capture_size_for_zoom():
+    # Двукратный зум без потери детализации требует вдвое большего разрешения
+    spec = RoiSpec(0.0, 0.0, 1.0, 1.0, zoom=2.0)
+    assert spec.capture_size() == (BASE_W * 2, BASE_H * 2)
+
+
+def test_apply_returns_output_size():
+    image = np.zeros((BASE_H * 2, BASE_W * 2, 3), np.uint8)
+    result = FULL_FRAME_ROI.apply(image)
+    assert result.shape == (BASE_H, BASE_W, 3)
+    assert RoiSpec(0.0, 0.0, 0.5, 0.5, zoom=2.0).apply(image).shape == (BASE_H // 2, BASE_W // 2, 3)
@@ -0,0 +1,139 @@
+"""Упаковка JPEG в RTP по RFC 2435 и сборка кадров (common/rtp_jpeg.py)"""
+
+import cv2
+import numpy as np
+import pytest
+
+from common.rtp_jpeg import (PAYLOAD_TYPE_JPEG, JpegDepacketizer, UnsupportedJpeg, is_multicast, make_sdp,
+                             packetize, parse_jpeg)
+
+
+def encode(width: int = 320, height: int = 240, quality: int = 80, **params) -> bytes:
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    flags = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    for name, value in params.items():
+        flags += [int(getattr(cv2, name)), value]
+    ok, buffer = cv2.imencode('.jpg', image, flags)
+    assert ok
+    return buffer.tobytes()
+
+
+def decode(data: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+@pytest.fixture(scope="module")
+def jpeg():
+    return encode()
+
+
+def test_parse_jpeg(jpeg):
+    scan = parse_jpeg(jpeg)
+    assert (scan.width, scan.height) == (320, 240)
+    assert scan.jpeg_type == 1  # 4:2:0
+    assert len(scan.qtables) == 128
+    assert scan.restart_interval == 0
+    assert jpeg.endswith(scan.scan + b'\xff\xd9')
+
+
+def test_packets_fit_mtu_and_mark_last(jpeg):
+    packets = packetize(jpeg, seq=10, timestamp=1234, ssrc=7, mtu=600)
+    assert len(packets) > 1
+    assert all(len(packet) <= 600 for packet in packets)
+    markers = [bool(packet[1] & 0x80) for packet in packets]
+    assert markers == [False] * (len(packets) - 1) + [True]
+    assert all(packet[1] & 0x7F == PAYLOAD_TYPE_JPEG for packet in packets)
+    assert [int.from_bytes(packet[2:4], 'big') for packet in packets] == list(range(10, 10 + len(packets)))
+
+
+def test_sequence_wraps(jpeg):
+    packets = packetize(jpeg, seq=0xFFFF, timestamp=0, ssrc=1, mtu=600)
+    assert int.from_bytes(packets[0][2:4], 'big') == 0xFFFF
+    assert int.from_bytes(packets[1][2:4], 'big') == 0
+
+
+def test_roundtrip_is_pixel_exact(jpeg):
+    depacketizer = JpegDepacketizer()
+    frames = [depacketizer.push(packet) for packet in packetize(jpeg, 0, 90000, 5, mtu=600)]
+    frame = frames[-1]
+    assert all(item is None for item in frames[:-1])
+    assert (frame.width, frame.height, frame.timestamp, frame.ssrc) == (320, 240, 90000, 5)
+    # Заголовки собираются заново, энтропийные данные и таблицы те же
+    assert np.array_equal(decode(frame.jpeg_data), decode(jpeg))
+    assert depacketizer.stats["frames"] == 1
+
+
+def test_restart_interval_roundtrip():
+    if not hasattr(cv2, 'IMWRITE_JPEG_RST_INTERVAL'):
+        pytest.skip("OpenCV без IMWRITE_JPEG_RST_INTERVAL")
+    data = encode(IMWRITE_JPEG_RST_INTERVAL=4)
+    assert parse_jpeg(data).jpeg_type == 65
+    depacketizer = JpegDepacketizer()
+    frame = None
+    for packet in packetize(data, 0, 0, 1, mtu=600):
+        frame = depacketizer.push(packet)
+    assert np.array_equal(decode(frame.jpeg_data), decode(data))
+
+
+def test_lost_packet_drops_frame(jpeg):
+    depacketizer = JpegDepacketizer()
+    packets = packetize(jpeg, 0, 1000, 1, mtu=600)
+    for index, packet in enumerate(packets):
+        if index != 1:
+            assert depacketizer.push(packet) is None
+    assert depacketizer.stats["lost_packets"] == 1
+    assert depacketizer.stats["dropped_frames"] == 1
+    # Следующий кадр собирается целиком
+    frame = None
+    for packet in packetize(jpeg, len(packets), 4000, 1, mtu=600):
+        frame = depacketizer.push(packet)
+    assert frame is not None and frame.timestamp == 4000
+
+
+def test_late_packet_is_ignored(jpeg):
+    depacketizer = JpegDepacketizer()
+    packets = packetize(jpeg, 100, 0, 1, mtu=600)
+    depacketizer.push(packets[0])
+    depacketizer.push(packets[1])
+    assert depacketizer.push(packets[0]) is None
+    assert depacketizer.stats["lost_packets"] == 0
+
+
+@pytest.mark.parametrize("packet", [b'', b'\x80' * 8, b'\x00' * 40])
+def test_bad_packets(packet):
+    depacketizer = JpegDepacketizer()
+    assert depacketizer.push(packet) is None
+    assert depacketizer.stats["bad_packets"] == 1
+
+
+@pytest.mark.parametrize("params", [
+    {'IMWRITE_JPEG_PROGRESSIVE': 1},
+    {'IMWRITE_JPEG_OPTIMIZE': 1},
+])
+def test_unsupported_jpeg(params):
+    with pytest.raises(UnsupportedJpeg):
+        parse_jpeg(encode(**params))
+
+
+def test_unsupported_size():
+    with pytest.raises(UnsupportedJpeg):
+        parse_jpeg(encode(width=322, height=240))
+
+
+def test_not_a_jpeg():
+    with pytest.raises(UnsupportedJpeg):
+        parse_jpeg(b'not a jpeg')
+
+
+def test_mtu_too_small(jpeg):
+    with pytest.raises(ValueError):
+        packetize(jpeg, 0, 0, 1, mtu=64)
+
+
+def test_sdp():
+    assert is_multicast('239.255.42.1')
+    assert not is_multicast('192.168.1.10')
+    sdp = make_sdp('239.255.42.1', 5004, ttl=4)
+    assert "c=IN IP4 239.255.42.1/4\r\n" in sdp
+    assert f"m=video 5004 RTP/AVP {PAYLOAD_TYPE_JPEG}\r\n" in sdp
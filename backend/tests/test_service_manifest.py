@@ -0,0 +1,123 @@
+"""Манифесты сервисов и порядок запуска по зависимостям (service_manager.py)"""
+
+import json
+
+import pytest
+
+from service_manager import (RESOURCE_ALERT_DEFAULTS, SERVICE_RESTART_WINDOW, ReadinessProbe, dependency_order,
+                             expand_env, load_manifest)
+
+PYTHON = '/opt/venv/bin/python'
+
+
+@pytest.fixture
+def write_manifest(tmp_path):
+    def write(data, name='camera_worker'):
+        path = tmp_path / f"{name}.service.json"
+        path.write_text(json.dumps(data), encoding='utf-8')
+        return path
+    return write
+
+
+def test_dependency_order_puts_dependencies_first():
+    order = dependency_order({
+        'camera_worker': ['camera_service'],
+        'camera_service': [],
+        'recorder': ['camera_worker', 'camera_service'],
+    })
+    assert order == ['camera_service', 'camera_worker', 'recorder']
+
+
+def test_dependency_order_is_deterministic():
+    assert dependency_order({'b': [], 'a': [], 'c': []}) == ['a', 'b', 'c']
+
+
+def test_dependency_order_ignores_unknown_services():
+    # Зависимость от отключенного или отсутствующего сервиса не мешает запуску
+    assert dependency_order({'camera_worker': ['camera_service']}) == ['camera_worker']
+
+
+def test_dependency_cycle():
+    with pytest.raises(ValueError, match="a -> b -> c -> a"):
+        dependency_order({'a': ['b'], 'b': ['c'], 'c': ['a']})
+
+
+def test_self_dependency():
+    with pytest.raises(ValueError):
+        dependency_order({'a': ['a']})
+
+
+def test_defaults_without_manifest(tmp_path):
+    script = tmp_path / 'camera_service.py'
+    manifest = load_manifest('camera_service', script, None, PYTHON)
+    assert manifest.command == [PYTHON, str(script)]
+    assert manifest.restart == 'always'
+    assert manifest.depends_on == []
+    assert manifest.port is None and manifest.ready is None
+    assert manifest.restart_window == SERVICE_RESTART_WINDOW
+    assert manifest.source == str(script)
+
+
+def test_manifest_fields(write_manifest, monkeypatch):
+    monkeypatch.setenv('CAMERA_WORKER_PORT', '5013')
+    path = write_manifest({
+        "command": "{python} {dir}/camera_worker.py --flag",
+        "env": {"CAMERA_WORKERS": 2},
+        "port": "${CAMERA_WORKER_PORT:-5003}",
+        "ready": "tcp:${CAMERA_WORKER_PORT:-5003}@30",
+        "depends_on": "camera_service",
+        "restart": "on-failure",
+        "resource_class": "background",
+        "alerts": {"rss_mb": 300},
+        "enabled": False,
+    })
+    manifest = load_manifest('camera_worker', None, path, PYTHON)
+    assert manifest.command == [PYTHON, f"{path.parent}/camera_worker.py", '--flag']
+    assert manifest.env == {'CAMERA_WORKERS': '2'}
+    assert manifest.port == 5013
+    assert manifest.ready == ReadinessProbe('tcp', '5013', 30.0)
+    assert manifest.depends_on == ['camera_service']
+    assert manifest.restart == 'on-failure'
+    assert manifest.resource_class == 'background'
+    assert manifest.alerts == {**RESOURCE_ALERT_DEFAULTS, 'rss_mb': 300.0}
+    assert not manifest.enabled
+
+
+def test_expand_env_defaults(monkeypatch):
+    monkeypatch.delenv('CAMERA_WORKER_PORT', raising=False)
+    assert expand_env({"port": ["${CAMERA_WORKER_PORT:-5003}", "${CAMERA_WORKER_PORT}"]}) == {"port": ["5003", ""]}
+
+
+@pytest.mark.parametrize("data", [
+    {"restart": "sometimes"},
+    {"resource_class": "turbo"},
+    {"restart_mode": "blue-green"},
+    {"hang_action": "ignore"},
+    {"port_conflict": "steal"},
+    {"alerts": {"unknown": 1}},
+    {"ready": "udp:5003"},
+    # Сокет менеджера отвечает на tcp пробу еще до запуска сервиса
+    {"listen": "0.0.0.0:5003", "ready": "tcp:5003"},
+    {"restart_mode": "hot-swap"},
+])
+def test_invalid_manifest(write_manifest, data):
+    path = write_manifest({"command": "{python} camera_worker.py", **data})
+    with pytest.raises(ValueError):
+        load_manifest('camera_worker', None, path, PYTHON)
+
+
+def test_manifest_must_be_object(write_manifest):
+    with pytest.raises(ValueError):
+        load_manifest('camera_worker', None, write_manifest(["camera_service"]), PYTHON)
+
+
+def test_manifest_without_command_and_script(write_manifest):
+    with pytest.raises(ValueError):
+        load_manifest('camera_worker', None, write_manifest({}), PYTHON)
+
+
+def test_hot_swap_with_listen(write_manifest):
+    path = write_manifest({"command": ["{python}", "camera_service.py"], "restart_mode": "hot-swap",
+                           "listen": ["[::]:5002", "5003"], "ready": "http://127.0.0.1:5002/health"})
+    manifest = load_manifest('camera_service', None, path, PYTHON)
+    assert manifest.listen == [('::', 5002), ('0.0.0.0', 5003)]
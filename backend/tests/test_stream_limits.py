@@ -0,0 +1,106 @@
+"""Лимиты стримов и их общий учет в пуле воркеров (common/stream_limits.py)"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from common.stream_limits import (WORKER_TABLE_CAMERAS, AdmissionController, SharedAdmissionController,
+                                  WorkerStreamTable)
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    path = str(tmp_path / 'workers')
+    WorkerStreamTable.create(path)
+    return path
+
+
+@pytest.fixture
+def dead_pid():
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    return child.pid
+
+
+def test_camera_limit_and_operator_bypass():
+    controller = AdmissionController(0, 1, 'reject', 0)
+    ticket = controller.admit(0, 'observer')
+    assert ticket is not None and not ticket.degraded
+    assert controller.admit(0, 'observer') is None
+    # Оператор допускается всегда, но занимает место
+    operator = controller.admit(0, 'operator')
+    other = controller.admit(1, 'observer')
+    assert operator is not None and other is not None
+    ticket.release()
+    assert controller.snapshot()['active'] == {'0': 1, '1': 1}
+
+
+def test_overflow_degrade():
+    controller = AdmissionController(1, 0, 'degrade', 1)
+    # Билет освобождается и сборщиком мусора, поэтому держим ссылку
+    full = controller.admit(0, 'observer')
+    assert not full.degraded
+    degraded = controller.admit(1, 'observer')
+    assert degraded.degraded
+    assert controller.admit(1, 'observer') is None
+    degraded.release()
+    assert controller.admit(1, 'observer').degraded
+
+
+def test_table_sums_other_workers(table_path):
+    own = WorkerStreamTable(table_path)
+    other = WorkerStreamTable(table_path, pid=os.getppid())
+    try:
+        with other.locked():
+            other.publish({0: 2, 3: 1}, {3: 1})
+        with own.locked():
+            own.publish({0: 1}, {})
+            others = own.others()
+        assert others[0] == 2 and others[3] == 1
+        assert others[WORKER_TABLE_CAMERAS + 3] == 1
+        assert own.client_share() == (1, 5)
+    finally:
+        other.close()
+        own.close()
+
+
+def test_dead_worker_is_ignored(table_path, dead_pid):
+    stale = WorkerStreamTable(table_path, pid=dead_pid)
+    with stale.locked():
+        stale.publish({0: 5}, {})
+    own = WorkerStreamTable(table_path)
+    try:
+        assert own.others().sum() == 0
+        # Строка завершившегося процесса переходит новому воркеру
+        assert own.row == stale.row
+    finally:
+        own.close()
+
+
+def test_shared_limit_covers_pool(table_path):
+    other = WorkerStreamTable(table_path, pid=os.getppid())
+    controller = SharedAdmissionController(WorkerStreamTable(table_path), 2, 0, 'reject', 0)
+    try:
+        with other.locked():
+            other.publish({0: 1}, {})
+        ticket = controller.admit(1, 'observer')
+        assert ticket is not None
+        assert controller.admit(1, 'observer') is None
+        assert other.client_share() == (1, 2)
+        ticket.release()
+        assert other.client_share() == (1, 1)
+        assert controller.admit(1, 'observer') is not None
+    finally:
+        other.close()
+        controller.table.close()
+
+
+def test_shared_camera_range(table_path):
+    controller = SharedAdmissionController(WorkerStreamTable(table_path), 0, 0, 'reject', 0)
+    try:
+        with pytest.raises(ValueError):
+            controller.admit(WORKER_TABLE_CAMERAS, 'observer')
+    finally:
+        controller.table.close()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк кодеков JPEG сервиса камер (common/jpeg_codec.py).
+
+Сравнивает доступные реализации (OpenCV, libjpeg-turbo) и пресеты на кадрах
+640x480 и 1280x720: время кодирования, размер кадра, полное декодирование и
+декодирование с уменьшением в DCT-домене в 2 и 4 раза.
+
+Кадры берутся с камеры (--camera) или генерируются: сцена с градиентами,
+текстом, фигурами и шумом сенсора, близкая по сжимаемости к реальной.
+
+Пример:
+    python tools/jpeg_bench.py --iterations 200
+    python tools/jpeg_bench.py --camera 0 --sizes 1280x720
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+from common.jpeg_codec import CODECS, EncoderPreset, create_codec, decode_scaled  # noqa: E402
+
+PRESETS = {
+    'q85': EncoderPreset(quality=85),
+    'q85-slow': EncoderPreset(quality=85, fast_dct=False),
+    'q85-opt': EncoderPreset(quality=85, optimize=True),
+    'q85-444': EncoderPreset(quality=85, subsampling='444'),
+    'q50': EncoderPreset(quality=50),
+    'q20': EncoderPreset(quality=20),
+}
+
+
+def synthetic_frame(width: int, height: int) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    image = np.dstack([
+        180 * x + 40 * np.sin(y * 9),
+        120 + 80 * np.cos(x * 7 + y * 3),
+        200 * y + 30 * np.sin(x * 15)
+    ]).clip(0, 255).astype(np.uint8)
+    for _ in range(25):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.circle(image, center, int(rng.integers(5, height // 6)), color, -1)
+        cv2.rectangle(image, center, (center[0] + 60, center[1] + 30), color, 2)
+    cv2.putText(image, "H1 ROBOT CAMERA 12:34:56", (20, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                width / 640, (255, 255, 255), 2)
+    noise = rng.normal(0, 6, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def camera_frame(index: int, width: int, height: int) -> np.ndarray:
+    capture = cv2.VideoCapture(index)
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    for _ in range(5):
+        ok, frame = capture.read()
+    capture.release()
+    if not ok or frame is None:
+        raise RuntimeError(f"Камера {index} не вернула кадр")
+    if (frame.shape[1], frame.shape[0]) != (width, height):
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def measure(func: Callable[[], object], iterations: int) -> float:
+    """Медиана времени вызова, мс"""
+    func()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение кодеков JPEG")
+    parser.add_argument('--sizes', default='640x480,1280x720', help='Размеры кадров через запятую')
+    parser.add_argument('--iterations', type=int, default=100, help='Повторов на замер')
+    parser.add_argument('--camera', type=int, help='Брать кадры с камеры с этим индексом')
+    args = parser.parse_args()
+
+    codecs = []
+    for name in CODECS:
+        try:
+            codecs.append(create_codec(name))
+        except Exception as e:
+            print(f"{name}: недоступен ({e})")
+
+    sizes: List[Tuple[int, int]] = [tuple(int(v) for v in size.split('x')) for size in args.sizes.split(',')]
+    for width, height in sizes:
+        frame = camera_frame(args.camera, width, height) if args.camera is not None else synthetic_frame(width, height)
+        print(f"\n{width}x{height}")
+        print(f"{'кодек':<10} {'пресет':<9} {'кодир., мс':>10} {'размер, КБ':>10} "
+              f"{'декод., мс':>10} {'1/2, мс':>8} {'1/4, мс':>8} {'resize 1/4, мс':>15}")
+        for codec in codecs:
+            for preset_name, preset in PRESETS.items():
+                data = codec.encode(frame, preset)
+                encode_ms = measure(lambda: codec.encode(frame, preset), args.iterations)
+                decode_ms = measure(lambda: codec.decode(data), args.iterations)
+                half_ms = measure(lambda: decode_scaled(data, width // 2, codec=codec), args.iterations)
+                quarter_ms = measure(lambda: decode_scaled(data, width // 4, codec=codec), args.iterations)
+                # Для сравнения: полное декодирование и resize без DCT масштабирования
+                resize_ms = measure(lambda: cv2.resize(codec.decode(data), (width // 4, height // 4),
+                                                       interpolation=cv2.INTER_AREA), args.iterations)
+                print(f"{codec.name:<10} {preset_name:<9} {encode_ms:>10.2f} {len(data) / 1024:>10.1f} "
+                      f"{decode_ms:>10.2f} {half_ms:>8.2f} {quarter_ms:>8.2f} {resize_ms:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
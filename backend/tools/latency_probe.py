@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Проба задержки видеопотока камеры.
+
+Подключается к MJPEG стриму, читает заголовки X-Frame-Seq / X-Capture-Ts /
+X-Publish-Ts / X-Send-Ts и, для синтетической камеры (CAMERA_SYNTHETIC=1, id -2),
+метку времени захвата, нарисованную в пикселях кадра. Выводит перцентили задержек
+по этапам: захват -> публикация -> отправка -> получение -> декодирование.
+
+Часы клиента и робота должны быть синхронизированы (или запускайте пробу на роботе).
+
+Пример:
+    python tools/latency_probe.py --url http://robot:5002/api/cameras/-2/mjpeg?quality=50 --duration 10
+"""
+
+import argparse
+import http.client
+import os
+import sys
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+from common.pixel_timestamp import decode_timestamp  # noqa: E402
+
+
+def read_part(response) -> (Dict[str, str], bytes):
+    """Чтение одной части multipart/x-mixed-replace"""
+    headers: Dict[str, str] = {}
+    line = response.readline()
+    while line and line.strip() != b'--frame':
+        line = response.readline()
+    if not line:
+        raise EOFError("Стрим закрыт сервером")
+    while True:
+        line = response.readline().strip()
+        if not line:
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = response.read(length) if length else b''
+    return headers, body
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "нет данных"
+    data = np.array(values)
+    return (f"p50={np.percentile(data, 50):7.1f}  p90={np.percentile(data, 90):7.1f}  "
+            f"p99={np.percentile(data, 99):7.1f}  max={data.max():7.1f}  (n={len(values)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Измерение задержки MJPEG стрима камеры")
+    parser.add_argument('--url', default='http://localhost:5002/api/cameras/-2/mjpeg', help='URL MJPEG стрима')
+    parser.add_argument('--duration', type=float, default=10.0, help='Длительность измерения, с')
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    connection.request('GET', url.path + ('?' + url.query if url.query else ''))
+    response = connection.getresponse()
+    if response.status != 200:
+        print(f"Ошибка: HTTP {response.status}")
+        return 1
+
+    stages: Dict[str, List[float]] = {
+        "capture->publish": [],
+        "publish->send": [],
+        "send->recv": [],
+        "capture->recv": [],
+        "glass-to-glass (пиксели)": []
+    }
+    last_seq = None
+    skipped = 0
+    started = time.time()
+    while time.time() - started < args.duration:
+        headers, body = read_part(response)
+        received = time.time()
+        if not body or 'x-frame-seq' not in headers:
+            continue
+        seq = int(headers['x-frame-seq'])
+        if last_seq is not None and seq > last_seq + 1:
+            skipped += seq - last_seq - 1
+        last_seq = seq
+        capture_ts = float(headers['x-capture-ts'])
+        publish_ts = float(headers['x-publish-ts'])
+        send_ts = float(headers.get('x-send-ts', publish_ts))
+        stages["capture->publish"].append((publish_ts - capture_ts) * 1000.0)
+        stages["publish->send"].append((send_ts - publish_ts) * 1000.0)
+        stages["send->recv"].append((received - send_ts) * 1000.0)
+        stages["capture->recv"].append((received - capture_ts) * 1000.0)
+
+        image = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+        pixel_ts = decode_timestamp(image)
+        if pixel_ts is not None:
+            stages["glass-to-glass (пиксели)"].append((time.time() - pixel_ts) * 1000.0)
+
+    connection.close()
+    print(f"Получено кадров: {len(stages['capture->recv'])}, пропущено номеров кадров: {skipped}")
+    for name, values in stages.items():
+        print(f"{name:28s} {percentiles(values)} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест раздачи MJPEG.
+
+Открывает заданное число одновременных MJPEG соединений и считает суммарную
+пропускную способность (кадры/с и МБ/с). С --workers по очереди запускает
+camera_worker.py с разным числом процессов uvicorn и показывает, как пропускная
+способность растет с числом воркеров. Сервис камер (camera_service.py) должен
+быть запущен с CAMERA_SHM_EXPORT=1.
+
+Клиенты работают в нескольких процессах (--client-procs), чтобы генератор
+нагрузки сам не стал узким местом.
+
+Примеры:
+    python tools/mjpeg_bench.py --url http://localhost:5002/api/cameras/0/mjpeg --clients 50
+    python tools/mjpeg_bench.py --workers 1,2,4 --camera 0 --clients 100 --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import List, Tuple
+from urllib.parse import urlsplit
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services', 'camera_worker.py')
+BOUNDARY = b'--frame'
+
+
+async def _client(url: str, deadline: float, totals: List[int]):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    try:
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    except OSError:
+        return
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n\r\n'.encode('ascii'))
+    tail = b''
+    try:
+        while time.time() < deadline:
+            chunk = await asyncio.wait_for(reader.read(262144), max(0.1, deadline - time.time()))
+            if not chunk:
+                break
+            data = tail + chunk
+            totals[0] += data.count(BOUNDARY)
+            totals[1] += len(chunk)
+            tail = data[-(len(BOUNDARY) - 1):]
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        writer.close()
+
+
+def _client_process(url: str, clients: int, duration: float, start_at: float, result_queue):
+    async def run():
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        totals = [0, 0]
+        deadline = time.time() + duration
+        await asyncio.gather(*(_client(url, deadline, totals) for _ in range(clients)))
+        return totals
+
+    result_queue.put(asyncio.run(run()))
+
+
+def run_load(url: str, clients: int, duration: float, client_procs: int) -> Tuple[int, int]:
+    """Суммарное число кадров и байт, принятых clients соединениями за duration секунд"""
+    result_queue = multiprocessing.Queue()
+    start_at = time.time() + 1.0
+    procs = []
+    for index in range(client_procs):
+        share = clients // client_procs + (1 if index < clients % client_procs else 0)
+        if share == 0:
+            continue
+        proc = multiprocessing.Process(target=_client_process, args=(url, share, duration, start_at, result_queue))
+        proc.start()
+        procs.append(proc)
+    frames = total_bytes = 0
+    for _ in procs:
+        proc_frames, proc_bytes = result_queue.get()
+        frames += proc_frames
+        total_bytes += proc_bytes
+    for proc in procs:
+        proc.join()
+    return frames, total_bytes
+
+
+def start_workers(count: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, CAMERA_WORKERS=str(count), CAMERA_WORKER_PORT=str(port))
+    proc = subprocess.Popen([sys.executable, WORKER_SCRIPT], env=env)
+    # Несколько процессов импортируют numpy и FastAPI одновременно: на слабых машинах это долго
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"camera_worker.py не ответил на порту {port}")
+
+
+def report(label: str, frames: int, total_bytes: int, duration: float, clients: int):
+    fps = frames / duration
+    print(f"{label:>12}  {fps:9.1f} кадр/с  {total_bytes / duration / 1e6:8.1f} МБ/с  "
+          f"{fps / clients:6.1f} кадр/с на клиента")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест MJPEG раздачи")
+    parser.add_argument('--url', help='URL MJPEG стрима (без --workers)')
+    parser.add_argument('--workers', help='Список числа воркеров camera_worker.py, например 1,2,4')
+    parser.add_argument('--camera', type=int, default=0, help='ID камеры для --workers')
+    parser.add_argument('--port', type=int, default=5013, help='Порт camera_worker.py для --workers')
+    parser.add_argument('--fps', type=int, default=30, help='FPS, запрашиваемый клиентами')
+    parser.add_argument('--clients', type=int, default=50, help='Число одновременных соединений')
+    parser.add_argument('--client-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Число процессов генератора нагрузки')
+    parser.add_argument('--duration', type=float, default=10.0, help='Длительность каждого прогона, секунд')
+    args = parser.parse_args()
+
+    if args.workers:
+        for count in [int(value) for value in args.workers.split(',')]:
+            proc = start_workers(count, args.port)
+            try:
+                url = f'http://127.0.0.1:{args.port}/api/cameras/{args.camera}/mjpeg?fps={args.fps}'
+                frames, total_bytes = run_load(url, args.clients, args.duration, args.client_procs)
+                report(f"{count} воркер(ов)", frames, total_bytes, args.duration, args.clients)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+    elif args.url:
+        frames, total_bytes = run_load(args.url, args.clients, args.duration, args.client_procs)
+        report("итого", frames, total_bytes, args.duration, args.clients)
+    else:
+        parser.error("нужен --url или --workers")
+
+
+if __name__ == '__main__':
+    main()
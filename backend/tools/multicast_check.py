@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Проверка RTP/JPEG multicast рассылки (common/rtp_jpeg.py).
+
+Без --listen - самопроверка на локальной петле: отправитель шлет сгенерированные
+кадры в multicast группу, несколько приемников в этом же процессе собирают их
+и сравнивают декодированные кадры с отправленными попиксельно. --loss имитирует
+потерю пакетов на стороне отправителя. Время отправки кадра не зависит от числа
+приемников - это и показывает прогон с разным --receivers.
+
+С --listen - прием рассылки сервиса камер (CAMERA_MULTICAST или
+POST /api/cameras/multicast): FPS, битрейт, потери и задержка от захвата
+(точная, если приемник на том же хосте, что и сервис).
+
+Примеры:
+    python tools/multicast_check.py --receivers 20 --frames 300
+    python tools/multicast_check.py --loss 0.01
+    python tools/multicast_check.py --listen 239.255.42.1:5004 --duration 10
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'services'))
+from common.rtp_jpeg import RTP_CLOCK, RtpJpegReceiver, RtpJpegSender  # noqa: E402
+
+
+def synthetic_frame(index: int, width: int, height: int) -> np.ndarray:
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    row = ((x + index * 4) % 256).astype(np.uint8)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:, :, 0] = row
+    image[:, :, 1] = row[::-1]
+    image[:, :, 2] = (index * 2) % 256
+    cv2.putText(image, f"frame {index}", (20, height // 2), cv2.FONT_HERSHEY_SIMPLEX, width / 640, (255, 255, 255), 2)
+    return image
+
+
+class LossySender(RtpJpegSender):
+    """Отправитель, теряющий пакеты с заданной вероятностью"""
+
+    def __init__(self, *args, loss: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loss = loss
+        self.real_sock = self.sock
+        self.sock = self
+
+    def sendto(self, packet: bytes, address):
+        if random.random() >= self.loss:
+            self.real_sock.sendto(packet, address)
+
+    def close(self):
+        self.real_sock.close()
+
+
+def self_test(args):
+    sent: Dict[int, bytes] = {}
+    receivers = [RtpJpegReceiver(args.group, args.port) for _ in range(args.receivers)]
+    results: List[Dict[str, int]] = [{"ok": 0, "mismatch": 0} for _ in receivers]
+
+    def receive(index: int):
+        for frame in receivers[index].frames(timeout=1.0):
+            expected = sent.get(frame.timestamp)
+            decoded = cv2.imdecode(np.frombuffer(frame.jpeg_data, np.uint8), cv2.IMREAD_COLOR)
+            original = cv2.imdecode(np.frombuffer(expected, np.uint8), cv2.IMREAD_COLOR) if expected else None
+            if original is not None and decoded is not None and np.array_equal(original, decoded):
+                results[index]["ok"] += 1
+            else:
+                results[index]["mismatch"] += 1
+
+    threads = [threading.Thread(target=receive, args=(index,)) for index in range(len(receivers))]
+    for thread in threads:
+        thread.start()
+
+    sender = LossySender(args.group, args.port, mtu=args.mtu, loss=args.loss)
+    width, height = (int(value) for value in args.size.split('x'))
+    send_ms = []
+    packets = 0
+    for index in range(args.frames):
+        jpeg_data = cv2.imencode('.jpg', synthetic_frame(index, width, height),
+                                 [cv2.IMWRITE_JPEG_QUALITY, args.quality])[1].tobytes()
+        capture_ts = time.time()
+        sent[int(capture_ts * RTP_CLOCK) & 0xFFFFFFFF] = jpeg_data
+        started = time.perf_counter()
+        packets += sender.send(jpeg_data, capture_ts)
+        send_ms.append((time.perf_counter() - started) * 1000.0)
+        time.sleep(1.0 / args.fps)
+    for thread in threads:
+        thread.join()
+    sender.close()
+
+    print(f"Отправлено {args.frames} кадров {width}x{height}, {packets} пакетов, "
+          f"отправка кадра: медиана {np.median(send_ms):.3f} мс, p99 {np.percentile(send_ms, 99):.3f} мс")
+    failed = False
+    for index, (receiver, result) in enumerate(zip(receivers, results)):
+        stats = receiver.stats
+        print(f"приемник {index:>3}: кадров {result['ok']:>5}, не совпало {result['mismatch']}, "
+              f"потеряно пакетов {stats['lost_packets']}, отброшено кадров {stats['dropped_frames']}")
+        receiver.close()
+        failed |= result['mismatch'] > 0 or (args.loss == 0 and result['ok'] != args.frames)
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+def listen(args):
+    group, _, port = args.listen.rpartition(':')
+    receiver = RtpJpegReceiver(group, int(port))
+    started = time.time()
+    report_at = started + 1.0
+    frames = total_bytes = 0
+    latencies = []
+    while time.time() - started < args.duration:
+        frame = receiver.receive(timeout=1.0)
+        now = time.time()
+        if frame is not None:
+            frames += 1
+            total_bytes += len(frame.jpeg_data)
+            latencies.append(((int(now * RTP_CLOCK) - frame.timestamp) & 0xFFFFFFFF) / RTP_CLOCK * 1000.0)
+        if now >= report_at:
+            stats = receiver.stats
+            latency = f"{np.median(latencies):.1f} мс" if latencies else "-"
+            size = f"{frame.width}x{frame.height}" if frame is not None else "-"
+            print(f"{frames:>4} кадр/с  {total_bytes * 8 / 1000:8.0f} кбит/с  {size:>9}  задержка {latency:>9}  "
+                  f"потеряно пакетов {stats['lost_packets']}, отброшено кадров {stats['dropped_frames']}")
+            frames = total_bytes = 0
+            latencies = []
+            report_at = now + 1.0
+    receiver.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка RTP/JPEG multicast рассылки")
+    parser.add_argument('--listen', help='Прием рассылки сервиса: группа:порт')
+    parser.add_argument('--duration', type=float, default=10.0, help='Длительность приема для --listen, секунд')
+    parser.add_argument('--group', default='239.255.42.250', help='Группа для самопроверки')
+    parser.add_argument('--port', type=int, default=5900, help='Порт для самопроверки')
+    parser.add_argument('--receivers', type=int, default=5, help='Число приемников')
+    parser.add_argument('--frames', type=int, default=200, help='Число кадров')
+    parser.add_argument('--fps', type=float, default=30.0, help='Частота отправки')
+    parser.add_argument('--size', default='640x480', help='Размер кадра (кратный 8)')
+    parser.add_argument('--quality', type=int, default=85, help='Качество JPEG')
+    parser.add_argument('--mtu', type=int, default=1400, help='Размер UDP пакета')
+    parser.add_argument('--loss', type=float, default=0.0, help='Доля теряемых пакетов')
+    args = parser.parse_args()
+    sys.exit(listen(args) if args.listen else self_test(args))
+
+
+if __name__ == '__main__':
+    main()